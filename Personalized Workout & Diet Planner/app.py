@@ -1,39 +1,252 @@
 import json
 import time
-import requests
 import os 
 import random 
-from flask import Flask, request, jsonify
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from generator_backends import GeneratorError, create_generator_backend
+from history_cache import HistoryCache
+from jobs import JobManager, JobQueueFull
+from meal_planner import MealCatalog, MealPlanner, register_optimized_meals, render_meals
+from metrics import LATENCY_BUCKETS, SIZE_BUCKETS, MetricsRegistry, RequestProfiler, timed
+from plan_cache import PlanCache, seed_from_key
+from plan_index import GROUP_BY_FIELDS, INDEXED_FIELDS
+from plan_codec import TemplatePlanCodec
+from plan_inputs import MAX_INPUT_BYTES, InputError, canonical_value, input_key, validate_inputs
+from plan_matrix import PlanMatrix
+from plan_model import dumps as encode_plans
+from plan_templates import TemplateRegistry
+from retention import RetentionCompactor, RetentionPolicy
+from storage import FILTER_FIELDS, PlanArchive, create_storage
 
 # --- CONFIGURATION (MOCK MODE) ---
-PLANS_FILE = 'plans_data.json'
+PLANS_FILE = 'plans_data.json' # Legacy single JSON array (migrated into the log on first start)
+PLANS_LOG_FILE = 'plans_data.jsonl' # Append-only log, one plan per line
+PLANS_DB_FILE = 'plans_data.sqlite3' # Indexed SQLite database
+# Storage backend: 'jsonl' (append-only log, default), 'compact' (template references),
+# 'sqlite' (indexed) or 'json' (legacy full rewrite)
+STORAGE_BACKEND = os.environ.get('PLANS_STORAGE', 'jsonl')
+# 'compact' backend only: gzip the log (PLANS_COMPRESS=1)
+PLANS_COMPRESS = os.environ.get('PLANS_COMPRESS', '0') == '1'
+PLANS_COMPACT_FILE = 'plans_data.compact.jsonl' + ('.gz' if PLANS_COMPRESS else '')
+# Largest page /get_plans will return when 'limit' is used
+MAX_PAGE_SIZE = 200
+# In-process history cache (set HISTORY_CACHE=0 to read storage on every request)
+HISTORY_CACHE_ENABLED = os.environ.get('HISTORY_CACHE', '1') != '0'
+# Retention: keep the PLANS_RETAIN_PER_PROFILE newest plans of each profile and/or the plans of the
+# last PLANS_RETAIN_DAYS days; a background job moves older plans to the archive. 0 and 0 (default) keep all
+PLANS_RETAIN_PER_PROFILE = int(os.environ.get('PLANS_RETAIN_PER_PROFILE', 0))
+PLANS_RETAIN_DAYS = float(os.environ.get('PLANS_RETAIN_DAYS', 0))
+PLANS_COMPACT_INTERVAL = float(os.environ.get('PLANS_COMPACT_INTERVAL', 3600)) # Seconds between compaction runs
+PLANS_ARCHIVE_DIR = os.environ.get('PLANS_ARCHIVE_DIR', 'plans_archive') # Compressed archive segments
+RETENTION_POLICY = RetentionPolicy(PLANS_RETAIN_PER_PROFILE, PLANS_RETAIN_DAYS)
+
+# Artificial delay of the mock generator in seconds (0 keeps it off the request path)
+MOCK_DELAY_SECONDS = float(os.environ.get('MOCK_DELAY_SECONDS', 0))
+# Generator backend: 'mock' (templates, default) or 'http' (real LLM endpoint)
+GENERATOR_BACKEND = os.environ.get('GENERATOR_BACKEND', 'mock')
+LLM_API_URL = os.environ.get('LLM_API_URL', 'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent')
+GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+# Streaming variant used by /generate_plan/stream (empty: generate the whole plan, then stream it)
+LLM_STREAM_URL = os.environ.get('LLM_STREAM_URL', LLM_API_URL.replace(':generateContent', ':streamGenerateContent')
+                                if LLM_API_URL.endswith(':generateContent') else '')
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 30)) # Seconds per upstream attempt
+LLM_MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT', 8)) # Concurrent upstream calls per process
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+# Async generation: worker threads, max queued+running jobs, seconds results are kept
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 64))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 600))
+# Directory shared by worker processes for job status files, so /jobs/<id> works on any worker
+JOB_STATE_DIR = os.environ.get('JOB_STATE_DIR')
+# Batch generation: max payloads per /generate_plans/batch call and concurrent generators
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+# Per-request cProfile dumps: 'off' (default), 'header' (requests sending X-Profile) or 'slow'
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'off')
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500)) # 'slow' mode threshold
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# --- METRICS (exposed on /metrics in the Prometheus text format) ---
+
+METRICS = MetricsRegistry()
+REQUEST_SECONDS = METRICS.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.',
+    label_names=('endpoint', 'method', 'status'))
+REQUEST_BYTES = METRICS.histogram(
+    'http_request_size_bytes', 'Size of request bodies.', SIZE_BUCKETS, label_names=('endpoint',))
+RESPONSE_BYTES = METRICS.histogram(
+    'http_response_size_bytes', 'Size of non-streaming response bodies.', SIZE_BUCKETS, label_names=('endpoint',))
+PLAN_GENERATION_SECONDS = METRICS.histogram(
+    'plan_generation_seconds', 'Time spent generating one plan.', label_names=('backend',))
+HISTORY_LOAD_SECONDS = METRICS.histogram(
+    'history_load_seconds', 'Time spent loading/parsing the plan history.', LATENCY_BUCKETS)
+SERIALIZATION_SECONDS = METRICS.histogram(
+    'serialization_seconds', 'Time spent encoding responses.', label_names=('endpoint',))
+STORAGE_WRITE_SECONDS = METRICS.histogram(
+    'storage_write_seconds', 'Time spent writing plans to storage.', label_names=('backend',))
+PLANS_WRITTEN = METRICS.counter('plans_written_total', 'Plans saved to storage.')
+COMPACTION_SECONDS = METRICS.histogram(
+    'compaction_seconds', 'Time spent on one retention compaction run.')
+PLANS_ARCHIVED = METRICS.counter('plans_archived_total', 'Plans moved to the archive by retention.')
+BYTES_RECLAIMED = METRICS.counter('storage_bytes_reclaimed_total', 'Live storage bytes freed by compaction.')
+
+profiler = RequestProfiler(PROFILE_REQUESTS, PROFILE_SLOW_MS, PROFILE_DIR)
+
+def collect_runtime_metrics():
+    """Current values read at scrape time: history size, plan cache counters, job backlog and the hot set after compaction."""
+    samples = []
+    if history_cache is not None:
+        samples.append(('plan_history_size', 'gauge', 'Plans in the cached history.',
+                        history_cache.stats()['plans']))
+    cache_stats = PLAN_CACHE.stats()
+    for key in ('hits', 'misses', 'evictions', 'expirations'):
+        samples.append((f'plan_cache_{key}_total', 'counter', f'Plan cache {key}.', cache_stats[key]))
+    samples.append(('plan_cache_size', 'gauge', 'Plans in the plan cache.', cache_stats['size']))
+    if jobs is not None:
+        samples.append(('jobs_pending', 'gauge', 'Async generation jobs queued or running.', jobs.pending))
+    report = compactor.last_report if compactor is not None else None
+    if report is not None:
+        samples.append(('plan_hot_set_plans', 'gauge', 'Plans left in live storage after the last compaction.',
+                        report['hot_plans']))
+        samples.append(('plan_hot_set_bytes', 'gauge', 'Live storage bytes after the last compaction.',
+                        report['hot_bytes']))
+        samples.append(('plan_archive_plans', 'gauge', 'Plans in the archive.', report['archive']['plans']))
+    if PLAN_MATRIX is not None:
+        matrix_stats = PLAN_MATRIX.stats
+        samples.append(('plan_matrix_plans', 'gauge', 'Plans precomputed at startup.', matrix_stats['plans']))
+        samples.append(('plan_matrix_warmup_seconds', 'gauge', 'Time spent precomputing the plan matrix.',
+                        matrix_stats['warmup_seconds']))
+        samples.append(('plan_matrix_bytes', 'gauge', 'Memory held by the plan matrix.',
+                        int((matrix_stats['parts_kib'] + matrix_stats['table_kib']) * 1024)))
+    return samples
 
-app = Flask(__name__)
-# Enable CORS for Streamlit running on a different port/origin
-CORS(app)
+METRICS.add_collector(collect_runtime_metrics)
+
+# The routes; create_app() registers them on each Flask app it builds
+api = Blueprint('api', __name__)
 
 # --- MOCK RESPONSE DATA (UPDATED FOR DYNAMIC MEALS AND WORKOUTS) ---
 
+# Workout and meal templates are parsed and compiled once at startup;
+# each request only fills in the parameter slots of the chosen variation.
+TEMPLATES = TemplateRegistry.from_file()
+
+# Meal plans: 'optimizer' (default) picks 21 meals from meal_catalog.json whose weekly total
+# fits budget * 7 and suits the goal; 'templates' fills the fixed meals of plan_templates.json
+MEAL_PLANNER = os.environ.get('MEAL_PLANNER', 'optimizer')
+if MEAL_PLANNER not in ('optimizer', 'templates'):
+    raise ValueError(f"Unknown MEAL_PLANNER '{MEAL_PLANNER}' (expected 'optimizer' or 'templates')")
+MEAL_CATALOG = MealCatalog.from_file()
+meal_optimizer = MealPlanner(MEAL_CATALOG)
+# One optimized template per meal template cuisine, registered in both modes so that
+# stored compact references to either kind keep resolving (PLAN_CACHE keys carry the
+# template ids, so the two kinds never share cached plans)
+OPTIMIZED_MEALS = register_optimized_meals(TEMPLATES, meal_optimizer)
+
+# Variation picks: 'random' (default) or 'inputs' (seeded from the normalized inputs,
+# so the same profile always gets the same plan). A request 'seed' always wins.
+PLAN_SEED_MODE = os.environ.get('PLAN_SEED_MODE', 'random')
+# LRU/TTL cache of generated plans; PLAN_CACHE_SIZE=0 disables it
+PLAN_CACHE = PlanCache(
+    max_size=int(os.environ.get('PLAN_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.environ.get('PLAN_CACHE_TTL', 3600))
+)
+# PLAN_MATRIX=1 renders every plan the UI can ask for at startup (on PLAN_MATRIX_WORKERS
+# processes, default one per CPU), so generation for those inputs is a table lookup
+PLAN_MATRIX_ENABLED = os.environ.get('PLAN_MATRIX', '0') == '1'
+PLAN_MATRIX_WORKERS = int(os.environ['PLAN_MATRIX_WORKERS']) if os.environ.get('PLAN_MATRIX_WORKERS') else None
+PLAN_MATRIX = None
+
+# --- GOAL AND INTENSITY NOTES (built once, read by plan_params) ---
+
+INTENSITY_NOTES = {
+    'Extremely Limited (15 min/day)': "15-minute quick session",
+    'Busy Student (45 min max)': "40-minute focused routine",
+    'Flexible (up to 90 min)': "75-minute detailed routine"
+}
+# goal -> (meal goal note, workout goal note, high reps, low reps, sets)
+GOAL_NOTES = {
+    'Weight Loss': ("Low Calorie Focus, Smaller Portions",
+                    "Primary goal is calorie burn and maintaining muscle mass. (Higher Reps/Circuits)",
+                    "15-20", "10-12", 3),
+    'Muscle Gain': ("High Protein Focus, Adequate Carbs",
+                    "Primary goal is progressive overload and muscle hypertrophy. (Lower Reps/Heavy)",
+                    "8-10", "6-8", 4),
+}
+# Any other goal gets the maintenance notes
+MAINTENANCE_NOTES = ("Balanced Maintenance Focus",
+                     "Primary goal is general fitness and endurance. (Moderate Reps/Sets)",
+                     "12-15", "8-10", 3)
+
 def get_mock_plan_data(data):
     """
     Returns a structured plan for testing purposes. The content changes 
     dynamically based on ALL user inputs (Budget, Goal, Cuisine, etc.).
     
     A random variation is introduced here to prevent the output from being 
-    identical on every generation.
-    """
-    goal = data.get('goal', 'Healthy Maintenance')
-    budget = data.get('budget', 500) # Daily budget in INR
-    cuisine = data.get('cuisine', 'Any/Global')
-    level = data.get('level', 'Intermediate')
-    equipment = data.get('equipment', 'Bodyweight Only')
-    intensity = data.get('intensity', 'Busy Student (45 min max)')
-    
+    identical on every generation. The picks are reproducible when the request
+    carries a 'seed', or when PLAN_SEED_MODE=inputs derives one from the inputs.
+    Generated plans are memoized on (input key, template ids, variations) in PLAN_CACHE.
+    """
+    key, workout_template, meal_template = select_templates(data)
+
+    seed = data.get('seed')
+    if seed is None and PLAN_SEED_MODE == 'inputs':
+        seed = seed_from_key(key)
+    rng = random if seed is None else random.Random(seed)
+
     # Randomly select a variation for non-repetition in Workouts
-    workout_variation = random.choice([1, 2])
+    workout_variation = rng.choice(range(1, workout_template.variation_count + 1))
     # Randomly select a variation for non-repetition in Meals
-    meal_variation = random.choice([1, 2])
+    meal_variation = rng.choice(range(1, meal_template.variation_count + 1))
+
+    return render_plan(key, workout_template, workout_variation, meal_template, meal_variation)
+
+def select_templates(data):
+    """Returns (input key, workout template, meal template) for the given inputs."""
+    key = input_key(data)
+    goal, level, equipment, intensity, budget, cuisine = key
+    # Templates are picked by (level, equipment) and cuisine, with a default fallback
+    meal_template = TEMPLATES.meal_template(cuisine)
+    if MEAL_PLANNER == 'optimizer':
+        meal_template = OPTIMIZED_MEALS[meal_template.template_id]
+    return key, TEMPLATES.workout_template(level, equipment), meal_template
+
+def render_plan(key, workout_template, workout_variation, meal_template, meal_variation):
+    """The plan for the normalized inputs and chosen variations, from PLAN_MATRIX or memoized in PLAN_CACHE."""
+    if PLAN_MATRIX is not None:
+        plan = PLAN_MATRIX.get(key, workout_template.template_id, workout_variation,
+                               meal_template.template_id, meal_variation)
+        if plan is not None:
+            return plan
+    # The same key renders differently with another template (e.g. a compact record saved
+    # under MEAL_PLANNER=templates expanded by an optimizer-mode server), so the ids are part of the key
+    return PLAN_CACHE.get_or_create(
+        (key, workout_template.template_id, workout_variation, meal_template.template_id, meal_variation),
+        lambda: build_mock_plan(key, workout_template, workout_variation, meal_template, meal_variation)
+    )
+
+def build_mock_plan(key, workout_template, workout_variation, meal_template, meal_variation):
+    """
+    Fills the chosen workout and meal template variations for the normalized inputs.
+    An optimized meal week also reports its total cost against the budget ('mealBudget'),
+    so a week no catalog meals could fit into the budget is not passed off as fitting.
+    """
+    params = plan_params(key, workout_variation)
+    return {
+        "workoutPlan": workout_template.render(workout_variation, params),
+        **render_meals(meal_template, meal_variation, params)
+    }
+
+def plan_params(key, workout_variation):
+    """The template slot values for the normalized inputs and workout variation."""
+    goal, level, equipment, intensity, budget, cuisine = key
     
     # --- DYNAMIC BUDGET CALCULATIONS ---
     
@@ -72,236 +285,272 @@ def get_mock_plan_data(data):
     
     # --- GOAL AND INTENSITY NOTES ---
     
-    intensity_note = {
-        'Extremely Limited (15 min/day)': "15-minute quick session",
-        'Busy Student (45 min max)': "40-minute focused routine",
-        'Flexible (up to 90 min)': "75-minute detailed routine"
-    }.get(intensity)
-    
-    if goal == 'Weight Loss':
-        goal_note = "Low Calorie Focus, Smaller Portions"
-        workout_goal_note = "Primary goal is calorie burn and maintaining muscle mass. (Higher Reps/Circuits)"
-        WL_Reps_H = "15-20"
-        WL_Reps_L = "10-12"
-        WL_Sets = 3
-    elif goal == 'Muscle Gain':
-        goal_note = "High Protein Focus, Adequate Carbs"
-        workout_goal_note = "Primary goal is progressive overload and muscle hypertrophy. (Lower Reps/Heavy)"
-        WL_Reps_H = "8-10"
-        WL_Reps_L = "6-8"
-        WL_Sets = 4
-    else:
-        goal_note = "Balanced Maintenance Focus"
-        workout_goal_note = "Primary goal is general fitness and endurance. (Moderate Reps/Sets)"
-        WL_Reps_H = "12-15"
-        WL_Reps_L = "8-10"
-        WL_Sets = 3
+    intensity_note = INTENSITY_NOTES.get(intensity)
+    goal_note, workout_goal_note, WL_Reps_H, WL_Reps_L, WL_Sets = GOAL_NOTES.get(goal, MAINTENANCE_NOTES)
 
 
-    # --- WORKOUT LOGIC (USING VARIATION FROM PREVIOUS STEP) ---
-
-    workout_key = (level, equipment)
-    
-    # Simplified workout logic to demonstrate variation functionality
-    if workout_key == ('Beginner', 'Bodyweight Only'):
-        frequency_note = "3x Week Bodyweight Plan"
-        
-        # Variation 1
-        plan_v1 = [
-            {"day": "Monday", "focus": f"Beginner Total Body A (Var {workout_variation}) | {goal}", "exercises": [{"name": "Wall Push-ups", "sets": WL_Sets, "reps": WL_Reps_H, "notes": f"Controlled descent. Total time: {intensity_note}. Goal: {workout_goal_note}"}, {"name": "Bodyweight Squats", "sets": WL_Sets, "reps": WL_Reps_H, "notes": "Maintain an upright chest."}]},
-            {"day": "Tuesday", "focus": "Rest / Active Recovery", "exercises": [{"name": "Walking/Stretching", "sets": 1, "reps": "30 mins", "notes": "Light pace outside."}]},
-            {"day": "Wednesday", "focus": f"Beginner Core/Conditioning (Var {workout_variation}) | {goal}", "exercises": [{"name": "Plank", "sets": WL_Sets, "reps": "45-60 seconds", "notes": "Engage the core tightly."}, {"name": "Glute Bridges", "sets": WL_Sets, "reps": WL_Reps_H, "notes": "Squeeze glutes at the top."}]},
-            {"day": "Thursday", "focus": "Rest", "exercises": []},
-            {"day": "Friday", "focus": f"Beginner Total Body B (Var {workout_variation}) | {goal}", "exercises": [{"name": "Incline Push-ups (on counter)", "sets": WL_Sets, "reps": WL_Reps_L, "notes": "Use a stable counter/chair."}, {"name": "Reverse Lunges", "sets": WL_Sets, "reps": f"{WL_Reps_L} per leg", "notes": "Step back slowly."}]},
-            {"day": "Saturday", "focus": "Cardio/Stretching", "exercises": [{"name": "Jumping Jacks / High Knees", "sets": 1, "reps": "20 mins", "notes": "Steady interval pace."}]},
-            {"day": "Sunday", "focus": "Rest", "exercises": []}
-        ]
-        
-        # Variation 2 - Slightly different exercises/order
-        plan_v2 = [
-            {"day": "Monday", "focus": f"Beginner Core Focus (Var {workout_variation}) | {goal}", "exercises": [{"name": "Crunches", "sets": WL_Sets, "reps": "20", "notes": f"Focus on core squeeze. Total time: {intensity_note}. Goal: {workout_goal_note}"}, {"name": "Mountain Climbers", "sets": WL_Sets, "reps": "45 seconds", "notes": "Maintain a straight back."}]},
-            {"day": "Tuesday", "focus": f"Beginner Total Body A (Var {workout_variation}) | {goal}", "exercises": [{"name": "Assisted Squats (Holding Chair)", "sets": WL_Sets, "reps": WL_Reps_H, "notes": "Focus on range of motion."}, {"name": "Push-up on Knees", "sets": WL_Sets, "reps": WL_Reps_L, "notes": "Keep core engaged."}]},
-            {"day": "Wednesday", "focus": "Active Recovery", "exercises": [{"name": "Yoga/Mobility Flow", "sets": 1, "reps": "25 mins", "notes": "Gentle stretching."}]},
-            {"day": "Thursday", "focus": f"Beginner Total Body B (Var {workout_variation}) | {goal}", "exercises": [{"name": "Pike Push-ups (for shoulders)", "sets": WL_Sets, "reps": WL_Reps_L, "notes": "Aim butt high in the air."}, {"name": "Step-ups", "sets": WL_Sets, "reps": f"{WL_Reps_H} per leg", "notes": "Use a low, stable step."}]},
-            {"day": "Friday", "focus": "Rest", "exercises": []},
-            {"day": "Saturday", "focus": "Cardio/Stretching", "exercises": [{"name": "High Knees", "sets": 1, "reps": "15 mins", "notes": "Increase intensity."}]},
-            {"day": "Sunday", "focus": "Full Rest", "exercises": []}
-        ]
-        
-        workout_plan = plan_v1 if workout_variation == 1 else plan_v2
-
-    # Fallback/Other Workouts logic (simplified)
-    else: 
-         frequency_note = "4x Week Hybrid Plan (Advanced/Equipment)"
-         
-         # Variation 1 (Fallback/Gym)
-         plan_v1 = [
-            {"day": "Monday", "focus": f"Hybrid Mix A (Var {workout_variation}) | {goal}", "exercises": [{"name": "Barbell Rows", "sets": WL_Sets, "reps": WL_Reps_L, "notes": f"Heavy lift focus. Goal: {workout_goal_note}"}, {"name": "Dumbbell Press", "sets": WL_Sets, "reps": WL_Reps_H, "notes": "Focus on controlled tempo."}]},
-            {"day": "Tuesday", "focus": "Lower Body", "exercises": [{"name": "Barbell Squats", "sets": WL_Sets, "reps": WL_Reps_L, "notes": "Prioritize depth."}, {"name": "Leg Extensions", "sets": WL_Sets, "reps": WL_Reps_H, "notes": "Focus on quad isolation."}]},
-            {"day": "Wednesday", "focus": "Rest / Active Recovery", "exercises": [{"name": "Walking/Stretching", "sets": 1, "reps": "45 mins", "notes": "Light pace."}]},
-            {"day": "Thursday", "focus": f"Hybrid Circuit Training (Var {workout_variation}) | {goal}", "exercises": [{"name": "Overhead Press (DB)", "sets": WL_Sets, "reps": WL_Reps_L, "notes": "Keep core tight."}, {"name": "Weighted Step-ups", "sets": WL_Sets, "reps": f"{WL_Reps_H} per leg", "notes": "Use a low, stable box."}]},
-            {"day": "Friday", "focus": "Core & Cardio", "exercises": [{"name": "Plank with DB Drag", "sets": WL_Sets, "reps": "10 per side", "notes": "Minimize hip rotation."}, {"name": "Jump Rope (Mock)", "sets": 1, "reps": "20 mins", "notes": "Light, steady pace."}]},
-            {"day": "Saturday", "focus": "Full Body Finishers", "exercises": [{"name": "Burpees (Modified)", "sets": WL_Sets, "reps": WL_Reps_L, "notes": "Reduce jumps if needed."}, {"name": "Calf Raises (Bodyweight)", "sets": WL_Sets, "reps": WL_Reps_H, "notes": "Hold onto a wall for balance."}]},
-            {"day": "Sunday", "focus": "Rest", "exercises": []}
-        ]
-         
-         # Variation 2 (Fallback/Gym - PPL Focus)
-         plan_v2 = [
-            {"day": "Monday", "focus": f"PULL Day (Var {workout_variation}) | {goal}", "exercises": [{"name": "Lat Pulldowns", "sets": 4, "reps": WL_Reps_L, "notes": f"Squeeze the back. Goal: {workout_goal_note}"}, {"name": "Bicep Curls (Cable)", "sets": 3, "reps": WL_Reps_H, "notes": "Controlled tempo."}]},
-            {"day": "Tuesday", "focus": f"PUSH Day (Var {workout_variation}) | {goal}", "exercises": [{"name": "Incline DB Press", "sets": 4, "reps": WL_Reps_L, "notes": "Target upper chest."}, {"name": "Tricep Pushdowns", "sets": 3, "reps": WL_Reps_H, "notes": "Full extension."}]},
-            {"day": "Wednesday", "focus": f"LEGS Day (Var {workout_variation}) | {goal}", "exercises": [{"name": "Leg Press", "sets": 4, "reps": WL_Reps_L, "notes": "Use moderate weight."}, {"name": "Romanian Deadlifts (DB)", "sets": 3, "reps": WL_Reps_H, "notes": "Stretch hamstrings."}]},
-            {"day": "Thursday", "focus": "Rest", "exercises": []},
-            {"day": "Friday", "focus": f"Upper Body Volume (Var {workout_variation}) | {goal}", "exercises": [{"name": "Seated Cable Rows", "sets": 3, "reps": WL_Reps_H, "notes": "Focus on stretch and contraction."}, {"name": "Lateral Raises (DB)", "sets": 3, "reps": WL_Reps_H, "notes": "Focus on slow, controlled movement."}]},
-            {"day": "Saturday", "focus": f"Lower Body Conditioning (Var {workout_variation}) | {goal}", "exercises": [{"name": "Box Jumps/Step-ups (Plyo)", "sets": 3, "reps": "15-20", "notes": "Focus on explosive power (if able)."}, {"name": "Abdominal Machine Crunches", "sets": 3, "reps": WL_Reps_H, "notes": "Squeeze abs hard."}]},
-            {"day": "Sunday", "focus": "Full Rest", "exercises": []}
-        ]
-
-         workout_plan = plan_v1 if workout_variation == 1 else plan_v2
-
-
-    # --- MEAL LOGIC (UPDATED WITH VARIATIONS) ---
-    
-    if cuisine == 'South Asian':
-        # Variation 1: Focus on classic dal/rice and convenience
-        plan_v1 = [
-            {"day": "Monday", "meals": [{"name": "B: Poha/Upma (V1)", "recipe": f"Quick Poha ({budget_detail} | {goal_note})", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Simple Dal", "recipe": "Yellow Dal and 2 rotis. Maximize cheap protein source.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Khichdi", "recipe": "Vegetable Khichdi with curd. Light and easy on the budget.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Tuesday", "meals": [{"name": "B: Eggs/Banana", "recipe": f"Boiled Eggs (2) and a banana ({goal_note}).", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Chana Masala", "recipe": "Chana Masala (chickpeas) with less rice/1 roti. High fiber.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Mung Soup (V1)", "recipe": f"Mung bean soup, very light. ({budget_adj_note})", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Wednesday", "meals": [{"name": "B: Oats", "recipe": "Salty/Sweet Oats (High Fiber).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Leftover Chana", "recipe": "Leftover Chana Masala with 1 roti (Budget Day).", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Mock Paneer/Tofu", "recipe": f"High quality Paneer/Tofu dish with 2 rotis (Premium Protein).", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Thursday", "meals": [{"name": "B: Toast/Peanut", "recipe": "Toast with peanut butter (protein boost).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Curd Rice (V1)", "recipe": "Curd Rice or simple vegetable sandwich.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Sambar/Rice", "recipe": "Lentil soup (Sambar) with steamed rice.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Friday", "meals": [{"name": "B: Smoothie", "recipe": f"Banana and water/milk smoothie ({goal_note} focus).", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Rajma", "recipe": "Rajma (Kidney beans) curry with plain rice (High Protein).", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Leftover Rajma", "recipe": "Leftover Rajma (Kidney beans) with curd.", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Saturday", "meals": [{"name": "B: Poha/Upma (V1)", "recipe": "Rava Upma or Poha with peanuts.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Deluxe Mock Meat Curry", "recipe": f"Small portion of high-quality mock meat curry ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Veg Stir-fry", "recipe": "Mixed vegetable stir-fry with rice.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Sunday", "meals": [{"name": "B: Paratha", "recipe": "Plain Paratha or 2 plain rotis with pickle.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Veg Biryani", "recipe": "Simple vegetable pulao/biryani.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Leftovers", "recipe": f"Light dinner of fruit or leftovers ({budget_detail}).", "cost_estimate_in_inr": cost_low_str}]}
-        ]
-        
-        # Variation 2: Focus on variety like Dosa/Idli (Mock), and different bean types
-        plan_v2 = [
-            {"day": "Monday", "meals": [{"name": "B: Idli/Sambar (V2)", "recipe": f"Idli (2) with Sambar/Chutney ({budget_detail} | {goal_note})", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Moong Dal", "recipe": "Moong Dal (split) and rice. Light and easy.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Mixed Bean Curry", "recipe": "Mixed beans (like lobia/white chhole) curry and 1 roti.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Tuesday", "meals": [{"name": "B: Whole Wheat Toast", "recipe": f"Toast (2 slices) with light spread ({goal_note}).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Leftover Bean Curry", "recipe": "Leftover Mixed Bean Curry.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Paneer Bhurji", "recipe": f"Scrambled paneer (Bhurji) with fresh salad. ({budget_adj_note})", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Wednesday", "meals": [{"name": "B: Eggs/Vegetables", "recipe": "Scrambled eggs (2) with sautéed vegetables.", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Vegetable Curry", "recipe": "Seasonal vegetable curry with 2 rotis.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Curd/Fruit", "recipe": f"Large bowl of curd/yogurt with seasonal fruit (Light Dinner).", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Thursday", "meals": [{"name": "B: Dosa (Mock)", "recipe": "Simple dosa/cheela made from lentil batter.", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Dal Fry", "recipe": "Simple Dal Fry with rice.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Vegetable Stew", "recipe": "Thick vegetable stew (Ishtu) and 1 roti.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Friday", "meals": [{"name": "B: Sprouts Salad", "recipe": f"Sprouted Mung beans salad (High Protein) ({goal_note} focus).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Chhole", "recipe": "Chhole (Garbanzo beans) with 1 roti.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Leftover Chhole", "recipe": "Leftover Chhole (Garbanzo beans) as a light soup.", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Saturday", "meals": [{"name": "B: Sweet Potato", "recipe": "Boiled sweet potato with a dash of spice.", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Mock Chicken Curry", "recipe": f"Mock chicken/meat curry ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Raita/Rice", "recipe": "Light vegetable Raita (curd mix) with rice.", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Sunday", "meals": [{"name": "B: Paratha", "recipe": "Aloo Paratha (potato filling) or Onion Paratha.", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Veg Pulao", "recipe": "Simple vegetable pulao/biryani.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Leftovers (V2)", "recipe": f"Light dinner of fruit or leftover Dal ({budget_detail}).", "cost_estimate_in_inr": cost_low_str}]}
-        ]
-        
-        meal_plan = plan_v1 if meal_variation == 1 else plan_v2
-
-    elif cuisine == 'Latino':
-        # Variation 1: Focus on classic beans, rice, and simple tacos/bowls
-        plan_v1 = [
-            {"day": "Monday", "meals": [{"name": "B: Huevos (Mock) (V1)", "recipe": f"Scrambled eggs with a dash of salsa ({budget_adj_note}).", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Rice & Beans", "recipe": "Simple Rice and Black Beans (Staple, {budget_tier}).", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Burrito Bowl", "recipe": f"Budget burrito bowl (high protein beans, less rice).", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Tuesday", "meals": [{"name": "B: Oatmeal", "recipe": "Oatmeal with cinnamon and milk.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Leftover Beans", "recipe": "Leftover Rice and Black Beans.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Tacos (Veg)", "recipe": f"Simple corn tacos (3) with potato/bean filling ({goal_note}).", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Wednesday", "meals": [{"name": "B: Toast/Avocado", "recipe": f"Toast with mock guacamole (mashed avocado - {budget_adj_note}).", "cost_estimate_in_inr": cost_high_str}, {"name": "L: Budget Chili", "recipe": "Lentil/bean chili (protein source).", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Leftover Chili", "recipe": "Leftover chili with a side of rice.", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Thursday", "meals": [{"name": "B: Fruit & Yogurt", "recipe": "Simple fruit (banana) and curd/yogurt.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Veggie Soup", "recipe": "Budget Latin-style vegetable soup.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Mock Empanadas", "recipe": f"2 Mock empanadas (baked, potato/bean filling - {goal_note}).", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Friday", "meals": [{"name": "B: Toast/Peanut", "recipe": "Toast with peanut butter and banana (Energy).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Rice & Beans", "recipe": "Fresh batch of Rice and Black Beans.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Mock Tostadas", "recipe": "Fried flat corn tortillas with beans.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Saturday", "meals": [{"name": "B: Pancakes", "recipe": "Simple pancakes (budget flour/water).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Leftover Beans", "recipe": "Leftover Rice and Black Beans.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Premium Mock Tacos", "recipe": f"4 Mock Chicken or Beef Tacos ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Sunday", "meals": [{"name": "B: Eggs/Toast", "recipe": "Scrambled Eggs (2) and toast.", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Protein Bowl", "recipe": f"High Protein Bowl with mock fish/steak ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Leftovers", "recipe": "Light dinner of fruit or leftovers.", "cost_estimate_in_inr": cost_low_str}]}
-        ]
-        
-        # Variation 2: Focus on soups, sweet potato, and different preparations
-        plan_v2 = [
-            {"day": "Monday", "meals": [{"name": "B: Arepas (Mock) (V2)", "recipe": f"2 simple corn meal arepas (budget-friendly corn base).", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Lentil Soup", "recipe": "Big bowl of spicy lentil soup with vegetables.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Chicken Fajita Bowl (Mock)", "recipe": f"Mock chicken strips with peppers and onions.", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Tuesday", "meals": [{"name": "B: Fruit/Nuts", "recipe": "Banana and a small handful of peanuts.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Leftover Fajita Mix", "recipe": "Leftover Fajita mix served over rice.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Quesadillas (Mock)", "recipe": f"2 corn tortillas with budget cheese/bean filling ({goal_note}).", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Wednesday", "meals": [{"name": "B: Eggs/Black Beans", "recipe": f"2 scrambled eggs with a scoop of black beans ({budget_adj_note}).", "cost_estimate_in_inr": cost_high_str}, {"name": "L: Refried Beans", "recipe": "Refried beans (canned/homemade) with plain rice.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Fish Tacos (Mock)", "recipe": "2 Mock Fish Tacos with light cabbage slaw.", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Thursday", "meals": [{"name": "B: Oatmeal", "recipe": "Oatmeal with mock milk and brown sugar.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Sweet Potato", "recipe": "Baked sweet potato with a dash of spice.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Chicken Soup (Mock)", "recipe": "Large bowl of mock chicken and rice soup.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Friday", "meals": [{"name": "B: Toast/Avocado", "recipe": "Toast with mock guacamole (mashed avocado).", "cost_estimate_in_inr": cost_high_str}, {"name": "L: Budget Chili (V2)", "recipe": "Red kidney bean chili with a small side of corn chips.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Leftover Chili", "recipe": "Leftover chili (no chips).", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Saturday", "meals": [{"name": "B: Fruit & Yogurt", "recipe": "Simple fruit (apple) and curd/yogurt.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Black Bean Burger (Mock)", "recipe": f"Mock black bean burger on a simple bun ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Tortilla Soup (Mock)", "recipe": "Light vegetable tortilla soup.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Sunday", "meals": [{"name": "B: Pancakes/Waffles", "recipe": "Simple pancakes (budget flour/water).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Deluxe Mock Meat", "recipe": f"Mock steak/fish with grilled vegetables ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Light Salad", "recipe": "Simple green salad with vinaigrette.", "cost_estimate_in_inr": cost_low_str}]}
-        ]
-        
-        meal_plan = plan_v1 if meal_variation == 1 else plan_v2
-    else:
-        # Any/Global (Default) / American/Comfort
-        # Variation 1: Focus on classic comfort and convenience
-        plan_v1 = [
-            {"day": "Monday", "meals": [{"name": "B: Cereal (V1)", "recipe": "Budget brand cereal with milk (Low Sugar).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: PB&J", "recipe": f"Peanut butter and jelly sandwich ({goal_note}, {budget_adj_note})", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Budget Pasta", "recipe": f"Pasta with simple tomato sauce ({budget_adj_note}).", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Tuesday", "meals": [{"name": "B: Eggs/Toast", "recipe": f"Scrambled Eggs (2) and whole-wheat toast ({goal_note}).", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Leftover Pasta", "recipe": "Leftover pasta from Monday.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Simple Soup", "recipe": "Canned vegetable soup (mock equivalent, light).", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Wednesday", "meals": [{"name": "B: Oatmeal", "recipe": "Oatmeal with sugar/honey.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Tuna Sandwich", "recipe": f"Tuna salad sandwich (high protein, {budget_adj_note}).", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Mock Pizza", "recipe": f"Slice of frozen pizza (budget brand, comfort food). ({budget_detail})", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Thursday", "meals": [{"name": "B: Toast/Jam", "recipe": "Toast with butter and jam.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Leftover Tuna", "recipe": "Leftover tuna salad with crackers.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Rice & Veg", "recipe": "Simple rice and frozen vegetable mix.", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Friday", "meals": [{"name": "B: Pancakes", "recipe": "Pancakes/Waffles (budget flour/water).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Grilled Cheese", "recipe": "Grilled cheese sandwich (low-cost cheese).", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Chicken/Salmon (Mock)", "recipe": f"Mock baked lean chicken or salmon fillet ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Saturday", "meals": [{"name": "B: Fruit Smoothie", "recipe": "Fruit smoothie (banana and water/milk).", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Chicken Salad", "recipe": f"Mock chicken/paneer salad (Protein source - {goal_note}).", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Tacos (Global)", "recipe": "Simple soft tacos with ground filling and beans.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Sunday", "meals": [{"name": "B: Eggs/Bacon Mock", "recipe": "Scrambled eggs and mock bacon/sausage (e.g., soy).", "cost_estimate_in_inr": cost_high_str}, {"name": "L: Premium Burger (Mock)", "recipe": f"Mock grass-fed burger on a quality bun ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Leftovers (V1)", "recipe": "Light dinner of fruit or leftovers.", "cost_estimate_in_inr": cost_low_str}]}
-        ]
-        
-        # Variation 2: Focus on stir-fries, hummus, and quick, healthy options
-        plan_v2 = [
-            {"day": "Monday", "meals": [{"name": "B: Yogurt Parfait (V2)", "recipe": "Yogurt with budget granola and fruit.", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Hummus & Pita (Mock)", "recipe": f"Budget hummus with pita bread/crackers ({goal_note}, {budget_adj_note})", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Chicken Stir-fry (Mock)", "recipe": f"Mock chicken stir-fry with rice and low-cost veg.", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Tuesday", "meals": [{"name": "B: Hard-Boiled Eggs", "recipe": f"Hard-boiled eggs (3) and an apple ({goal_note}).", "cost_estimate_in_inr": cost_high_str}, {"name": "L: Leftover Stir-fry", "recipe": "Leftover stir-fry from Monday.", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Grilled Cheese & Soup", "recipe": "Grilled cheese sandwich and canned vegetable soup.", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Wednesday", "meals": [{"name": "B: Peanut Butter Toast", "recipe": "Whole-wheat toast with peanut butter (high energy).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Chickpea Salad", "recipe": "Chickpea and vegetable salad (mayo-free).", "cost_estimate_in_inr": cost_med_str}, {"name": "D: Lentil Soup & Bread", "recipe": f"Big bowl of lentil soup with a slice of bread. ({budget_detail})", "cost_estimate_in_inr": cost_low_str}]},
-            {"day": "Thursday", "meals": [{"name": "B: Cereal (V2)", "recipe": "Oatmeal or budget muesli.", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Leftover Soup", "recipe": "Leftover lentil soup.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Turkey Sandwich (Mock)", "recipe": "Mock turkey/chicken slices on whole wheat.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Friday", "meals": [{"name": "B: Fruit Smoothie", "recipe": "Banana and spinach smoothie (hidden veg).", "cost_estimate_in_inr": cost_med_str}, {"name": "L: Mock Chicken Wrap", "recipe": "Mock chicken salad wrap in a tortilla.", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Pasta & Veg", "recipe": "Pasta with mock ground meat and frozen veg.", "cost_estimate_in_inr": cost_high_str}]},
-            {"day": "Saturday", "meals": [{"name": "B: Eggs/Sausage Mock", "recipe": "Scrambled eggs and mock sausage (e.g., soy).", "cost_estimate_in_inr": cost_high_str}, {"name": "L: Leftover Pasta", "recipe": f"Leftover pasta for lunch.", "cost_estimate_in_inr": cost_low_str}, {"name": "D: Baked Potato", "recipe": "Baked potato with beans/budget cheese topping.", "cost_estimate_in_inr": cost_med_str}]},
-            {"day": "Sunday", "meals": [{"name": "B: Pancakes/Waffles (V2)", "recipe": "Waffles with syrup (treat day).", "cost_estimate_in_inr": cost_low_str}, {"name": "L: Classic Burger (Mock)", "recipe": f"Classic Mock Beef Burger on a bun ({budget_detail}).", "cost_estimate_in_inr": cost_high_str}, {"name": "D: Light Salad", "recipe": "Simple mixed green salad.", "cost_estimate_in_inr": cost_low_str}]}
-        ]
-        
-        meal_plan = plan_v1 if meal_variation == 1 else plan_v2
-
+    # --- TEMPLATE PARAMETERS (WORKOUT AND MEAL TEXT LIVES IN plan_templates.json) ---
 
     return {
-        "workoutPlan": workout_plan,
-        "mealPlan": meal_plan
+        "goal": goal,
+        "weekly_budget": weekly_budget_cap,
+        "variation": workout_variation,
+        "sets": WL_Sets,
+        "reps_high": WL_Reps_H,
+        "reps_low": WL_Reps_L,
+        "intensity_note": intensity_note,
+        "workout_goal_note": workout_goal_note,
+        "cost_low": cost_low_str,
+        "cost_med": cost_med_str,
+        "cost_high": cost_high_str,
+        "budget_detail": budget_detail,
+        "budget_adj_note": budget_adj_note,
+        "goal_note": goal_note
     }
 
-# --- CRUD HELPER FUNCTIONS (UNCHANGED) ---
+if PLAN_MATRIX_ENABLED:
+    PLAN_MATRIX = PlanMatrix.build(TEMPLATES, select_templates, plan_params, workers=PLAN_MATRIX_WORKERS)
+    print("Plan matrix: {plans} plans from {parts} parts in {warmup_seconds}s on {workers} process(es), "
+          "{parts_kib} KiB of parts + {table_kib} KiB table".format(**PLAN_MATRIX.stats))
+
+# --- APP FACTORY ---
+
+# The 'compact' backend stores template-generated plans as references and re-renders them on read
+plan_codec = TemplatePlanCodec(TEMPLATES, select_templates, render_plan)
+
+# Everything above is built once at import and only read afterwards, so a server can import
+# the module, then fork its workers (see gunicorn.conf.py). The resources below own threads,
+# open files or connections, none of which survive fork(): create_app() opens them in each
+# process that serves requests.
+storage = None
+history_cache = None
+search_cache = None
+generator = None
+jobs = None
+batch_executor = None
+archive = None
+compactor = None
+_created_pid = None
+_create_lock = threading.Lock()
+
+def create_app():
+    """
+    The application factory: opens this process's resources (open_resources) and returns
+    a new Flask app serving the api routes, with CORS and the request metrics hooks.
+    Servers call it once per worker process, after forking (see wsgi.py).
+    """
+    open_resources()
+    app = Flask(__name__)
+    # Enable CORS for Streamlit running on a different port/origin
+    CORS(app)
+    app.register_blueprint(api)
+    app.before_request(start_request_timer)
+    app.after_request(record_request_metrics)
+    return app
+
+def open_resources():
+    """
+    Opens this process's storage, history caches, generator, job manager, batch pool and
+    archive (plus the compaction thread when retention is on). Idempotent; a forked child
+    gets its own set on first call.
+    """
+    global storage, history_cache, search_cache, generator, jobs, batch_executor, archive, compactor, _created_pid
+    with _create_lock:
+        if _created_pid == os.getpid():
+            return
+
+        storage = create_storage(STORAGE_BACKEND, PLANS_FILE, PLANS_LOG_FILE, PLANS_DB_FILE,
+                                 compact_file=PLANS_COMPACT_FILE, codec=plan_codec, compress=PLANS_COMPRESS)
+        atexit.register(storage.close)
+
+        # Parsed history kept in memory and revalidated against the storage file on each read
+        history_cache = HistoryCache(storage) if HISTORY_CACHE_ENABLED else None
+        # /plans/search and /plans/stats are answered from the cache's secondary indexes, so they keep one even with HISTORY_CACHE=0
+        search_cache = history_cache if history_cache is not None else HistoryCache(storage)
+
+        # 'mock' (default) fills the local templates; 'http' calls the LLM at LLM_API_URL through a
+        # pooled session with a concurrency cap, jittered retries and request coalescing.
+        generator = create_generator_backend(
+            GENERATOR_BACKEND,
+            get_mock_plan_data,
+            mock_delay_seconds=MOCK_DELAY_SECONDS,
+            api_url=LLM_API_URL,
+            api_key=GEMINI_API_KEY,
+            stream_url=LLM_STREAM_URL,
+            timeout=LLM_TIMEOUT,
+            max_in_flight=LLM_MAX_IN_FLIGHT,
+            max_retries=LLM_MAX_RETRIES
+        )
+        atexit.register(generator.close)
+
+        jobs = JobManager(max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, result_ttl=JOB_RESULT_TTL,
+                          state_dir=JOB_STATE_DIR)
+        atexit.register(jobs.shutdown)
+
+        batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='plan-batch')
+
+        # Plans retention moved out of storage; read only by /plans/<id> misses and /plans/archive
+        archive = PlanArchive(PLANS_ARCHIVE_DIR)
+        compactor = None
+        if RETENTION_POLICY.enabled:
+            compactor = RetentionCompactor(storage, archive, RETENTION_POLICY, interval=PLANS_COMPACT_INTERVAL,
+                                           on_report=record_compaction)
+            compactor.start()
+            atexit.register(compactor.stop)
+
+        _created_pid = os.getpid()
+
+def record_compaction(report):
+    """Called on the compaction thread after each run: updates the metrics and reloads the history cache off the request path."""
+    COMPACTION_SECONDS.observe(report['seconds'])
+    PLANS_ARCHIVED.inc(report['archived'])
+    BYTES_RECLAIMED.inc(max(0, report['bytes_reclaimed']))
+    if report['removed'] and history_cache is not None:
+        history_cache.refresh()
+
+# --- CRUD HELPER FUNCTIONS ---
 
 def load_plans():
-    """Loads plans from the JSON file."""
-    if os.path.exists(PLANS_FILE):
-        with open(PLANS_FILE, 'r') as f:
-            try:
-                # Load existing data. Return empty list if file is empty or corrupted.
-                return json.load(f)
-            except json.JSONDecodeError:
-                return []
-    return []
+    """Loads all plans, from the in-process history cache when it is enabled."""
+    with timed(HISTORY_LOAD_SECONDS):
+        if history_cache is not None:
+            return history_cache.plans()
+        return storage.load_all()
+
+def query_plans(limit, before_id, filters):
+    """One page of plans, newest first. SQLite answers from its indexes; file backends from the cache."""
+    if history_cache is not None and storage.name != 'sqlite':
+        return history_cache.query(limit=limit, before_id=before_id, filters=filters)
+    return storage.query(limit=limit, before_id=before_id, filters=filters)
+
+def get_plan(plan_id):
+    """
+    One saved plan by id, or None. SQLite looks it up by primary key; file backends use the cache.
+    Plans retention moved out of storage are looked up in the archive.
+    """
+    if history_cache is not None and storage.name != 'sqlite':
+        plan = history_cache.get(plan_id)
+    else:
+        plan = storage.get(plan_id)
+    return plan if plan is not None else archive.get(plan_id)
+
+def plans_response(value):
+    """
+    A JSON response for saved plans and pages of them. Plans from the history cache
+    hold plan_model nodes, which jsonify cannot encode; their cached encoding is reused.
+    """
+    return Response(encode_plans(value), mimetype='application/json')
+
+def plan_summary(plan):
+    """A saved plan without its 'plan' body (id, timestamp and inputs), for history listings."""
+    return {field: value for field, value in plan.items() if field != 'plan'}
+
+def save_plan(plan):
+    """Appends a single plan to storage (O(1) with the 'jsonl' backend)."""
+    save_plans([plan])
+
+def save_plans(plans):
+    """Appends several plans to storage in one write."""
+    with timed(STORAGE_WRITE_SECONDS, backend=storage.name):
+        storage.append_many(plans)
+    PLANS_WRITTEN.inc(len(plans))
 
 def save_plans_to_file(plans):
-    """Saves plans to the JSON file."""
-    # Ensure the directory exists if needed, though for a local file it's usually fine
-    with open(PLANS_FILE, 'w') as f:
-        json.dump(plans, f, indent=4)
+    """Replaces the whole stored history with the given list of plans."""
+    storage.rewrite(plans)
 
 # --- AI SCHEMA AND PROMPT FUNCTIONS (REMOVED for brevity and mock use) ---
 
-def call_gemini_api(prompt):
+def call_gemini_api(data):
     """
-    ***MOCK MODE ACTIVE***: This function now returns structured data for testing 
-    instead of calling the external Gemini API.
+    ***MOCK MODE ACTIVE*** by default: returns structured data from the template
+    mock instead of calling the external Gemini API (set GENERATOR_BACKEND=http to call it).
+    It takes the inputs explicitly so it can run outside the request thread.
     """
-    
-    # In mock mode, we use the user inputs to make the mock response seem dynamic
-    data = request.json
-    time.sleep(1) # Simulate a short delay to show the loading screen works
-    return get_mock_plan_data(data)
+    with timed(PLAN_GENERATION_SECONDS, backend=generator.name):
+        return generator.generate(data)
+
+def read_json_body(limit):
+    """The request's JSON body, or None if it is not JSON. A body over limit bytes raises InputError (413) unread."""
+    request.max_content_length = limit
+    try:
+        return request.get_json(silent=True)
+    except RequestEntityTooLarge:
+        raise InputError(f"Payload too large (limit {limit} bytes)", status=413) from None
+
+def read_plan_inputs():
+    """The request's generation inputs, checked and canonicalized (see plan_inputs) before any generation or storage I/O."""
+    return validate_inputs(read_json_body(MAX_INPUT_BYTES))
+
+def build_plan_entry(data):
+    """
+    Generates a plan for the given inputs and wraps it in the stored format (not saved yet).
+    The id is assigned by storage when the entry is saved, so it is unique across worker processes.
+    """
+    # 2. Generate Plan using MOCK
+    plan_data = call_gemini_api(data) # Call the mock function
+    return new_plan_entry(data, plan_data)
+
+def new_plan_entry(data, plan_data):
+    """Wraps a generated plan in the stored format, with the id left for storage to assign."""
+    return {
+        "id": None,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "inputs": data,
+        "plan": plan_data
+    }
+
+def create_plan(data):
+    """Generates a plan for the given inputs and saves it. Returns the saved object."""
+    new_plan = build_plan_entry(data)
+    # 3. Save the generated structured plan (CRUD LOGIC)
+    save_plan(new_plan)
+    return new_plan
+
+def generate_batch_item(data):
+    """Builds one batch entry; returns (entry, None) or (None, error message)."""
+    try:
+        inputs = validate_inputs(data)
+    except InputError as e:
+        return None, str(e)
+    try:
+        return build_plan_entry(inputs), None
+    except Exception as e:
+        print(f"Batch item failed: {e}")
+        return None, f"Generation failed: {e}"
 
 # --- FLASK ROUTES ---
 
-@app.route('/generate_plan', methods=['POST'])
+@api.route('/generate_plan', methods=['POST'])
 def generate_plan():
-    """Endpoint to receive user data, generate the plan via AI MOCK, and SAVE the result (C - Create)."""
+    """
+    Endpoint to receive user data, generate the plan via AI MOCK, and SAVE the result (C - Create).
+    With '?async=1' the plan is generated on the job pool: the response is 202 with a
+    job id right away, and the saved object is available from /jobs/<job_id>.
+    """
     try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "No input data provided"}), 400
-        
-        # 2. Generate Plan using MOCK
-        plan_data = call_gemini_api(None) # Call the mock function
-        
-        # 3. Save the generated structured plan (CRUD LOGIC)
-        plans = load_plans()
-        plan_id = int(time.time() * 1000)
-        new_plan = {
-            "id": plan_id,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "inputs": data,
-            "plan": plan_data
-        }
-        plans.append(new_plan)
-        save_plans_to_file(plans)
+        data = read_plan_inputs()
+
+        if request.args.get('async', '0').lower() in ('1', 'true', 'yes'):
+            try:
+                job = jobs.submit(create_plan, data)
+            except JobQueueFull as e:
+                return jsonify({"error": str(e)}), 503
+            response = job.to_dict()
+            response["status_url"] = f"/jobs/{job.job_id}"
+            return jsonify(response), 202
+
+        new_plan = create_plan(data)
 
         # 4. Return the full saved object
-        return jsonify(new_plan)
+        with timed(SERIALIZATION_SECONDS, endpoint='generate_plan'):
+            return jsonify(new_plan)
 
+    except InputError as e:
+        return jsonify({"error": str(e)}), e.status
+    except GeneratorError as e:
+        print(f"Plan generator failed: {e}")
+        return jsonify({"error": f"The plan generator failed. Error: {e}"}), 502
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return jsonify({
@@ -309,23 +558,385 @@ def generate_plan():
             "status": "500 Internal Server Error"
         }), 500
 
-@app.route('/get_plans', methods=['GET'])
+def stream_plan_events(data):
+    """
+    Generates a plan day by day and yields it as NDJSON events: 'workout_day' for each
+    workout day, then 'meal_day' for each meal day, as the generator produces them,
+    and 'meal_budget' with the week's cost against the budget when the plan has one.
+    The plan is saved once it is complete and 'saved' reports its id and timestamp;
+    a failure after the response has started is reported as an 'error' event.
+    """
+    plan_data = {"workoutPlan": [], "mealPlan": []}
+    try:
+        start = time.perf_counter()
+        for section, value in generator.generate_stream(data):
+            if section == 'mealBudget':
+                plan_data[section] = value
+                yield _event("meal_budget", budget=value)
+                continue
+            plan_data[section].append(value)
+            yield _event("workout_day" if section == 'workoutPlan' else "meal_day", day=value)
+        PLAN_GENERATION_SECONDS.observe(time.perf_counter() - start, backend=generator.name)
+
+        new_plan = new_plan_entry(data, plan_data)
+        save_plan(new_plan)
+        yield _event("saved", id=new_plan['id'], timestamp=new_plan['timestamp'])
+    except Exception as e:
+        print(f"Streamed plan generation failed: {e}")
+        yield _event("error", error=f"Plan generation failed: {e}")
+
+def _event(name, **fields):
+    return json.dumps({"event": name, **fields}, ensure_ascii=False).encode('utf-8') + b'\n'
+
+@api.route('/generate_plan/stream', methods=['POST'])
+def generate_plan_stream():
+    """
+    Like /generate_plan, but the response is a chunked NDJSON stream of the plan's days
+    (see stream_plan_events), so clients can show the workout plan before the meal
+    plan has been generated.
+    """
+    try:
+        data = read_plan_inputs()
+    except InputError as e:
+        return jsonify({"error": str(e)}), e.status
+    return Response(stream_with_context(stream_plan_events(data)), mimetype='application/x-ndjson')
+
+@api.route('/generate_plans/batch', methods=['POST'])
+def generate_plans_batch():
+    """
+    Generates plans for a whole cohort in one call (C - Create).
+    Accepts a JSON list of input payloads (or {"items": [...]}), generates them
+    concurrently on the batch pool and saves every successful plan with a single
+    storage write. Each result carries its index and either the saved plan or an error.
+    """
+    try:
+        body = read_json_body(BATCH_MAX_ITEMS * MAX_INPUT_BYTES)
+        items = body.get('items') if isinstance(body, dict) else body
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Expected a non-empty list of input payloads"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Batch too large: {len(items)} items (limit {BATCH_MAX_ITEMS})"}), 413
+
+        outcomes = list(batch_executor.map(generate_batch_item, items))
+
+        saved = [entry for entry, _ in outcomes if entry is not None]
+        save_plans(saved)
+
+        results = []
+        for index, (entry, error) in enumerate(outcomes):
+            if entry is not None:
+                results.append({"index": index, "plan": entry})
+            else:
+                results.append({"index": index, "error": error})
+        return jsonify({
+            "results": results,
+            "succeeded": len(saved),
+            "failed": len(items) - len(saved)
+        })
+
+    except InputError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        print(f"Batch generation failed: {e}")
+        return jsonify({"error": f"Batch generation failed: {e}"}), 500
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of an async generation job; includes the saved plan once it is done."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job.to_dict())
+
+def parse_int_arg(args, name, default=None):
+    """The integer query parameter name, or default when it is absent. Raises ValueError if it is not an integer."""
+    if name not in args:
+        return default
+    value = args.get(name, type=int)
+    if value is None:
+        raise ValueError(f"'{name}' must be an integer")
+    return value
+
+def parse_page_args(args, default_limit):
+    """
+    Reads 'limit' (default_limit when absent) and 'before_id' of a paginated query.
+    Returns (limit, before_id); raises ValueError on bad values.
+    """
+    limit = parse_int_arg(args, 'limit', default_limit)
+    before_id = parse_int_arg(args, 'before_id')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return limit, before_id
+
+def parse_plan_query(args):
+    """
+    Reads the pagination/filter query string of /get_plans.
+    Returns (limit, before_id, filters); raises ValueError on bad values.
+    """
+    limit, before_id = parse_page_args(args, MAX_PAGE_SIZE)
+
+    filters = {}
+    for field in FILTER_FIELDS:
+        if field in args:
+            filters[field] = args.get(field, type=int) if field == 'budget' else canonical_value(field, args[field])
+            if filters[field] is None:
+                raise ValueError(f"'{field}' must be an integer")
+    return limit, before_id, filters
+
+def stream_plans(stream_format, order):
+    """
+    Streams the whole history one plan at a time, so memory per request stays
+    flat regardless of history size. 'ndjson' sends one plan per line; 'array'
+    sends the same JSON array as the non-streaming response, encoded incrementally.
+    """
+    if stream_format not in ('ndjson', 'array'):
+        return jsonify({"error": "'stream' must be 'ndjson' or 'array'"}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "'order' must be 'asc' or 'desc'"}), 400
+    encoded_plans = storage.iter_encoded(newest_first=(order == 'desc'))
+
+    def generate_ndjson():
+        for encoded in encoded_plans:
+            yield encoded + b'\n'
+
+    def generate_array():
+        yield b'['
+        separator = b''
+        for encoded in encoded_plans:
+            yield separator + encoded
+            separator = b','
+        yield b']'
+
+    if stream_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_array()), mimetype='application/json')
+
+@api.route('/get_plans', methods=['GET'])
 def get_plans():
-    """Endpoint to read all saved plans (R - Read)."""
+    """
+    Endpoint to read saved plans (R - Read).
+    Without query parameters every plan is returned as a JSON array.
+    '?stream=ndjson|array' (optionally '&order=desc') streams the history instead. With any of
+    'limit', 'before_id' or an inputs filter (goal, level, equipment, cuisine,
+    budget) one page is returned newest first, along with the cursor for the next page.
+    'view=summary' leaves the plan bodies out of the page (fetch them from /plans/<id>).
+    """
     try:
-        plans = load_plans()
-        # Returns all plans in the file
-        return jsonify(plans)
+        if not request.args:
+            # Returns all plans in storage
+            if history_cache is None:
+                plans = load_plans()
+                with timed(SERIALIZATION_SECONDS, endpoint='get_plans'):
+                    return jsonify(plans)
+            # Serve the pre-serialized history; unchanged polls get 304 Not Modified
+            with timed(HISTORY_LOAD_SECONDS):
+                history_cache.refresh()
+            with timed(SERIALIZATION_SECONDS, endpoint='get_plans'):
+                body, etag = history_cache.serialized()
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        if 'stream' in request.args:
+            return stream_plans(request.args.get('stream'), request.args.get('order', 'asc'))
+
+        view = request.args.get('view', 'full')
+        if view not in ('full', 'summary'):
+            return jsonify({"error": "'view' must be 'full' or 'summary'"}), 400
+        try:
+            limit, before_id, filters = parse_plan_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        plans = query_plans(limit, before_id, filters)
+        next_before_id = plans[-1]['id'] if len(plans) == limit else None
+        if view == 'summary':
+            plans = [plan_summary(plan) for plan in plans]
+        return plans_response({"plans": plans, "next_before_id": next_before_id})
     except Exception as e:
         print(f"Failed to retrieve plans: {e}")
         return jsonify({"error": f"Failed to retrieve plans: {e}"}), 500
 
+@api.route('/plans/<int:plan_id>', methods=['GET'])
+def get_saved_plan(plan_id):
+    """One saved plan by id (R - Read), so clients can list summaries and fetch bodies on demand."""
+    try:
+        plan = get_plan(plan_id)
+        if plan is None:
+            return jsonify({"error": f"Unknown plan {plan_id}"}), 404
+        return plans_response(plan)
+    except Exception as e:
+        print(f"Failed to retrieve plan {plan_id}: {e}")
+        return jsonify({"error": f"Failed to retrieve plan: {e}"}), 500
+
+
+def parse_search_criteria(args):
+    """
+    Reads the filters shared by /plans/search and /plans/stats into PlanIndex.match criteria:
+    exact inputs fields (repeat a field to accept several values), budget / budget_min / budget_max,
+    from / to timestamps ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS', inclusive) and exercise / meal names.
+    Raises ValueError on bad values.
+    """
+    criteria = {}
+    fields = {field: [canonical_value(field, value) for value in args.getlist(field)]
+              for field in INDEXED_FIELDS if field in args}
+    if fields:
+        criteria['fields'] = fields
+    for name in ('budget', 'budget_min', 'budget_max'):
+        if name in args and args.get(name, type=float) is None:
+            raise ValueError(f"'{name}' must be a number")
+    if 'budget' in args:
+        criteria['budget_min'] = criteria['budget_max'] = args.get('budget', type=float)
+    if 'budget_min' in args:
+        criteria['budget_min'] = args.get('budget_min', type=float)
+    if 'budget_max' in args:
+        criteria['budget_max'] = args.get('budget_max', type=float)
+    criteria.update(parse_time_range(args))
+    for name in ('exercise', 'meal'):
+        if name in args:
+            criteria[name] = args[name]
+    return criteria
+
+def parse_time_range(args):
+    """The 'from' / 'to' timestamps of the query string as {'time_from', 'time_to'} (only those given)."""
+    time_range = {}
+    if 'from' in args:
+        time_range['time_from'] = args['from']
+    if 'to' in args:
+        # A bare date includes the whole day
+        time_range['time_to'] = args['to'] + ' 23:59:59' if len(args['to']) == 10 else args['to']
+    return time_range
+
+@api.route('/plans/search', methods=['GET'])
+def search_plans():
+    """
+    Plans matching the filters (see parse_search_criteria), newest first, answered from
+    the secondary indexes. Paginated like /get_plans with 'limit' and 'before_id'.
+    Returns {"plans", "total", "next_before_id"}.
+    """
+    try:
+        try:
+            limit, before_id = parse_page_args(request.args, 50)
+            criteria = parse_search_criteria(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        plans, total = search_cache.search(limit=limit, before_id=before_id, **criteria)
+        next_before_id = plans[-1]['id'] if len(plans) == limit else None
+        return plans_response({"plans": plans, "total": total, "next_before_id": next_before_id})
+    except Exception as e:
+        print(f"Plan search failed: {e}")
+        return jsonify({"error": f"Plan search failed: {e}"}), 500
+
+@api.route('/plans/stats', methods=['GET'])
+def plans_stats():
+    """
+    Aggregates over the plans matching the filters (see parse_search_criteria): the count,
+    the daily budget distribution and the 'top' (default 10) most frequent exercises and
+    meals. 'group_by' (an inputs field or 'month') adds counts per value.
+    """
+    try:
+        group_by = request.args.get('group_by')
+        if group_by is not None and group_by not in GROUP_BY_FIELDS:
+            return jsonify({"error": f"'group_by' must be one of: {', '.join(GROUP_BY_FIELDS)}"}), 400
+        try:
+            top = parse_int_arg(request.args, 'top', 10)
+            if not 1 <= top <= 100:
+                raise ValueError("'top' must be between 1 and 100")
+            criteria = parse_search_criteria(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(search_cache.plan_stats(group_by=group_by, top=top, **criteria))
+    except Exception as e:
+        print(f"Plan statistics failed: {e}")
+        return jsonify({"error": f"Plan statistics failed: {e}"}), 500
+
+
+@api.route('/plans/archive', methods=['GET'])
+def archived_plans():
+    """
+    Plans retention moved to the archive, newest first, optionally within 'from' / 'to'
+    (as in /plans/search). Paginated with 'limit' (default 50) and 'before_id'.
+    Returns {"plans", "next_before_id"}; a single archived plan is also served by /plans/<id>.
+    """
+    try:
+        try:
+            limit, before_id = parse_page_args(request.args, 50)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        plans = archive.query(limit=limit, before_id=before_id, **parse_time_range(request.args))
+        next_before_id = plans[-1]['id'] if len(plans) == limit else None
+        return plans_response({"plans": plans, "next_before_id": next_before_id})
+    except Exception as e:
+        print(f"Archive query failed: {e}")
+        return jsonify({"error": f"Archive query failed: {e}"}), 500
+
+@api.route('/plans/retention', methods=['GET'])
+def retention_status():
+    """The retention policy, this process's last compaction report and the archive totals."""
+    return jsonify({
+        "policy": RETENTION_POLICY.to_dict(),
+        "enabled": compactor is not None,
+        "interval_seconds": PLANS_COMPACT_INTERVAL,
+        "runs": compactor.runs if compactor is not None else 0,
+        "last_run": compactor.last_report if compactor is not None else None,
+        "archive": archive.stats(),
+    })
+
+@api.route('/plans/compact', methods=['POST'])
+def compact_plans():
+    """Starts a compaction run on the background thread; its report shows up on /plans/retention."""
+    if compactor is None:
+        return jsonify({"error": "Retention is off (set PLANS_RETAIN_PER_PROFILE or PLANS_RETAIN_DAYS)"}), 409
+    compactor.trigger()
+    return jsonify({"status": "scheduled", "status_url": "/plans/retention"}), 202
+
+
+@api.route('/plan_cache/stats', methods=['GET'])
+def plan_cache_stats():
+    """Hit/miss/eviction counters of the generated-plan cache, plus the plan matrix warm-up report."""
+    stats = PLAN_CACHE.stats()
+    if PLAN_MATRIX is not None:
+        stats['matrix'] = PLAN_MATRIX.stats
+    return jsonify(stats)
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics for this process."""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profiler = profiler.start(request.headers)
+
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    # Labeled by route function ('generate_plan'), without the blueprint's 'api.' prefix
+    endpoint = (request.endpoint or 'unknown').rpartition('.')[2]
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    if request.content_length:
+        REQUEST_BYTES.observe(request.content_length, endpoint=endpoint)
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_BYTES.observe(response.content_length, endpoint=endpoint)
+    if g.get('profiler') is not None:
+        dump_path = profiler.finish(g.profiler, endpoint, elapsed)
+        if dump_path:
+            print(f"Profiled {request.method} {request.path} in {elapsed * 1000:.1f} ms -> {dump_path}")
+            response.headers['X-Profile-Dump'] = dump_path
+    return response
+
 
-@app.route('/', methods=['GET'])
+@api.route('/', methods=['GET'])
 def home():
     """Simple check to ensure the server is running."""
     return "Flask Backend is running! (MOCK MODE ACTIVE)"
 
 if __name__ == '__main__':
     # Flask is set to run on port 5000 by default
-    app.run(host='127.0.0.1', port=5000)
+    create_app().run(host='127.0.0.1', port=5000)
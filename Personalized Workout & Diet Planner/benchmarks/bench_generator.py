@@ -0,0 +1,150 @@
+"""
+Benchmarks get_mock_plan_data over every goal/level/equipment/intensity/cuisine combination,
+the precomputed plan matrix (warm-up time, memory and lookups),
+the meal planner on a large synthetic catalog (pure Python vs. NumPy),
+and the http backend's time to the first streamed day against the stub LLM server.
+"""
+import itertools
+import random
+import time
+
+import meal_planner
+from common import bench, summarize
+from generator_backends import HttpLLMBackend
+from meal_planner import MealCatalog, MealPlanner
+from plan_matrix import PlanMatrix
+from stub_llm_server import start_stub_server
+
+GOALS = ['Weight Loss', 'Muscle Gain', 'Healthy Maintenance']
+LEVELS = ['Beginner', 'Intermediate', 'Advanced']
+EQUIPMENT = ['Bodyweight Only', 'Light Weights/Bands', 'Full Gym Access']
+INTENSITIES = ['Extremely Limited (15 min/day)', 'Busy Student (45 min max)', 'Flexible (up to 90 min)']
+CUISINES = ['Any/Global', 'South Asian', 'Latino', 'American/Comfort']
+BUDGETS = [100, 500, 2000]
+STUB_DELAY_SECONDS = 0.2 # Time the stub takes to produce a whole plan
+SYNTHETIC_MEALS_PER_SLOT = 2000
+
+
+def all_inputs():
+    for goal, level, equipment, intensity, cuisine, budget in itertools.product(
+            GOALS, LEVELS, EQUIPMENT, INTENSITIES, CUISINES, BUDGETS):
+        yield {"goal": goal, "level": level, "equipment": equipment, "intensity": intensity,
+               "cuisine": cuisine, "budget": budget, "workouts_per_week": 3}
+
+
+def run(app, quick=False):
+    inputs = list(all_inputs())
+    if quick:
+        inputs = inputs[::7]
+    results = {}
+
+    def generate_all():
+        for data in inputs:
+            app.get_mock_plan_data(data)
+
+    # Uncached: every call fills the templates
+    saved_size = app.PLAN_CACHE.max_size
+    app.PLAN_CACHE.max_size = 0
+    app.PLAN_CACHE.clear()
+    try:
+        results['generator/uncached/per_plan'] = bench(
+            lambda: app.get_mock_plan_data(inputs[0]), repeat=200 if quick else 2000)
+        results[f'generator/uncached/combinations_{len(inputs)}'] = bench(
+            generate_all, repeat=3 if quick else 10)
+    finally:
+        app.PLAN_CACHE.max_size = saved_size
+
+    # Cached: repeated profiles are served from PLAN_CACHE
+    generate_all()
+    results[f'generator/cached/combinations_{len(inputs)}'] = bench(
+        generate_all, repeat=3 if quick else 10)
+
+    results.update(run_plan_matrix(app, inputs, repeat=3 if quick else 10))
+    results.update(run_meal_planner(repeat=20 if quick else 200))
+    results.update(run_llm_stream(inputs, repeat=5 if quick else 20))
+    return results
+
+
+def run_plan_matrix(app, inputs, repeat):
+    """Startup cost of PLAN_MATRIX=1 and generation when every plan is a lookup."""
+    warmups = []
+    for _ in range(1 if repeat < 10 else 3):
+        matrix = PlanMatrix.build(app.TEMPLATES, app.select_templates, app.plan_params)
+        warmups.append(matrix.stats['warmup_seconds'])
+    results = {'generator/matrix/warmup': summarize(
+        warmups, plans=matrix.stats['plans'], parts=matrix.stats['parts'], workers=matrix.stats['workers'],
+        parts_kib=matrix.stats['parts_kib'], table_kib=matrix.stats['table_kib'])}
+
+    def generate_all():
+        for data in inputs:
+            app.get_mock_plan_data(data)
+
+    saved_matrix = app.PLAN_MATRIX
+    app.PLAN_MATRIX = matrix
+    try:
+        results['generator/matrix/per_plan'] = bench(
+            lambda: app.get_mock_plan_data(inputs[0]), repeat=200 if repeat < 10 else 2000)
+        results[f'generator/matrix/combinations_{len(inputs)}'] = bench(generate_all, repeat=repeat)
+    finally:
+        app.PLAN_MATRIX = saved_matrix
+    return results
+
+
+def synthetic_catalog(meals_per_slot=SYNTHETIC_MEALS_PER_SLOT, seed=42):
+    """One cuisine with meals_per_slot random meals per slot."""
+    rng = random.Random(seed)
+    meals = []
+    for slot in meal_planner.SLOTS:
+        for i in range(meals_per_slot):
+            meals.append({"name": f"{slot} {i}", "slot": slot, "cuisine": "synthetic",
+                          "cost_inr": rng.randint(25, 400), "calories": rng.uniform(150, 900),
+                          "protein_g": rng.uniform(2, 50), "recipe": ""})
+    return MealCatalog(meals)
+
+
+def run_meal_planner(repeat):
+    """Time to plan one week from the synthetic catalog, pure Python vs. NumPy (when installed)."""
+    catalog = synthetic_catalog()
+    goals = list(meal_planner.GOAL_PROFILES)
+    weeks = itertools.cycle([(goal, budget * 7, variation) for goal in goals
+                             for budget in BUDGETS for variation in range(1, meal_planner.PLAN_VARIATIONS + 1)])
+    paths = {'python': False}
+    if meal_planner.numpy_available():
+        paths['numpy'] = True
+    results = {}
+    for name, use_numpy in paths.items():
+        planner = MealPlanner(catalog, use_numpy=use_numpy)
+
+        def plan_next():
+            goal, weekly_budget, variation = next(weeks)
+            planner.plan_week('synthetic', goal, weekly_budget, variation)
+
+        results[f'generator/meal_planner/{name}_{len(catalog)}_meals'] = bench(plan_next, repeat=repeat)
+    return results
+
+
+def run_llm_stream(inputs, repeat):
+    """Full-plan latency vs. time to the first streamed day of the http backend (stub answers in STUB_DELAY_SECONDS)."""
+    server, url = start_stub_server(delay=STUB_DELAY_SECONDS)
+    backend = HttpLLMBackend(url, stream_url=url.replace('/generate', '/stream'))
+    try:
+        full_latencies, first_day_latencies = [], []
+        # Distinct inputs per call, so request coalescing never hides a call
+        for data in inputs[:repeat]:
+            start = time.perf_counter()
+            backend.generate(data)
+            full_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            stream = backend.generate_stream(data)
+            next(stream)
+            first_day_latencies.append(time.perf_counter() - start)
+            for _ in stream:
+                pass
+    finally:
+        backend.close()
+        server.shutdown()
+    return {
+        'generator/http_stub/full_plan': summarize(full_latencies),
+        'generator/http_stub/stream_first_day': summarize(first_day_latencies),
+    }
@@ -0,0 +1,65 @@
+"""End-to-end benchmarks of /generate_plan and /get_plans via the test client and a concurrent load generator."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+from common import bench, summarize, synthetic_history
+
+PAYLOAD = {"goal": "Muscle Gain", "level": "Intermediate", "equipment": "Full Gym Access",
+           "intensity": "Busy Student (45 min max)", "budget": 500, "cuisine": "South Asian",
+           "workouts_per_week": 4}
+
+
+def run_load(url, method, concurrency, total_requests, payload=None):
+    """Fires total_requests at url from `concurrency` threads, each with its own keep-alive session."""
+    local = threading.local()
+
+    def one_request(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        response = session.request(method, url, json=payload, timeout=60)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one_request, range(total_requests)))
+    return summarize(latencies, wall_seconds=time.perf_counter() - start, concurrency=concurrency)
+
+
+def run(app, quick=False, history_size=None):
+    history_size = history_size or (1000 if quick else 10000)
+    app.save_plans_to_file(synthetic_history(history_size))
+    flask_app = app.create_app()
+    client = flask_app.test_client()
+    results = {}
+
+    results['http/test_client/generate_plan'] = bench(
+        lambda: client.post('/generate_plan', json=PAYLOAD), repeat=50 if quick else 300)
+    results['http/test_client/generate_plan_stream'] = bench(
+        lambda: client.post('/generate_plan/stream', json=PAYLOAD).get_data(), repeat=50 if quick else 300)
+    results[f'http/test_client/get_plans/{history_size}'] = bench(
+        lambda: client.get('/get_plans'), repeat=10 if quick else 50, measure_memory=not quick)
+    results[f'http/test_client/get_plans_page/{history_size}'] = bench(
+        lambda: client.get('/get_plans?limit=20'), repeat=20 if quick else 100)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR) # No access log line per request
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        for concurrency in ([4] if quick else [1, 8, 32]):
+            results[f'http/load/generate_plan/c{concurrency}'] = run_load(
+                base_url + '/generate_plan', 'POST', concurrency, 100 if quick else 1000, PAYLOAD)
+            results[f'http/load/get_plans_page/c{concurrency}'] = run_load(
+                base_url + '/get_plans?limit=20', 'GET', concurrency, 100 if quick else 1000)
+    finally:
+        server.shutdown()
+    return results
@@ -0,0 +1,51 @@
+"""Cold-start benchmarks: importing app.py, create_app() and the first request, each in a fresh interpreter."""
+import json
+import os
+import subprocess
+import sys
+
+from common import APP_DIR, sandbox_dir, summarize
+
+# Runs in a fresh interpreter inside a sandbox directory and prints its timings as JSON.
+PROBE_CODE = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+flask_app.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "first_request": served - created,
+    "modules": len(sys.modules),
+    "requests": 'requests' in sys.modules,
+    "numpy": 'numpy' in sys.modules,
+}))
+"""
+
+
+def probe(env):
+    """One cold start in a new process; returns the probe's timings."""
+    output = subprocess.check_output([sys.executable, '-c', PROBE_CODE, APP_DIR], cwd=sandbox_dir(),
+                                     env=dict(os.environ, **env), text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(app, quick=False):
+    # The child processes import the app themselves; the already imported one is not used
+    repeat = 5 if quick else 20
+    env = {'PLANS_STORAGE': 'jsonl', 'GENERATOR_BACKEND': 'mock', 'PLAN_MATRIX': '0'}
+    probes = [probe(env) for _ in range(repeat)]
+    last = probes[-1]
+    loaded = {"modules": last['modules'], "imports_requests": last['requests'], "imports_numpy": last['numpy']}
+
+    results = {}
+    for phase in ('import', 'create_app', 'first_request'):
+        results[f'startup/{phase}'] = summarize([p[phase] for p in probes], **loaded)
+    results['startup/total'] = summarize(
+        [p['import'] + p['create_app'] + p['first_request'] for p in probes], **loaded)
+    return results
@@ -0,0 +1,134 @@
+"""Benchmarks loading and saving histories of 10 to 100k synthetic plans on every storage backend."""
+import gc
+import os
+import threading
+import time
+import tracemalloc
+
+from common import bench, generated_history, sandbox_dir, summarize, synthetic_history
+from history_cache import HistoryCache
+from retention import RetentionCompactor, RetentionPolicy
+from storage import PlanArchive, create_storage
+
+FULL_SIZES = [10, 100, 1000, 10000, 100000]
+QUICK_SIZES = [10, 100, 1000]
+BACKENDS = ['json', 'jsonl', 'sqlite']
+# Template-generated histories: full JSONL lines vs. compact references (plain and gzip)
+GENERATED_BACKENDS = [('jsonl', False), ('compact', False), ('compact', True)]
+
+
+def _repeats(size):
+    return max(3, min(50, 20000 // size))
+
+
+def run(app, quick=False, sizes=None):
+    sizes = sizes or (QUICK_SIZES if quick else FULL_SIZES)
+    results = {}
+    for backend in BACKENDS:
+        for size in sizes:
+            history = synthetic_history(size)
+            workdir = sandbox_dir()
+            paths = [os.path.join(workdir, name) for name in
+                     ('plans_data.json', 'plans_data.jsonl', 'plans_data.sqlite3')]
+            storage = create_storage(backend, *paths)
+            repeat = _repeats(size)
+            # Every legacy append rewrites the whole file: keep large sizes to a few samples
+            append_repeat = 3 if backend == 'json' and size >= 10000 else repeat * 4
+
+            prefix = f"storage/{backend}/{size}"
+            results[f"{prefix}/save_all"] = bench(lambda: storage.rewrite(history), repeat=repeat,
+                                                  measure_memory=size <= 10000)
+            results[f"{prefix}/load_all"] = bench(storage.load_all, repeat=repeat,
+                                                  measure_memory=size <= 10000)
+            next_id = [history[-1]['id']]
+
+            def append_one():
+                next_id[0] += 1
+                storage.append(dict(history[0], id=next_id[0]))
+
+            results[f"{prefix}/append_one"] = bench(append_one, repeat=append_repeat, measure_memory=False)
+            storage.close()
+
+    for backend, compress in GENERATED_BACKENDS:
+        for size in sizes:
+            history = generated_history(app, size)
+            workdir = sandbox_dir()
+            paths = [os.path.join(workdir, name) for name in
+                     ('plans_data.json', 'plans_data.jsonl', 'plans_data.sqlite3', 'plans_data.compact.jsonl')]
+            storage = create_storage(backend, *paths[:3], compact_file=paths[3],
+                                     codec=app.plan_codec, compress=compress)
+            repeat = _repeats(size)
+            prefix = f"storage/generated/{backend}{'-gzip' if compress else ''}/{size}"
+            results[f"{prefix}/save_all"] = bench(lambda: storage.rewrite(history), repeat=repeat,
+                                                  measure_memory=size <= 10000)
+            results[f"{prefix}/save_all"]["file_kib"] = round(os.path.getsize(storage.path) / 1024, 1)
+            results[f"{prefix}/load_all"] = bench(storage.load_all, repeat=repeat,
+                                                  measure_memory=size <= 10000)
+
+            def load_all_cold():
+                # Compact records are re-rendered instead of served from the plan cache
+                app.PLAN_CACHE.clear()
+                storage.load_all()
+
+            results[f"{prefix}/load_all_cold"] = bench(load_all_cold, repeat=repeat, measure_memory=False)
+            if backend == 'jsonl':
+                results.update(run_history_cache(storage, size, repeat))
+                results.update(run_compaction(storage, history, size))
+            storage.close()
+    return results
+
+
+def run_history_cache(storage, size, repeat):
+    """The in-process history cache over a generated log: a full load (and the memory it keeps) and the /get_plans body."""
+    prefix = f"storage/history_cache/{size}"
+    results = {f"{prefix}/load": bench(lambda: HistoryCache(storage).refresh(), repeat=repeat, measure_memory=False)}
+    gc.collect()
+    tracemalloc.start()
+    try:
+        cache = HistoryCache(storage)
+        cache.refresh()
+        results[f"{prefix}/load"]["retained_kib"] = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+    def serialize():
+        cache._body = None # Rebuild the body as after a new plan
+        cache.serialized()
+
+    results[f"{prefix}/serialize"] = bench(serialize, repeat=repeat, measure_memory=False)
+    return results
+
+
+def run_compaction(storage, history, size, repeat=3):
+    """
+    One retention run (2 newest plans per profile kept) over a generated log, and the
+    latency of appends made while it runs. The report numbers are those of the last run.
+    """
+    prefix = f"storage/compaction/{size}"
+    latencies, append_latencies = [], []
+    report = None
+    for _ in range(repeat):
+        storage.rewrite(history)
+        compactor = RetentionCompactor(storage, PlanArchive(os.path.join(sandbox_dir(), 'archive')),
+                                       RetentionPolicy(per_profile=2))
+        done = threading.Event()
+
+        def append_during():
+            while not done.is_set():
+                start = time.perf_counter()
+                storage.append(dict(history[0], id=None))
+                append_latencies.append(time.perf_counter() - start)
+                time.sleep(0.001)
+
+        appender = threading.Thread(target=append_during)
+        appender.start()
+        start = time.perf_counter()
+        report = compactor.run_once()
+        latencies.append(time.perf_counter() - start)
+        done.set()
+        appender.join()
+    return {
+        f"{prefix}/run": summarize(latencies, archived=report['archived'], bytes_reclaimed=report['bytes_reclaimed'],
+                                   hot_plans=report['hot_plans'], archive_kib=round(report['archive']['bytes'] / 1024, 1)),
+        f"{prefix}/append_during": summarize(append_latencies),
+    }
@@ -0,0 +1,203 @@
+"""Shared helpers for the benchmark scripts: timing, memory, synthetic data and result files."""
+import gc
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+SAMPLE_PLANS_FILE = os.path.join(APP_DIR, 'plans_data.json')
+
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+# --- MEASUREMENT ---
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, wall_seconds=None, peak_bytes=None, **extra):
+    """Turns a list of per-operation latencies (seconds) into a result record."""
+    ordered = sorted(latencies)
+    wall = wall_seconds if wall_seconds is not None else sum(ordered)
+    result = {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 4),
+        "ops_per_sec": round(len(ordered) / wall, 2) if wall else 0.0,
+    }
+    if peak_bytes is not None:
+        result["peak_kib"] = round(peak_bytes / 1024, 1)
+    result.update(extra)
+    return result
+
+
+def time_calls(fn, repeat, warmup=1):
+    """Calls fn() repeat times (after warmup calls) and returns the per-call latencies."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_memory(fn):
+    """Peak Python heap allocation (bytes) while running fn() once, measured with tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(fn, repeat, warmup=1, measure_memory=True, **extra):
+    """Latency percentiles, throughput and (optionally) peak memory of fn()."""
+    latencies = time_calls(fn, repeat, warmup)
+    peak = peak_memory(fn) if measure_memory else None
+    return summarize(latencies, peak_bytes=peak, **extra)
+
+
+# --- SYNTHETIC DATA ---
+
+def load_sample_plans():
+    with open(SAMPLE_PLANS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthetic_history(size, sample=None):
+    """A history of `size` plans, cycling through the saved sample plans with fresh ids."""
+    sample = sample or load_sample_plans()
+    base_id = 1_700_000_000_000
+    history = []
+    for i in range(size):
+        template = sample[i % len(sample)]
+        history.append({
+            "id": base_id + i,
+            "timestamp": template.get('timestamp', ''),
+            "inputs": template.get('inputs', {}),
+            "plan": template.get('plan', {}),
+        })
+    return history
+
+
+def generated_history(app, size):
+    """
+    A history of `size` plans produced by the app's current template generator,
+    cycling through the input combinations (these are the plans 'compact' storage can shrink).
+    """
+    combos = [
+        {"goal": goal, "level": level, "equipment": equipment, "budget": budget, "cuisine": cuisine}
+        for goal in ('Weight Loss', 'Muscle Gain', 'Healthy Maintenance')
+        for level in ('Beginner', 'Intermediate', 'Advanced')
+        for equipment in ('Bodyweight Only', 'Full Gym Access')
+        for budget in (300, 500, 800)
+        for cuisine in ('South Asian', 'Latino', 'Any/Global')
+    ]
+    base_id = 1_700_000_000_000
+    history = []
+    for i in range(size):
+        inputs = dict(combos[i % len(combos)], seed=i)
+        history.append({
+            "id": base_id + i,
+            "timestamp": "2025-10-06 21:26:55",
+            "inputs": inputs,
+            "plan": app.get_mock_plan_data(inputs),
+        })
+    return history
+
+
+def sandbox_dir():
+    """A fresh temporary working directory for storage files."""
+    return tempfile.mkdtemp(prefix='plan-bench-')
+
+
+def import_app(workdir, **env):
+    """
+    Imports app.py and opens its resources with their storage files inside workdir
+    (suites build their Flask app with app.create_app()). app.py configures itself
+    from the environment and the current directory at import time, so this must run
+    before anything else imports it.
+    """
+    os.environ.update({key: str(value) for key, value in env.items()})
+    os.chdir(workdir)
+    import app
+    app.open_resources()
+    return app
+
+
+# --- RESULT FILES ---
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def result_document(results, label):
+    return {
+        "meta": {
+            "label": label,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def save_results(document, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=4)
+        f.write('\n')
+
+
+def compare_results(current, baseline, threshold):
+    """
+    Compares p50 latencies benchmark by benchmark. Returns a list of
+    (name, baseline_ms, current_ms, ratio) for the benchmarks slower than threshold x baseline.
+    """
+    regressions = []
+    base_results = baseline.get('results', {})
+    for name, result in sorted(current.get('results', {}).items()):
+        base = base_results.get(name)
+        if not base or not base.get('p50_ms'):
+            continue
+        ratio = result['p50_ms'] / base['p50_ms']
+        marker = 'REGRESSION' if ratio > threshold else ''
+        print(f"{name:<55} {base['p50_ms']:>10.3f} -> {result['p50_ms']:>10.3f} ms  x{ratio:5.2f} {marker}")
+        if ratio > threshold:
+            regressions.append((name, base['p50_ms'], result['p50_ms'], ratio))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<55} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>12} {'peak KiB':>10}")
+    for name, result in sorted(results.items()):
+        print(f"{name:<55} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['p99_ms']:>10.3f} "
+              f"{result['ops_per_sec']:>12.1f} {result.get('peak_kib', ''):>10}")
@@ -0,0 +1,68 @@
+"""
+Runs the plan generator, storage, HTTP and startup benchmarks and records the results.
+
+    python benchmarks/run_benchmarks.py                  # full run, compared against baseline.json
+    python benchmarks/run_benchmarks.py --quick          # smaller sizes, for a fast sanity check
+    python benchmarks/run_benchmarks.py --save-baseline  # make this run the new baseline
+
+Every run is written to benchmarks/results/<revision>.json. With a baseline present the
+p50 latencies are compared and the exit status is 1 if any benchmark got slower than
+--threshold times its baseline.
+"""
+import argparse
+import json
+import os
+import sys
+
+from common import (BASELINE_FILE, RESULTS_DIR, compare_results, git_revision, import_app,
+                    print_results, result_document, sandbox_dir, save_results)
+
+SUITES = ['generator', 'storage', 'http', 'startup']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the plan generator, storage, Flask backend and its startup.")
+    parser.add_argument('--quick', action='store_true', help="smaller sizes and fewer repetitions")
+    parser.add_argument('--suite', action='append', choices=SUITES, help="run only this suite (repeatable)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--threshold', type=float, default=1.25, help="allowed p50 slowdown factor")
+    args = parser.parse_args()
+
+    # The app writes its storage files to the working directory: keep them in a sandbox
+    app = import_app(sandbox_dir(), PLANS_STORAGE='jsonl', MOCK_DELAY_SECONDS=0)
+
+    import bench_generator
+    import bench_http
+    import bench_startup
+    import bench_storage
+    suites = {'generator': bench_generator, 'storage': bench_storage, 'http': bench_http, 'startup': bench_startup}
+
+    results = {}
+    for name in args.suite or SUITES:
+        print(f"Running {name} benchmarks...", flush=True)
+        results.update(suites[name].run(app, quick=args.quick))
+
+    label = 'quick' if args.quick else 'full'
+    document = result_document(results, label)
+    print_results(results)
+    save_results(document, os.path.join(RESULTS_DIR, f"{git_revision()}-{label}.json"))
+
+    if args.save_baseline:
+        save_results(document, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nComparing with baseline {baseline['meta'].get('revision')} ({baseline['meta'].get('label')}):")
+        regressions = compare_results(document, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than x{args.threshold} of the baseline.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Multi-process storage stress test: proves that no plans are lost or duplicated
+when several worker processes serve the app (wsgi.py) on the same storage files.
+
+For every storage backend it starts --workers server processes in one sandbox
+directory (seeded with plans_data.json, so the workers also race the one-time
+migration), fires --requests generation calls at them from --clients threads
+(single plans, batches and async jobs polled on a different worker), then checks
+that every plan a worker reported as saved is stored exactly once and that all
+workers see the same history.
+
+    python benchmarks/stress_multiprocess.py
+    python benchmarks/stress_multiprocess.py --workers 8 --clients 32 --requests 2000 --backend sqlite
+
+Exits with status 1 if any write was lost, duplicated or failed.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import APP_DIR, SAMPLE_PLANS_FILE, sandbox_dir
+
+# (label, PLANS_STORAGE, PLANS_COMPRESS)
+BACKENDS = [
+    ('jsonl', 'jsonl', '0'),
+    ('compact', 'compact', '0'),
+    ('compact-gzip', 'compact', '1'),
+    ('sqlite', 'sqlite', '0'),
+    ('json', 'json', '0'),
+]
+
+PAYLOAD = {"goal": "Muscle Gain", "level": "Intermediate", "equipment": "Full Gym Access",
+           "intensity": "Busy Student (45 min max)", "budget": 500, "cuisine": "South Asian"}
+
+# Runs one worker: the WSGI app on a free port, announced on stdout.
+WORKER_CODE = """
+import logging, sys
+sys.path.insert(0, sys.argv[1])
+from werkzeug.serving import make_server
+from wsgi import application  # Builds this worker's app, as a gunicorn worker does
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+server = make_server('127.0.0.1', 0, application, threaded=True)
+print('LISTENING', server.server_port, flush=True)
+server.serve_forever()
+"""
+
+
+# --- WORKERS ---
+
+def start_workers(count, workdir, env):
+    """Starts count worker processes in workdir; returns [(process, base_url)]."""
+    workers = []
+    for _ in range(count):
+        process = subprocess.Popen([sys.executable, '-c', WORKER_CODE, APP_DIR], cwd=workdir,
+                                   env=dict(os.environ, **env), stdout=subprocess.PIPE, text=True)
+        workers.append(process)
+    started = []
+    for process in workers:
+        line = process.stdout.readline()
+        while line and not line.startswith('LISTENING'):
+            print(f"    worker {process.pid}: {line.rstrip()}")
+            line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Worker {process.pid} exited before listening")
+        threading.Thread(target=_drain, args=(process,), daemon=True).start()
+        started.append((process, f"http://127.0.0.1:{line.split()[1]}"))
+    return started
+
+
+def _drain(process):
+    for line in process.stdout:
+        print(f"    worker {process.pid}: {line.rstrip()}")
+
+
+def stop_workers(workers):
+    for process, _ in workers:
+        process.terminate()
+    for process, _ in workers:
+        process.wait(timeout=10)
+
+
+# --- LOAD ---
+
+def fire(urls, index, batch_every, async_every):
+    """Sends request number index; returns the ids of the plans the server reported as saved."""
+    session = requests.Session()
+    url = urls[index % len(urls)]
+    payload = dict(PAYLOAD, seed=index)
+    if batch_every and index % batch_every == 0:
+        response = session.post(url + '/generate_plans/batch', json=[payload] * 3, timeout=60)
+        response.raise_for_status()
+        return [item['plan']['id'] for item in response.json()['results']]
+    if async_every and index % async_every == 1:
+        response = session.post(url + '/generate_plan?async=1', json=payload, timeout=60)
+        response.raise_for_status()
+        # Poll on a different worker than the one running the job
+        status_url = urls[(index + 1) % len(urls)] + response.json()['status_url']
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            job = session.get(status_url, timeout=60).json()
+            if job.get('status') == 'done':
+                return [job['result']['id']]
+            if job.get('status') == 'failed':
+                raise RuntimeError(f"Job failed: {job.get('error')}")
+            time.sleep(0.05)
+        raise RuntimeError(f"Job {status_url} did not finish")
+    response = session.post(url + '/generate_plan', json=payload, timeout=60)
+    response.raise_for_status()
+    return [response.json()['id']]
+
+
+def stress_backend(label, backend, compress, args):
+    workdir = sandbox_dir()
+    shutil.copy(SAMPLE_PLANS_FILE, os.path.join(workdir, 'plans_data.json'))
+    env = {'PLANS_STORAGE': backend, 'PLANS_COMPRESS': compress,
+           'JOB_STATE_DIR': os.path.join(workdir, 'job_state'), 'PLAN_CACHE_SIZE': '0'}
+    workers = start_workers(args.workers, workdir, env)
+    urls = [url for _, url in workers]
+    try:
+        initial = len(requests.get(urls[0] + '/get_plans', timeout=60).json())
+        saved_ids, failures = [], []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            futures = [pool.submit(fire, urls, i, args.batch_every, args.async_every)
+                       for i in range(args.requests)]
+            for future in futures:
+                try:
+                    saved_ids.extend(future.result())
+                except Exception as e:
+                    failures.append(str(e))
+        elapsed = time.perf_counter() - start
+
+        # Every worker must see the same, complete history (streamed straight from storage)
+        histories = []
+        for url in urls:
+            body = requests.get(url + '/get_plans?stream=ndjson', timeout=120).content
+            histories.append([json.loads(line)['id'] for line in body.splitlines() if line.strip()])
+    finally:
+        stop_workers(workers)
+
+    stored = histories[0]
+    stored_set = set(stored)
+    report = {
+        "backend": label,
+        "requests": args.requests,
+        "plans_saved": len(saved_ids),
+        "plans_stored": len(stored) - initial,
+        "failed_requests": len(failures),
+        "duplicate_ids": len(stored) - len(stored_set) + len(saved_ids) - len(set(saved_ids)),
+        "lost_plans": len([plan_id for plan_id in saved_ids if plan_id not in stored_set]),
+        "workers_disagree": any(history != stored for history in histories[1:]),
+        "ids_out_of_order": stored[initial:] != sorted(stored[initial:]),
+        "plans_per_sec": round(len(saved_ids) / elapsed, 1),
+    }
+    report["ok"] = (not failures and not report["duplicate_ids"] and not report["lost_plans"]
+                    and not report["workers_disagree"] and not report["ids_out_of_order"]
+                    and report["plans_stored"] == report["plans_saved"])
+    for failure in failures[:5]:
+        print(f"    failed: {failure}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the shared plan storage from several worker processes.")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16, help="concurrent client threads")
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--batch-every', type=int, default=10, help="every Nth request is a batch of 3 (0: never)")
+    parser.add_argument('--async-every', type=int, default=10, help="every Nth request is an async job (0: never)")
+    parser.add_argument('--backend', action='append', choices=[label for label, _, _ in BACKENDS],
+                        help="only stress this backend (repeatable)")
+    args = parser.parse_args()
+
+    all_ok = True
+    for label, backend, compress in BACKENDS:
+        if args.backend and label not in args.backend:
+            continue
+        print(f"[{label}] {args.workers} workers, {args.clients} clients, {args.requests} requests")
+        report = stress_backend(label, backend, compress, args)
+        print("    " + ", ".join(f"{key}={value}" for key, value in report.items() if key != 'backend'))
+        all_ok = all_ok and report["ok"]
+    print("PASS: no lost or duplicated writes" if all_ok else "FAIL: see the reports above")
+    sys.exit(0 if all_ok else 1)
+
+
+if __name__ == '__main__':
+    main()
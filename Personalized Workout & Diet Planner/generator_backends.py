@@ -0,0 +1,355 @@
+import hashlib
+import json
+import random
+import threading
+import time
+
+# HTTP status codes worth retrying (rate limiting and transient upstream failures)
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class GeneratorError(RuntimeError):
+    """Raised when the generator backend cannot produce a plan."""
+
+
+# --- PROMPT ---
+
+def build_prompt(data):
+    """Turns the user inputs into the plan-generation prompt sent to the LLM."""
+    inputs = {key: value for key, value in data.items() if key != 'seed'}
+    return (
+        "Create a personalized 7-day workout and budget meal plan. Respond with JSON only, "
+        "with the keys 'workoutPlan' (a list of {day, focus, exercises: [{name, sets, reps, notes}]}) "
+        "and 'mealPlan' (a list of {day, meals: [{name, recipe, cost_estimate_in_inr}]}). "
+        "Costs are in INR and must fit the daily budget. "
+        f"User inputs: {json.dumps(inputs, sort_keys=True, ensure_ascii=False)}"
+    )
+
+
+def parse_plan(plan):
+    """Checks that a generated plan has the structure the client renders."""
+    if (not isinstance(plan, dict) or not isinstance(plan.get('workoutPlan'), list)
+            or not isinstance(plan.get('mealPlan'), list)):
+        raise GeneratorError("Generated plan is missing 'workoutPlan' or 'mealPlan'")
+    return {"workoutPlan": plan['workoutPlan'], "mealPlan": plan['mealPlan']}
+
+
+class PlanStreamParser:
+    """
+    Incremental scanner for a plan's JSON text as it arrives in fragments.
+
+    feed(text) returns the (section, day) pairs completed by text: every object
+    directly inside the top-level 'workoutPlan' and 'mealPlan' arrays is parsed
+    as soon as its closing brace arrives, so the first day can be shown long
+    before the model has finished writing the rest of the plan.
+    """
+
+    SECTIONS = ('workoutPlan', 'mealPlan')
+
+    def __init__(self):
+        self.days = {section: 0 for section in self.SECTIONS}
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string = [] # characters of the string being read at the top level (a key)
+        self._key = None # last top-level key
+        self._section = None # section whose array is being read
+        self._capturing = False
+        self._buffer = [] # text of the day object being read
+
+    @property
+    def started(self):
+        """True once at least one day has been returned."""
+        return any(self.days.values())
+
+    def feed(self, text):
+        completed = []
+        for c in text:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._key = ''.join(self._string)
+                elif self._depth == 1:
+                    self._string.append(c)
+            elif c == '"':
+                self._in_string = True
+                self._string = []
+            elif c in '{[':
+                self._depth += 1
+                if self._depth == 2:
+                    self._section = self._key if c == '[' and self._key in self.SECTIONS else None
+                elif self._depth == 3 and c == '{' and self._section is not None:
+                    self._capturing = True
+                    self._buffer = []
+            elif c in '}]':
+                self._depth -= 1
+                if self._capturing and self._depth == 2:
+                    self._buffer.append(c)
+                    self._capturing = False
+                    completed.append((self._section, self._parse_day()))
+                    continue
+            if self._capturing:
+                self._buffer.append(c)
+        return completed
+
+    def _parse_day(self):
+        try:
+            day = json.loads(''.join(self._buffer))
+        except ValueError as e:
+            raise GeneratorError(f"Unreadable day in the streamed plan: {e}")
+        if not isinstance(day, dict):
+            raise GeneratorError("Streamed plan days must be objects")
+        self.days[self._section] += 1
+        return day
+
+    def finish(self):
+        """Raises GeneratorError unless both sections produced at least one day."""
+        if not all(self.days.values()):
+            raise GeneratorError("Streamed plan is missing 'workoutPlan' or 'mealPlan'")
+
+
+# --- BACKENDS ---
+
+class GeneratorBackend:
+    """Produces the {"workoutPlan", "mealPlan"} dict for a set of user inputs."""
+
+    name = 'base'
+
+    def generate(self, data):
+        raise NotImplementedError
+
+    def generate_stream(self, data):
+        """
+        Yields the plan as ('workoutPlan', day) pairs followed by ('mealPlan', day) pairs,
+        then ('mealBudget', budget) when the plan reports its week's cost against the budget.
+        Backends that can produce days incrementally override this; by default the
+        whole plan is generated first.
+        """
+        plan = self.generate(data)
+        for section in ('workoutPlan', 'mealPlan'):
+            for day in plan[section]:
+                yield section, day
+        if 'mealBudget' in plan:
+            yield 'mealBudget', plan['mealBudget']
+
+    def close(self):
+        pass
+
+
+class MockGeneratorBackend(GeneratorBackend):
+    """Wraps the local template-based mock generator."""
+
+    name = 'mock'
+
+    def __init__(self, generate_fn, delay_seconds=0):
+        self.generate_fn = generate_fn
+        self.delay_seconds = delay_seconds
+
+    def generate(self, data):
+        if self.delay_seconds > 0:
+            time.sleep(self.delay_seconds) # Optionally simulate upstream latency
+        return self.generate_fn(data)
+
+
+class _InFlightCall:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class HttpLLMBackend(GeneratorBackend):
+    """
+    Calls a Gemini-style generateContent HTTP endpoint.
+
+    - One pooled requests.Session (keep-alive, pool_size connections) is shared by all threads.
+    - A semaphore caps in-flight upstream calls at max_in_flight.
+    - Connection errors, timeouts and RETRY_STATUS_CODES are retried up to max_retries
+      times with full-jitter exponential backoff.
+    - Identical concurrent prompts are coalesced: one thread calls upstream and the
+      others wait for its result (so results must be treated as read-only).
+    - With a stream_url (Gemini's streamGenerateContent), generate_stream reads the
+      server-sent events and yields each day as soon as its JSON is complete. A stream
+      is only retried if it fails before the first day was yielded.
+    """
+
+    name = 'http'
+
+    def __init__(self, api_url, api_key=None, timeout=30, max_in_flight=8, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, pool_size=None, stream_url=None):
+        if not api_url:
+            raise ValueError("HttpLLMBackend needs an api_url (set LLM_API_URL)")
+        self.api_url = api_url
+        self.stream_url = stream_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+        # Imported here so that mock-mode workers never pay for loading requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        pool_size = pool_size or max_in_flight
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        self._retryable_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        self._stream_errors = self._retryable_errors + (requests.exceptions.ChunkedEncodingError,)
+
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    def generate(self, data):
+        prompt = build_prompt(data)
+        key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return self._coalesced(key, lambda: self._call_with_retries(prompt))
+
+    def _coalesced(self, key, call_upstream):
+        with self._in_flight_lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._in_flight[key] = _InFlightCall()
+            else:
+                self.coalesced_calls += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = call_upstream()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def _backoff(self, attempt):
+        """Full jitter: sleeps a random amount up to the exponential cap of the attempt."""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        time.sleep(random.uniform(0, cap))
+
+    def _post(self, url, prompt, params=None, stream=False):
+        """Sends the generateContent request for prompt. Caller holds a slot."""
+        with self._in_flight_lock:
+            self.upstream_calls += 1
+        params = dict(params or {})
+        if self.api_key:
+            params["key"] = self.api_key
+        return self.session.post(
+            url,
+            params=params or None,
+            json={
+                "contents": [{"parts": [{"text": prompt}]}],
+                "generationConfig": {"responseMimeType": "application/json"}
+            },
+            timeout=self.timeout,
+            stream=stream
+        )
+
+    def _call_with_retries(self, prompt):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._backoff(attempt)
+            try:
+                with self._slots:
+                    response = self._post(self.api_url, prompt)
+            except self._retryable_errors as e:
+                last_error = e
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                last_error = GeneratorError(f"Upstream returned HTTP {response.status_code}")
+                continue
+            if response.status_code >= 400:
+                raise GeneratorError(f"Upstream rejected the request: HTTP {response.status_code}")
+            return self._parse_response(response)
+
+        raise GeneratorError(f"Upstream call failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def generate_stream(self, data):
+        if not self.stream_url:
+            yield from super().generate_stream(data)
+            return
+        prompt = build_prompt(data)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._backoff(attempt)
+            parser = PlanStreamParser()
+            try:
+                with self._slots:
+                    with self._post(self.stream_url, prompt, params={"alt": "sse"}, stream=True) as response:
+                        if response.status_code in RETRY_STATUS_CODES:
+                            last_error = GeneratorError(f"Upstream returned HTTP {response.status_code}")
+                            continue
+                        if response.status_code >= 400:
+                            raise GeneratorError(f"Upstream rejected the request: HTTP {response.status_code}")
+                        for text in _sse_texts(response):
+                            yield from parser.feed(text)
+            except self._stream_errors as e:
+                if parser.started:
+                    raise GeneratorError(f"Upstream stream broke off: {e}")
+                last_error = e
+                continue
+            parser.finish()
+            return
+
+        raise GeneratorError(f"Upstream call failed after {self.max_retries + 1} attempts: {last_error}")
+
+    @staticmethod
+    def _parse_response(response):
+        try:
+            text = response.json()['candidates'][0]['content']['parts'][0]['text']
+            return parse_plan(json.loads(text))
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise GeneratorError(f"Unexpected upstream response: {e}")
+
+    def close(self):
+        self.session.close()
+
+
+def _sse_texts(response):
+    """Yields the text fragments of a streamGenerateContent server-sent event stream."""
+    for line in response.iter_lines():
+        if not line.startswith(b'data:'):
+            continue
+        try:
+            parts = json.loads(line[5:])['candidates'][0]['content']['parts']
+        except (ValueError, KeyError, IndexError, TypeError):
+            continue # e.g. a final chunk that only carries usage metadata
+        for part in parts:
+            if isinstance(part, dict) and isinstance(part.get('text'), str):
+                yield part['text']
+
+
+# --- FACTORY ---
+
+def create_generator_backend(name, mock_generate_fn, mock_delay_seconds=0, **http_options):
+    """'mock' uses the local templates; 'http' calls the LLM endpoint described by http_options."""
+    if name == MockGeneratorBackend.name:
+        return MockGeneratorBackend(mock_generate_fn, mock_delay_seconds)
+    if name == HttpLLMBackend.name:
+        return HttpLLMBackend(**http_options)
+    raise ValueError(f"Unknown generator backend '{name}'. Choose 'mock' or 'http'.")
@@ -0,0 +1,28 @@
+"""
+gunicorn settings for the Flask backend (see wsgi.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Values can be overridden with the environment variables below or on the command line.
+"""
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('WEB_WORKERS', 4))
+# Threads per worker: requests mostly wait on the generator or on storage I/O
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = 130 # Longer than a generation that has exhausted its LLM retries
+# Workers load wsgi:application themselves, so create_app() builds each worker's app and
+# opens its storage handles, thread pools and SQLite connections (none of which survive
+# fork()) after the fork. The master only imports app.py (see on_starting).
+preload_app = False
+
+# Async jobs run on the worker that accepted them; publish their status where every worker can read it
+raw_env = [f"JOB_STATE_DIR={os.environ.get('JOB_STATE_DIR', 'job_state')}"]
+
+
+def on_starting(server):
+    # Loads the templates, meal catalog, plan cache and optional plan matrix once in the
+    # master: the workers forked from it start warm and share those pages
+    import app # noqa: F401
@@ -0,0 +1,163 @@
+import hashlib
+import threading
+
+from plan_index import PlanIndex
+from plan_model import PlanDecoder
+from storage import matches_filters, query_plans
+
+
+class HistoryCache:
+    """
+    Process-level cache of the parsed plan history.
+
+    Before serving, the storage signature (inode/size/mtime of the data file plus
+    this process's write generation) is compared with the one the cache was built
+    from; nothing is re-read while it is unchanged. Otherwise the cache follows the
+    storage incrementally (PlanStorage.read_since): only the plans appended since
+    the last refresh (by any process) are read, i.e. the end of the JSONL log, the
+    end of the JSON journal or the SQLite rows past the newest id. Removing or
+    rewriting plans (e.g. retention compaction) triggers a full reload.
+
+    Plan bodies are held as plan_model nodes from one PlanDecoder, so days, exercises
+    and meals that repeat across the history are stored (and encoded) once; write
+    responses holding cached plans with plan_model.dumps. Each plan's compact JSON
+    encoding is kept as the bytes before its body plus the shared body, so /get_plans
+    can be served from one pre-serialized buffer with an ETag for conditional requests.
+    A PlanIndex over the cached plans answers /plans/search and /plans/stats; new
+    plans are added to the index as they are read, a full reload rebuilds it.
+    Returned plans are shared and must be treated as read-only.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._signature = object() # Never equal to a real signature: forces the first load
+        self._plans = []
+        self._encoded = [] # (head, Plan) or (whole encoding, None) per plan
+        self._decoder = PlanDecoder()
+        self._cursor = None # Where storage.read_since continues; None until the first load
+        self._body = None
+        self._etag = None
+        self.index = PlanIndex()
+        self.full_loads = 0
+        self.incremental_loads = 0
+
+    # --- REFRESH ---
+
+    def _refresh(self):
+        """Brings the cache up to date with storage. Caller holds the lock."""
+        signature = self.storage.signature()
+        if signature == self._signature:
+            return
+
+        update = None if self._cursor is None else self.storage.read_since(self._cursor)
+        if update is None:
+            self._reset()
+            update = self.storage.read_since(None)
+            self.full_loads += 1
+        else:
+            self.incremental_loads += 1
+        entries, self._cursor = update
+
+        if entries or self._body is None:
+            self.index.add_many(plan for plan, _ in entries)
+            for plan, encoded in entries:
+                plan, head = self._decoder.decode_stored(plan, encoded)
+                self._plans.append(plan)
+                self._encoded.append((encoded, None) if head is None else (head, plan['plan']))
+            self._body = None
+        self._signature = signature
+
+    def _reset(self):
+        self._plans = []
+        self._encoded = []
+        self._decoder = PlanDecoder()
+        self.index = PlanIndex()
+        self._body = None
+
+    # --- READS ---
+
+    def refresh(self):
+        """Brings the cache up to date with storage without returning anything."""
+        with self._lock:
+            self._refresh()
+
+    def plans(self):
+        """The full history in insertion order."""
+        with self._lock:
+            self._refresh()
+            return list(self._plans)
+
+    def get(self, plan_id):
+        """The cached plan with the given id, or None."""
+        with self._lock:
+            self._refresh()
+            position = self.index.position(plan_id)
+            return None if position is None else self._plans[position]
+
+    def query(self, limit=None, before_id=None, filters=None):
+        """
+        One page of plans, newest first (by id), as storage.query_plans returns it. The page
+        is read off the index's id order from before_id on, so only the plans on it (and
+        those the filters skip) are visited; the history is neither copied nor sorted.
+        """
+        with self._lock:
+            self._refresh()
+            return self._page(limit, before_id, filters)
+
+    def _page(self, limit, before_id, filters=None):
+        """Caller holds the lock."""
+        page = []
+        for position in self.index.newest_first(before_id):
+            if limit is not None and len(page) >= limit:
+                break
+            plan = self._plans[position]
+            if not filters or matches_filters(plan, filters):
+                page.append(plan)
+        return page
+
+    def search(self, limit=None, before_id=None, **criteria):
+        """
+        Plans matching the PlanIndex.match criteria, newest first (by id), up to limit.
+        Returns (plans, total number of matches).
+        """
+        with self._lock:
+            self._refresh()
+            positions = self.index.match(**criteria)
+            if positions is None:
+                return self._page(limit, before_id), len(self._plans)
+            matches = [self._plans[p] for p in positions]
+        return query_plans(matches, limit, before_id), len(matches)
+
+    def plan_stats(self, group_by=None, top=10, **criteria):
+        """Aggregate statistics (see PlanIndex.stats) of the plans matching the criteria."""
+        with self._lock:
+            self._refresh()
+            return self.index.stats(self.index.match(**criteria), group_by, top)
+
+    def serialized(self):
+        """Returns (JSON array bytes, etag) for the full history, rebuilt only after changes."""
+        with self._lock:
+            self._refresh()
+            if self._body is None:
+                chunks = []
+                for head, plan in self._encoded:
+                    chunks.append(b',')
+                    chunks.append(head)
+                    if plan is not None:
+                        chunks.append(plan.encoded())
+                        chunks.append(b'}')
+                chunks[:1] = [b'['] # Drops the first separator
+                chunks.append(b']')
+                self._body = b''.join(chunks)
+                self._etag = hashlib.sha1(self._body).hexdigest()
+            return self._body, self._etag
+
+    def stats(self):
+        with self._lock:
+            return {
+                "plans": len(self._plans),
+                "shared_nodes": len(self._decoder),
+                "full_loads": self.full_loads,
+                "incremental_loads": self.incremental_loads,
+            }
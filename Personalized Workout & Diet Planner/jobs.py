@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states reported by /jobs/<id>
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when more jobs are pending than the manager accepts."""
+
+
+class Job:
+    __slots__ = ('job_id', 'status', 'result', 'error', 'created_at', 'finished_at')
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        job = {"job_id": self.job_id, "status": self.status}
+        if self.status == DONE:
+            job["result"] = self.result
+        elif self.status == FAILED:
+            job["error"] = self.error
+        return job
+
+
+class _StoredJob:
+    """A job published by another worker process (only to_dict is needed)."""
+    __slots__ = ('job_id', 'status', '_state')
+
+    def __init__(self, state):
+        self.job_id = state.get('job_id')
+        self.status = state.get('status')
+        self._state = state
+
+    def to_dict(self):
+        return self._state
+
+
+class JobManager:
+    """
+    Runs generation jobs on a bounded thread pool and keeps their results
+    in memory for result_ttl seconds after they finish.
+
+    At most max_pending jobs may be queued or running at once; submit raises
+    JobQueueFull beyond that so callers can answer 503 instead of queueing forever.
+
+    With state_dir, every status change is also written to <state_dir>/<job_id>.json
+    (atomically, via rename), so when several worker processes serve the app a job
+    can be polled on any of them, not only the one that runs it.
+    """
+
+    def __init__(self, max_workers=4, max_pending=64, result_ttl=600, state_dir=None):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='plan-job')
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Schedules fn(*args) and returns the new Job."""
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs (limit {self.max_pending})")
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.job_id] = job
+            self._pending += 1
+        self._publish(job)
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        """The job, or None. Jobs run by other worker processes are read back from state_dir."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir:
+            return self._read_state(job_id)
+        return job
+
+    @property
+    def pending(self):
+        """Jobs currently queued or running."""
+        return self._pending
+
+    def _run(self, job, fn, args):
+        job.status = RUNNING
+        self._publish(job)
+        try:
+            job.result = fn(*args)
+            job.status = DONE
+        except Exception as e:
+            print(f"Job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            self._publish(job)
+            with self._lock:
+                self._pending -= 1
+
+    def _prune(self):
+        """Drops finished jobs older than result_ttl. Caller holds the lock."""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            if self.state_dir:
+                try:
+                    os.remove(self._state_path(job_id))
+                except FileNotFoundError:
+                    pass
+
+    # --- SHARED STATE (state_dir) ---
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _publish(self, job):
+        if not self.state_dir:
+            return
+        path = self._state_path(job.job_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not publish job {job.job_id}: {e}")
+
+    def _read_state(self, job_id):
+        if not all(c in '0123456789abcdef' for c in job_id):
+            return None # Job ids are uuid4 hex; never build a path from anything else
+        try:
+            with open(self._state_path(job_id), 'r', encoding='utf-8') as f:
+                return _StoredJob(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,447 @@
+import json
+import math
+import os
+from collections import Counter
+
+from plan_cache import PlanCache
+
+# Optional: vectorized scoring and pruning for large catalogs. Imported by numpy_available()
+# the first time a group is big enough to use it, so small catalogs never load it.
+np = None
+_numpy_checked = False
+
+# --- PLANNER CONFIGURATION ---
+
+MEAL_CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'meal_catalog.json')
+
+SLOTS = ('breakfast', 'lunch', 'dinner')
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+# A meal may be served at most this many times per slot in one week
+MAX_REPEATS = 2
+# Distinct weekly menus offered per profile (variation 1 is the plain optimum)
+PLAN_VARIATIONS = 3
+# Score points of the deterministic jitter that makes variations 2+ differ
+VARIATION_JITTER = 8.0
+# Cuisine/slot groups with at least this many meals are scored and pruned with NumPy
+NUMPY_MIN_MEALS = 256
+# Rendered weeks kept per optimized template (a week depends only on goal, budget and variation)
+WEEK_CACHE_SIZE = 512
+# Repeated meals are spread over the week in this day order (two days apart)
+SPREAD_ORDER = (0, 2, 4, 6, 1, 3, 5)
+
+
+class GoalProfile:
+    """
+    How a goal scores a meal (protein_weight * protein_g + calorie_weight * calories),
+    plus optional hard limits per meal that are dropped if too few meals pass them.
+    """
+
+    __slots__ = ('protein_weight', 'calorie_weight', 'max_calories', 'min_protein')
+
+    def __init__(self, protein_weight, calorie_weight, max_calories=None, min_protein=None):
+        self.protein_weight = protein_weight
+        self.calorie_weight = calorie_weight
+        self.max_calories = max_calories
+        self.min_protein = min_protein
+
+
+GOAL_PROFILES = {
+    'Weight Loss': GoalProfile(protein_weight=1.0, calorie_weight=-0.03, max_calories=500),
+    'Muscle Gain': GoalProfile(protein_weight=2.0, calorie_weight=0.01, min_protein=10),
+    'Healthy Maintenance': GoalProfile(protein_weight=1.0, calorie_weight=-0.005, max_calories=650),
+}
+DEFAULT_GOAL = 'Healthy Maintenance'
+
+
+class MealCatalogError(ValueError):
+    """Raised when meal_catalog.json is malformed."""
+
+
+# --- CATALOG ---
+
+class MealCatalog:
+    """
+    Column-oriented meal catalog, indexed by (cuisine, slot).
+
+    Each meal is a row in parallel lists (name, recipe, cost_inr, calories,
+    protein_g). The index maps (cuisine, slot) to the rows of that group sorted
+    by cost, which is the order the planner's frontier pass walks. NumPy copies
+    of the numeric columns are built on first use.
+    """
+
+    REQUIRED = ('name', 'slot', 'cuisine', 'cost_inr', 'calories', 'protein_g')
+
+    def __init__(self, meals):
+        self.names = []
+        self.recipes = []
+        self.costs = []
+        self.calories = []
+        self.protein = []
+        self._index = {}
+        for row, meal in enumerate(meals):
+            missing = [field for field in self.REQUIRED if field not in meal]
+            if missing:
+                raise MealCatalogError(f"meal {row}: missing {', '.join(missing)}")
+            if meal['slot'] not in SLOTS:
+                raise MealCatalogError(f"meal {row}: slot must be one of {', '.join(SLOTS)}")
+            self.names.append(meal['name'])
+            self.recipes.append(meal.get('recipe', ''))
+            self.costs.append(int(meal['cost_inr']))
+            self.calories.append(float(meal['calories']))
+            self.protein.append(float(meal['protein_g']))
+            self._index.setdefault((meal['cuisine'], meal['slot']), []).append(row)
+        for rows in self._index.values():
+            rows.sort(key=lambda row: (self.costs[row], row))
+        self._arrays = None
+
+    @classmethod
+    def from_file(cls, path=MEAL_CATALOG_FILE):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f).get('meals', []))
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def cuisines(self):
+        return sorted({cuisine for cuisine, _ in self._index})
+
+    def rows(self, cuisine, slot):
+        """Rows of the meals for cuisine and slot, cheapest first."""
+        return self._index.get((cuisine, slot), [])
+
+    def arrays(self):
+        """(costs, calories, protein) as NumPy arrays; needs NumPy."""
+        if self._arrays is None:
+            self._arrays = (np.array(self.costs, dtype=np.int64),
+                            np.array(self.calories, dtype=np.float64),
+                            np.array(self.protein, dtype=np.float64))
+        return self._arrays
+
+
+# --- PLANNER ---
+
+class WeeklyMeals:
+    """The planner's answer: days[d] holds the (breakfast, lunch, dinner) catalog rows of day d."""
+
+    __slots__ = ('catalog', 'days', 'total_cost', 'weekly_budget', 'score')
+
+    def __init__(self, catalog, days, total_cost, weekly_budget, score):
+        self.catalog = catalog
+        self.days = days
+        self.total_cost = total_cost
+        self.weekly_budget = weekly_budget
+        self.score = score
+
+    @property
+    def within_budget(self):
+        return self.total_cost <= self.weekly_budget
+
+    def budget_summary(self):
+        """The week's cost against its budget, in the plan's 'mealBudget' format."""
+        return {"weeklyCostInr": self.total_cost, "weeklyBudgetInr": self.weekly_budget,
+                "withinBudget": self.within_budget}
+
+    def to_meal_plan(self):
+        """The week in the 'mealPlan' format the client renders."""
+        catalog = self.catalog
+        return [
+            {"day": day, "meals": [
+                {"name": catalog.names[row], "recipe": catalog.recipes[row],
+                 "cost_estimate_in_inr": f"₹{catalog.costs[row]}"}
+                for row in rows
+            ]}
+            for day, rows in zip(DAYS, self.days)
+        ]
+
+
+class MealPlanner:
+    """
+    Picks 21 meals (7 breakfasts, lunches and dinners of one cuisine) whose total
+    cost fits the weekly budget while maximizing the goal's score.
+
+    1. Pruning: per slot, only the first ceil(7 / max_repeats) Pareto layers of
+       (cost, score) can be part of a best plan, since any other meal is beaten
+       on both cost and score by enough meals to fill the week. Each layer is one
+       pass over the cost-sorted rows: pure Python, or NumPy (running maximum)
+       for large groups. Both produce exactly the same candidates.
+    2. Greedy: every slot starts with its best-scoring candidates, each used at
+       most max_repeats times.
+    3. Repair: while over budget, swap one serving for a cheaper candidate,
+       choosing the swap that loses the least score per rupee saved.
+    4. Upgrade: spend the remaining budget on the swaps that gain the most
+       score per extra rupee.
+
+    A week that is over budget only because of the goal's per-meal limits is
+    planned again without them. If even the cheapest week exceeds the budget,
+    that week is returned and WeeklyMeals.within_budget is False.
+    """
+
+    def __init__(self, catalog, max_repeats=MAX_REPEATS, use_numpy=None):
+        if use_numpy and not numpy_available():
+            raise ValueError("use_numpy=True needs NumPy to be installed")
+        self.catalog = catalog
+        self.max_repeats = max_repeats
+        self.use_numpy = use_numpy
+
+    def plan_week(self, cuisine, goal, weekly_budget, variation=1):
+        profile = GOAL_PROFILES.get(goal, GOAL_PROFILES[DEFAULT_GOAL])
+        week = self._plan(cuisine, profile, weekly_budget, variation)
+        if not week.within_budget and (profile.max_calories is not None or profile.min_protein is not None):
+            # The budget outranks the goal's per-meal limits
+            week = self._plan(cuisine, GoalProfile(profile.protein_weight, profile.calorie_weight),
+                              weekly_budget, variation)
+        return week
+
+    def _plan(self, cuisine, profile, weekly_budget, variation):
+        slot_candidates = []
+        for slot in SLOTS:
+            candidates = self.candidates(cuisine, slot, profile, variation)
+            if not candidates:
+                raise MealCatalogError(f"The meal catalog has no {slot} meals for cuisine '{cuisine}'")
+            slot_candidates.append(candidates)
+        return self._select(slot_candidates, weekly_budget)
+
+    # --- PRUNING ---
+
+    def candidates(self, cuisine, slot, profile, variation):
+        """[(row, cost, score)] of the meals that can appear in a best week, in frontier order."""
+        rows = self.catalog.rows(cuisine, slot)
+        layers = math.ceil(len(DAYS) / self.max_repeats)
+        vectorize = self.use_numpy if self.use_numpy is not None else (len(rows) >= NUMPY_MIN_MEALS and numpy_available())
+        if vectorize:
+            return self._candidates_numpy(rows, profile, variation, layers)
+        return self._candidates_python(rows, profile, variation, layers)
+
+    def _candidates_python(self, rows, profile, variation, layers):
+        catalog = self.catalog
+        allowed = [row for row in rows if _passes(profile, catalog.calories[row], catalog.protein[row])]
+        if len(allowed) < layers:
+            allowed = rows  # Too few meals meet the goal's limits: ignore them
+        scores = {
+            row: (profile.protein_weight * catalog.protein[row] + profile.calorie_weight * catalog.calories[row]
+                  + _jitter(row, variation))
+            for row in allowed
+        }
+        kept = []
+        remaining = allowed
+        for _ in range(layers):
+            best = -math.inf
+            rest = []
+            for row in remaining:
+                if scores[row] > best:
+                    best = scores[row]
+                    kept.append(row)
+                else:
+                    rest.append(row)
+            remaining = rest
+            if not remaining:
+                break
+        return [(row, catalog.costs[row], scores[row]) for row in kept]
+
+    def _candidates_numpy(self, rows, profile, variation, layers):
+        costs, calories, protein = self.catalog.arrays()
+        rows = np.asarray(rows, dtype=np.int64)
+        allowed = np.ones(len(rows), dtype=bool)
+        if profile.max_calories is not None:
+            allowed &= calories[rows] <= profile.max_calories
+        if profile.min_protein is not None:
+            allowed &= protein[rows] >= profile.min_protein
+        if allowed.sum() >= layers:
+            rows = rows[allowed]
+        scores = (profile.protein_weight * protein[rows] + profile.calorie_weight * calories[rows]
+                  + _jitter_array(rows, variation))
+        kept = []
+        remaining = np.arange(len(rows))
+        for _ in range(layers):
+            remaining_scores = scores[remaining]
+            running_best = np.maximum.accumulate(remaining_scores)
+            keep = np.empty(len(remaining), dtype=bool)
+            keep[0] = True
+            keep[1:] = remaining_scores[1:] > running_best[:-1]
+            kept.append(remaining[keep])
+            remaining = remaining[~keep]
+            if not len(remaining):
+                break
+        kept = np.concatenate(kept)
+        return list(zip(rows[kept].tolist(), costs[rows[kept]].tolist(), scores[kept].tolist()))
+
+    # --- SELECTION ---
+
+    def _select(self, slot_candidates, weekly_budget):
+        week = len(DAYS)
+        info = [{row: (cost, score) for row, cost, score in candidates} for candidates in slot_candidates]
+        repeats = [max(self.max_repeats, math.ceil(week / len(candidates))) for candidates in slot_candidates]
+
+        # Greedy: the best-scoring candidates of each slot, each up to its repeat limit
+        picks = []
+        for candidates, limit in zip(slot_candidates, repeats):
+            counts = Counter()
+            for row, cost, score in sorted(candidates, key=lambda c: (-c[2], c[1], c[0])):
+                take = min(limit, week - sum(counts.values()))
+                if take <= 0:
+                    break
+                counts[row] = take
+            picks.append(counts)
+        total = sum(info[s][row][0] * n for s, counts in enumerate(picks) for row, n in counts.items())
+
+        # Repair: cheaper swaps losing the least score per rupee saved
+        while total > weekly_budget:
+            move = self._best_swap(info, picks, repeats, cheaper=True)
+            if move is None:
+                break
+            total += self._apply(info, picks, repeats, move, math.ceil((total - weekly_budget) / -move[3]))
+
+        # Upgrade: swaps gaining the most score per extra rupee that still fit
+        while True:
+            slack = weekly_budget - total
+            move = self._best_swap(info, picks, repeats, cheaper=False, slack=slack)
+            if move is None:
+                break
+            total += self._apply(info, picks, repeats, move, slack // move[3] if move[3] > 0 else week)
+
+        days = [[None] * len(SLOTS) for _ in range(week)]
+        score = 0.0
+        for s, counts in enumerate(picks):
+            servings = [row for row, n in sorted(counts.items(), key=lambda item: (-item[1], item[0])) for _ in range(n)]
+            for day, row in zip(SPREAD_ORDER, servings):
+                days[day][s] = row
+            score += sum(info[s][row][1] * n for row, n in counts.items())
+        return WeeklyMeals(self.catalog, tuple(tuple(rows) for rows in days), total, weekly_budget, score)
+
+    @staticmethod
+    def _best_swap(info, picks, repeats, cheaper, slack=0):
+        """
+        The (slot, old row, new row, extra cost) swap to make next, or None. cheaper=True looks
+        for the cost cut losing the least score per rupee; otherwise for the score gain per
+        extra rupee that fits in slack (gains that also save money come first).
+        """
+        best_ratio, best_move = math.inf, None
+        for s, counts in enumerate(picks):
+            candidates = info[s]
+            limit = repeats[s]
+            for old in sorted(counts):
+                old_cost, old_score = candidates[old]
+                for new, (new_cost, new_score) in candidates.items():
+                    extra = new_cost - old_cost
+                    if cheaper:
+                        if extra >= 0:
+                            continue
+                        ratio = (old_score - new_score) / -extra  # score lost per rupee saved
+                    else:
+                        gain = new_score - old_score
+                        if gain <= 0 or extra > slack:
+                            continue
+                        ratio = -math.inf if extra <= 0 else -gain / extra
+                    if (ratio < best_ratio or best_move is None) and counts.get(new, 0) < limit:
+                        best_ratio, best_move = ratio, (s, old, new, extra)
+        return best_move
+
+    @staticmethod
+    def _apply(info, picks, repeats, move, wanted):
+        """Swaps up to wanted servings (at least one); returns the change in total cost."""
+        s, old, new, extra = move
+        counts = picks[s]
+        units = max(1, min(wanted, counts[old], repeats[s] - counts.get(new, 0)))
+        counts[old] -= units
+        if not counts[old]:
+            del counts[old]
+        counts[new] += units
+        return extra * units
+
+
+class OptimizedMealTemplate:
+    """
+    Lets the planner stand in for a meal template of plan_templates.json: it has the same
+    template_id / variation_count / render(variation, params) interface, so plan caching
+    and compact storage references work unchanged. render needs the 'goal' and
+    'weekly_budget' params and returns the planner's week as the 'mealPlan' list;
+    budget returns the same week's cost against the budget ('mealBudget'), which
+    tells a week that could not fit the budget from one that does. Weeks are
+    shared between plans, so treat them as read-only.
+    """
+
+    __slots__ = ('template_id', 'kind', 'description', 'variation_count', 'planner', 'cuisine', 'weeks')
+    slots = ('goal', 'weekly_budget')
+
+    def __init__(self, planner, cuisine, variation_count=PLAN_VARIATIONS, cache_size=WEEK_CACHE_SIZE):
+        self.template_id = f"optimized:{cuisine}"
+        self.kind = 'meals'
+        self.description = f"Budget-optimized week of '{cuisine}' catalog meals"
+        self.variation_count = variation_count
+        self.planner = planner
+        self.cuisine = cuisine
+        # The catalog never changes at runtime, so weeks do not expire
+        self.weeks = PlanCache(max_size=cache_size, ttl_seconds=None)
+
+    def render(self, variation, params):
+        return self._week(variation, params)[0]
+
+    def budget(self, variation, params):
+        return self._week(variation, params)[1]
+
+    def _week(self, variation, params):
+        """(meal plan, budget summary) of the planned week, planned once per goal, budget and variation."""
+        goal, weekly_budget = params['goal'], params['weekly_budget']
+
+        def plan():
+            week = self.planner.plan_week(self.cuisine, goal, weekly_budget, variation)
+            return week.to_meal_plan(), week.budget_summary()
+
+        return self.weeks.get_or_create((goal, weekly_budget, variation), plan)
+
+
+def render_meals(template, variation, params):
+    """
+    The plan sections a meal template fills: 'mealPlan', plus 'mealBudget' when the
+    template is an OptimizedMealTemplate (fixed templates have no week total to report).
+    """
+    sections = {"mealPlan": template.render(variation, params)}
+    if isinstance(template, OptimizedMealTemplate):
+        sections["mealBudget"] = template.budget(variation, params)
+    return sections
+
+
+def register_optimized_meals(registry, planner):
+    """
+    Registers an OptimizedMealTemplate for every meal template of registry and
+    returns them by the id of the meal template they replace.
+    """
+    optimized = {}
+    for template_id in list(registry.meals):
+        optimized[template_id] = OptimizedMealTemplate(planner, template_id)
+        registry.register_meal_template(optimized[template_id])
+    return optimized
+
+
+# --- HELPERS ---
+
+def numpy_available():
+    """Imports NumPy on first use; False when it is not installed."""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:  # pragma: no cover - pure-Python fallback
+            pass
+        _numpy_checked = True
+    return np is not None
+
+
+def _passes(profile, calories, protein):
+    return ((profile.max_calories is None or calories <= profile.max_calories) and
+            (profile.min_protein is None or protein >= profile.min_protein))
+
+
+def _jitter(row, variation):
+    """Deterministic per-(meal, variation) score offset; integer hashing keeps both paths identical."""
+    if variation <= 1:
+        return 0.0
+    return VARIATION_JITTER * (((row + 1) * 2654435761 + variation * 40503) % 1024) / 1024
+
+
+def _jitter_array(rows, variation):
+    if variation <= 1:
+        return np.zeros(len(rows))
+    return VARIATION_JITTER * (((rows + 1) * 2654435761 + variation * 40503) % 1024) / 1024
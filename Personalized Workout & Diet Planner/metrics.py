@@ -0,0 +1,200 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Default latency buckets in seconds (Prometheus style upper bounds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Default size buckets in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _label_text(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _label_text(self.label_names, key), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.label_names = tuple(label_names)
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _label_text(self.label_names, key, ('le', _number(float(bound))))
+                    samples.append((self.name + '_bucket', labels, cumulative))
+                labels = _label_text(self.label_names, key)
+                samples.append((self.name + '_sum', labels, series[-2]))
+                samples.append((self.name + '_count', labels, series[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text format.
+    Collectors are callables returning (name, kind, help, value) tuples read at scrape time,
+    which is how existing counters (e.g. the plan cache stats) are exported without copying them.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        return self._register(Histogram(name, help_text, buckets, label_names))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        for collector in self._collectors:
+            for name, kind, help_text, value in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observes the duration of the with-block in histogram (in seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+# --- PROFILING ---
+
+class RequestProfiler:
+    """
+    Optional cProfile hook for single requests.
+
+    mode 'off' never profiles; 'header' profiles requests carrying the X-Profile header;
+    'slow' profiles every request but only keeps those slower than slow_ms. Profiles
+    are dumped as <timestamp>-<endpoint>-<ms>ms.prof into output_dir (open them with
+    pstats or snakeviz). Only one request is profiled at a time.
+    """
+
+    HEADER = 'X-Profile'
+
+    def __init__(self, mode='off', slow_ms=500, output_dir='profiles'):
+        if mode not in ('off', 'header', 'slow'):
+            raise ValueError("PROFILE_REQUESTS must be 'off', 'header' or 'slow'")
+        self.mode = mode
+        self.slow_ms = slow_ms
+        self.output_dir = output_dir
+        self._busy = threading.Lock()
+
+    def start(self, headers):
+        """Returns a running profiler for this request, or None."""
+        if self.mode == 'off' or (self.mode == 'header' and self.HEADER not in headers):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError: # another profiler is already active in this interpreter
+            self._busy.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, endpoint, elapsed_seconds):
+        """Stops profiler and dumps it if the request qualifies. Returns the dump path or None."""
+        try:
+            profiler.disable()
+            elapsed_ms = elapsed_seconds * 1000
+            if self.mode == 'slow' and elapsed_ms < self.slow_ms:
+                return None
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{int(time.time() * 1000)}-{endpoint}-{int(elapsed_ms)}ms.prof")
+            profiler.dump_stats(path)
+            return path
+        finally:
+            self._busy.release()
@@ -0,0 +1,68 @@
+class TemplatePlanCodec:
+    """
+    Compact storage records for plans built by the template generator.
+
+    A template-generated plan is fully determined by its inputs and the picked
+    template variations, so the record keeps the entry without "plan" and adds
+    "ref": [workout template id, workout variation, meal template id, meal variation].
+    A plan is only compacted after checking that re-expanding the reference gives
+    back exactly the same plan; anything else (LLM output, plans from older
+    templates) is stored unchanged.
+
+    Records are expanded with the current templates, so editing the text of an
+    existing variation also changes how older compact records read back.
+
+    select_fn(inputs) -> (normalized key, workout template, meal template)
+    render_fn(key, workout template, workout variation, meal template, meal variation) -> plan
+    """
+
+    PLAN_KEYS = (frozenset(('workoutPlan', 'mealPlan')), frozenset(('workoutPlan', 'mealPlan', 'mealBudget')))
+
+    def __init__(self, templates, select_fn, render_fn):
+        self.templates = templates
+        self.select_fn = select_fn
+        self.render_fn = render_fn
+
+    def compact(self, entry):
+        ref = self.reference(entry)
+        if ref is None:
+            return entry
+        record = {field: value for field, value in entry.items() if field != 'plan'}
+        record['ref'] = ref
+        return record
+
+    def expand(self, record):
+        if 'ref' not in record:
+            return record
+        workout_id, workout_variation, meal_id, meal_variation = record['ref']
+        key = self.select_fn(record['inputs'])[0]
+        plan = self.render_fn(key, self.templates.workouts[workout_id], workout_variation,
+                              self.templates.meals[meal_id], meal_variation)
+        entry = {field: value for field, value in record.items() if field != 'ref'}
+        entry['plan'] = plan
+        return entry
+
+    def reference(self, entry):
+        """The [workout id, variation, meal id, variation] that reproduces entry's plan, or None."""
+        inputs, plan = entry.get('inputs'), entry.get('plan')
+        if not isinstance(inputs, dict) or not isinstance(plan, dict) or plan.keys() not in self.PLAN_KEYS:
+            return None
+        try:
+            key, workout_template, meal_template = self.select_fn(inputs)
+            workout_variation = next((
+                variation for variation in range(1, workout_template.variation_count + 1)
+                if self.render_fn(key, workout_template, variation, meal_template, 1)['workoutPlan']
+                == plan['workoutPlan']), None)
+            if workout_variation is None:
+                return None
+            meal_variation = next((
+                variation for variation in range(1, meal_template.variation_count + 1)
+                if self.render_fn(key, workout_template, workout_variation, meal_template, variation)['mealPlan']
+                == plan['mealPlan']), None)
+            # The other sections (the optimizer's 'mealBudget') must come back the same too
+            if meal_variation is None or self.render_fn(key, workout_template, workout_variation,
+                                                        meal_template, meal_variation) != plan:
+                return None
+        except (TypeError, ValueError, KeyError):
+            return None # Inputs the generator cannot render (e.g. a non-numeric budget)
+        return [workout_template.template_id, workout_variation, meal_template.template_id, meal_variation]
@@ -0,0 +1,210 @@
+import bisect
+import math
+import statistics
+import sys
+from collections import Counter
+
+from storage import get_input
+
+# 'inputs' fields with an exact-match index (and usable as a stats group_by)
+INDEXED_FIELDS = ('goal', 'level', 'equipment', 'cuisine', 'intensity')
+GROUP_BY_FIELDS = INDEXED_FIELDS + ('month',)
+# Upper bounds (₹/day) of the budget histogram buckets in stats; the last bucket is open-ended
+BUDGET_BUCKETS = (250, 500, 750, 1000, 1500)
+
+
+class PlanIndex:
+    """
+    Secondary indexes over a list of plans, addressed by position in that list.
+
+    Plans are only ever added (add_many is fed the newly appended plans), so every
+    insert costs O(plan size) and no query re-reads the history:
+
+    - exact-match postings (sorted position lists) per indexed inputs field and
+      per exercise / meal name,
+    - sorted (budget, position) and (timestamp, position) lists for range filters,
+    - a per-position summary (field values, month, budget, exercise and meal names)
+      and running exercise/meal counters for the stats,
+    - an id -> position map for single-plan lookups, and a sorted (id, position)
+      list that pages through the history newest first.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._fields = {field: {} for field in INDEXED_FIELDS} # field -> value -> [positions]
+        self._exercises = {} # name -> [positions]
+        self._meals = {}
+        self._budgets = [] # sorted (budget, position)
+        self._timestamps = [] # sorted (timestamp, position)
+        self._summaries = [] # position -> (field values..., month, budget, exercises, meals)
+        self._ids = {} # plan id -> position (the first plan stored with that id)
+        self._by_id = [] # sorted (id, position); ids only grow, so inserts land at the end
+        self.exercise_counts = Counter()
+        self.meal_counts = Counter()
+
+    # --- INSERTS ---
+
+    def add_many(self, plans):
+        for plan in plans:
+            self.add(plan)
+
+    def add(self, plan):
+        position = self.size
+        self.size += 1
+        plan_id = plan.get('id')
+        if plan_id is not None:
+            self._ids.setdefault(plan_id, position)
+        sort_id = plan.get('id', 0) # query_plans' order: a plan without an id sorts as 0
+        if isinstance(sort_id, (int, float)) and not isinstance(sort_id, bool):
+            bisect.insort(self._by_id, (sort_id, position))
+        inputs = plan.get('inputs')
+        if not isinstance(inputs, dict):
+            inputs = {}
+
+        values = []
+        for field in INDEXED_FIELDS:
+            value = get_input(inputs, field)
+            value = sys.intern(value) if isinstance(value, str) else None
+            values.append(value)
+            if value is not None:
+                self._fields[field].setdefault(value, []).append(position)
+
+        budget = get_input(inputs, 'budget')
+        if not isinstance(budget, (int, float)) or isinstance(budget, bool):
+            budget = None
+        else:
+            bisect.insort(self._budgets, (budget, position))
+
+        timestamp = plan.get('timestamp')
+        month = None
+        if isinstance(timestamp, str) and timestamp:
+            bisect.insort(self._timestamps, (timestamp, position))
+            month = sys.intern(timestamp[:7])
+
+        exercises = _names(plan, 'workoutPlan', 'exercises')
+        meals = _names(plan, 'mealPlan', 'meals')
+        for name in set(exercises):
+            self._exercises.setdefault(name, []).append(position)
+        for name in set(meals):
+            self._meals.setdefault(name, []).append(position)
+        self.exercise_counts.update(exercises)
+        self.meal_counts.update(meals)
+        self._summaries.append((*values, month, budget, exercises, meals))
+
+    # --- QUERIES ---
+
+    def position(self, plan_id):
+        """Position of the plan with the given id, or None."""
+        return self._ids.get(plan_id)
+
+    def newest_first(self, before_id=None):
+        """Yields the positions of the plans with an id below before_id (any id when None), newest id first."""
+        end = len(self._by_id) if before_id is None else bisect.bisect_left(self._by_id, (before_id,))
+        for i in range(end - 1, -1, -1):
+            yield self._by_id[i][1]
+
+    def match(self, fields=None, budget_min=None, budget_max=None, time_from=None, time_to=None,
+              exercise=None, meal=None):
+        """
+        Positions (ascending) of the plans matching every criterion, or None when
+        there are no criteria. fields maps an indexed field to the accepted values.
+        """
+        candidates = []
+        for field, accepted in (fields or {}).items():
+            postings = self._fields[field]
+            if len(accepted) == 1:
+                candidates.append(postings.get(accepted[0], []))
+            else:
+                candidates.append(sorted(set().union(*(postings.get(value, []) for value in accepted))))
+        if exercise is not None:
+            candidates.append(self._exercises.get(exercise, []))
+        if meal is not None:
+            candidates.append(self._meals.get(meal, []))
+        if budget_min is not None or budget_max is not None:
+            candidates.append(_range(self._budgets, budget_min, budget_max))
+        if time_from is not None or time_to is not None:
+            candidates.append(_range(self._timestamps, time_from, time_to))
+        if not candidates:
+            return None
+
+        # Intersect starting from the most selective criterion
+        candidates.sort(key=len)
+        result = candidates[0]
+        for other in candidates[1:]:
+            if not result:
+                break
+            other = set(other)
+            result = [position for position in result if position in other]
+        return sorted(result)
+
+    def stats(self, positions=None, group_by=None, top=10):
+        """Counts, budget distribution and most frequent exercises/meals of the given positions (None: all)."""
+        if positions is None:
+            count = self.size
+            budgets = [budget for budget, _ in self._budgets]
+            exercise_counts, meal_counts = self.exercise_counts, self.meal_counts
+        else:
+            count = len(positions)
+            summaries = [self._summaries[position] for position in positions]
+            budgets = sorted(summary[-3] for summary in summaries if summary[-3] is not None)
+            exercise_counts, meal_counts = Counter(), Counter()
+            for summary in summaries:
+                exercise_counts.update(summary[-2])
+                meal_counts.update(summary[-1])
+
+        result = {
+            "count": count,
+            "budget": _budget_summary(budgets),
+            "top_exercises": [{"name": name, "count": n} for name, n in exercise_counts.most_common(top)],
+            "top_meals": [{"name": name, "count": n} for name, n in meal_counts.most_common(top)],
+        }
+        if group_by is not None:
+            column = GROUP_BY_FIELDS.index(group_by)
+            rows = self._summaries if positions is None else (self._summaries[p] for p in positions)
+            groups = Counter(row[column] for row in rows)
+            result["by_" + group_by] = {
+                str(value) if value is not None else 'unknown': n
+                for value, n in sorted(groups.items(), key=lambda item: (-item[1], str(item[0])))
+            }
+        return result
+
+
+# --- HELPERS ---
+
+def _names(plan, section, items):
+    """Interned names of every exercise (or meal) in a plan, one per occurrence."""
+    body = plan.get('plan')
+    days = body.get(section) if isinstance(body, dict) else None
+    names = []
+    for day in days if isinstance(days, list) else ():
+        for item in (day.get(items) or ()) if isinstance(day, dict) else ():
+            name = item.get('name') if isinstance(item, dict) else None
+            if isinstance(name, str):
+                names.append(sys.intern(name))
+    return tuple(names)
+
+
+def _range(pairs, low, high):
+    """Positions whose key is within [low, high] in a sorted list of (key, position)."""
+    start = 0 if low is None else bisect.bisect_left(pairs, (low,))
+    end = len(pairs) if high is None else bisect.bisect_right(pairs, (high, math.inf))
+    return [position for _, position in pairs[start:end]]
+
+
+def _budget_summary(budgets):
+    """min/max/mean/median and a histogram of an already sorted list of daily budgets."""
+    if not budgets:
+        return {"min": None, "max": None, "mean": None, "median": None, "histogram": []}
+    histogram = []
+    start = 0
+    for bound in BUDGET_BUCKETS + (None,):
+        end = len(budgets) if bound is None else bisect.bisect_right(budgets, bound)
+        histogram.append({"max": bound, "count": end - start})
+        start = end
+    return {
+        "min": budgets[0],
+        "max": budgets[-1],
+        "mean": round(statistics.fmean(budgets), 2),
+        "median": statistics.median(budgets),
+        "histogram": histogram,
+    }
@@ -0,0 +1,195 @@
+import os
+import re
+
+# --- INPUT SCHEMA ---
+
+# Largest accepted generation payload (a form submission is about 250 bytes)
+MAX_INPUT_BYTES = int(os.environ.get('PLAN_INPUT_MAX_BYTES', 2048))
+# Longest accepted string 'seed'
+MAX_SEED_LENGTH = 128
+
+
+class InputError(ValueError):
+    """A generation payload that cannot be used; status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _slug(text):
+    """'Weight Loss', 'weight_loss' and 'weight-loss ' all become 'weight_loss'."""
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+class Choice:
+    """An enum field: its canonical values, plus other spellings that mean the same value."""
+
+    __slots__ = ('name', 'values', 'default', '_lookup')
+
+    def __init__(self, name, values, default, aliases=None):
+        self.name = name
+        self.values = values
+        self.default = default
+        self._lookup = {_slug(value): value for value in values}
+        for alias, value in (aliases or {}).items():
+            self._lookup[_slug(alias)] = value
+
+    def parse(self, value):
+        if value in self.values:
+            return value
+        canonical = self._lookup.get(_slug(value)) if isinstance(value, str) else None
+        if canonical is None:
+            raise InputError(f"'{self.name}' must be one of: {', '.join(self.values)}")
+        return canonical
+
+    def canonical(self, value):
+        """The canonical value, or value unchanged when it is not a known spelling."""
+        if not isinstance(value, str) or value in self.values:
+            return value
+        return self._lookup.get(_slug(value), value)
+
+
+class Number:
+    """A whole-number field within [minimum, maximum]; integral floats (500.0) are accepted."""
+
+    __slots__ = ('name', 'minimum', 'maximum', 'default')
+
+    def __init__(self, name, minimum, maximum, default):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.default = default
+
+    def parse(self, value):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int) or not self.minimum <= value <= self.maximum:
+            raise InputError(f"'{self.name}' must be a whole number between {self.minimum} and {self.maximum}")
+        return value
+
+    def canonical(self, value):
+        return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+class Seed:
+    """The optional 'seed' that makes the variation picks reproducible."""
+
+    __slots__ = ()
+    name = 'seed'
+    default = None
+
+    def parse(self, value):
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise InputError("'seed' must be an integer or a string")
+        if isinstance(value, str) and len(value) > MAX_SEED_LENGTH:
+            raise InputError(f"'seed' must be at most {MAX_SEED_LENGTH} characters")
+        return value
+
+    def canonical(self, value):
+        return value
+
+
+GOALS = ('Weight Loss', 'Muscle Gain', 'Healthy Maintenance')
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+EQUIPMENT = ('Bodyweight Only', 'Light Weights/Bands', 'Full Gym Access')
+INTENSITIES = ('Extremely Limited (15 min/day)', 'Busy Student (45 min max)', 'Flexible (up to 90 min)')
+CUISINES = ('Any/Global', 'South Asian', 'Latino', 'American/Comfort')
+
+# Canonical field order; stored inputs list their fields in this order
+FIELDS = (
+    Choice('goal', GOALS, 'Healthy Maintenance', aliases={
+        'maintenance': 'Healthy Maintenance', 'fat_loss': 'Weight Loss', 'muscle': 'Muscle Gain'}),
+    Choice('level', LEVELS, 'Intermediate'),
+    Choice('equipment', EQUIPMENT, 'Bodyweight Only', aliases={
+        'bodyweight': 'Bodyweight Only', 'none': 'Bodyweight Only', 'light_weights': 'Light Weights/Bands',
+        'bands': 'Light Weights/Bands', 'gym': 'Full Gym Access', 'full_gym': 'Full Gym Access'}),
+    Choice('intensity', INTENSITIES, 'Busy Student (45 min max)', aliases={
+        'extremely_limited': 'Extremely Limited (15 min/day)', 'limited': 'Extremely Limited (15 min/day)',
+        'busy_student': 'Busy Student (45 min max)', 'busy': 'Busy Student (45 min max)',
+        'flexible': 'Flexible (up to 90 min)'}),
+    Number('budget', 50, 20000, 500),
+    Choice('cuisine', CUISINES, 'Any/Global', aliases={
+        'any': 'Any/Global', 'global': 'Any/Global', 'american': 'American/Comfort',
+        'comfort': 'American/Comfort'}),
+    Number('workouts_per_week', 1, 7, 3),
+    Seed(),
+)
+FIELDS_BY_NAME = {field.name: field for field in FIELDS}
+# Field names used by older clients (and still found in stored history)
+FIELD_ALIASES = {
+    'fitnessLevel': 'level',
+    'schedule': 'intensity',
+    'culturalCuisine': 'cuisine',
+    'workoutFrequency': 'workouts_per_week',
+}
+# The inputs that determine a generated plan, in key order
+KEY_FIELDS = ('goal', 'level', 'equipment', 'intensity', 'budget', 'cuisine')
+_LEGACY_NAMES = {name: legacy_name for legacy_name, name in FIELD_ALIASES.items()}
+
+
+# --- VALIDATION ---
+
+def validate_inputs(data):
+    """
+    Checks a generation payload against FIELDS and returns its canonical form: a new
+    dict with canonical field names and values in FIELDS order and defaults filled in
+    ('seed' only when given). A null value counts as not given. Raises InputError.
+    """
+    if not data or not isinstance(data, dict):
+        raise InputError("No input data provided")
+    values = {}
+    for key, value in data.items():
+        name = FIELD_ALIASES.get(key, key)
+        field = FIELDS_BY_NAME.get(name)
+        if field is None:
+            raise InputError(f"Unknown field '{key}'")
+        if name in values:
+            raise InputError(f"'{key}' and '{name}' are the same field")
+        values[name] = None if value is None else field.parse(value)
+    inputs = {}
+    for field in FIELDS:
+        value = values.get(field.name)
+        value = field.default if value is None else value
+        if value is not None:
+            inputs[field.name] = value
+    return inputs
+
+
+def input_key(inputs):
+    """
+    The compact hashable key of the inputs that determine a plan:
+    (goal, level, equipment, intensity, budget, cuisine), with defaults for missing fields.
+
+    For canonical inputs (validate_inputs) the strings are the schema's own objects.
+    Stored history is keyed as it was written (stripped, not canonicalized), so old
+    records keep re-rendering the plan they were saved with.
+    """
+    def value(name):
+        field = FIELDS_BY_NAME[name]
+        raw = inputs.get(name, field.default)
+        return raw.strip() if isinstance(raw, str) else field.canonical(raw)
+
+    return tuple(value(name) for name in KEY_FIELDS)
+
+
+def profile_key(inputs):
+    """
+    input_key of stored inputs in the canonical form validate_inputs gives them: older
+    field names, other spellings of an option ('weight_loss') and missing fields (their
+    defaults) key the same profile as today's inputs. Unknown values are kept.
+    """
+    def value(name):
+        field = FIELDS_BY_NAME[name]
+        raw = inputs.get(name)
+        if raw is None and name in _LEGACY_NAMES:
+            raw = inputs.get(_LEGACY_NAMES[name])
+        return field.default if raw is None else field.canonical(raw)
+
+    return tuple(value(name) for name in KEY_FIELDS)
+
+
+def canonical_value(name, value):
+    """Maps a stored or queried value of field name to its canonical spelling (unknown values are kept)."""
+    field = FIELDS_BY_NAME.get(name)
+    return field.canonical(value) if field is not None else value
@@ -0,0 +1,175 @@
+import itertools
+import os
+import sys
+import time
+from array import array
+
+from meal_planner import MealCatalog, MealPlanner, register_optimized_meals, render_meals
+from plan_inputs import CUISINES, EQUIPMENT, GOALS, INTENSITIES, KEY_FIELDS, LEVELS
+from plan_templates import TemplateRegistry
+
+# --- MATRIX CONFIGURATION ---
+
+# Every input the Streamlit form can send, in input key order (plan_inputs.KEY_FIELDS);
+# the budget slider goes from 100 to 2000 in steps of 50
+UI_GRID = (GOALS, LEVELS, EQUIPMENT, INTENSITIES, tuple(range(100, 2001, 50)), CUISINES)
+# Parts rendered per task sent to a worker process
+CHUNK_SIZE = 64
+
+
+class PlanMatrix:
+    """
+    Every plan of an input grid, rendered ahead of time.
+
+    A plan is two parts: its workoutPlan, and its meal sections (the mealPlan,
+    plus the mealBudget of an optimized week). A part depends only
+    on its template, variation and the values of the slots the template reads
+    (e.g. a workout does not depend on budget or cuisine), so the distinct parts
+    are few: they are rendered once, in parallel across a process pool, and
+    stored once. The table itself is a flat array of part numbers, two per
+    (grid inputs, workout variation, meal variation) cell; 0 marks a variation
+    the cell's template does not have.
+
+    Looked-up plans share their parts, so callers must treat them as read-only.
+    """
+
+    def __init__(self, grid, workout_variations, meal_variations, parts, cells, stats):
+        self._positions = [{value: i for i, value in enumerate(values)} for values in grid]
+        self._radix = [len(values) for values in grid] + [workout_variations, meal_variations]
+        self._parts = parts # part number - 1 -> (template id, rendered value)
+        self._cells = cells
+        self.stats = stats
+
+    @classmethod
+    def build(cls, templates, select_templates, plan_params, grid=UI_GRID, workers=None):
+        """
+        Renders every plan of grid. select_templates(data) and plan_params(key, workout_variation)
+        are the generator's own template pick and slot values; templates must hold every
+        template they return. workers=0 or 1 renders in this process.
+        """
+        start = time.perf_counter()
+        workout_variations = max(t.variation_count for t in templates.workouts.values())
+        meal_variations = max(t.variation_count for t in templates.meals.values())
+        part_numbers = {} # (kind, template id, variation, slot values) -> part number
+        tasks = []
+        cells = array('I', [0]) * (2 * workout_variations * meal_variations * _size(grid))
+        cell = 0
+        for values in itertools.product(*grid):
+            key, workout_template, meal_template = select_templates(dict(zip(KEY_FIELDS, values)))
+            for workout_variation in range(1, workout_variations + 1):
+                if workout_variation > workout_template.variation_count:
+                    cell += 2 * meal_variations
+                    continue
+                params = plan_params(key, workout_variation)
+                workout_part = _part_number(part_numbers, tasks, 'workouts', workout_template,
+                                            workout_variation, params)
+                for meal_variation in range(1, meal_template.variation_count + 1):
+                    cells[cell] = workout_part
+                    cells[cell + 1] = _part_number(part_numbers, tasks, 'meals', meal_template,
+                                                   meal_variation, params)
+                    cell += 2
+                cell += 2 * (meal_variations - meal_template.variation_count)
+        part_numbers = None
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        context = _fork_context()
+        if workers > 1 and context is not None and len(tasks) > CHUNK_SIZE:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+                rendered = list(pool.map(_render_part, tasks, chunksize=CHUNK_SIZE))
+        else:
+            workers = 1
+            rendered = [_render_part(task, templates) for task in tasks]
+        parts = [(task[1], value) for task, value in zip(tasks, rendered)]
+        tasks = rendered = None
+        warmup_seconds = time.perf_counter() - start
+
+        stats = {
+            "plans": sum(1 for i in range(0, len(cells), 2) if cells[i]),
+            "parts": len(parts),
+            "workers": workers,
+            "warmup_seconds": round(warmup_seconds, 3),
+            "parts_kib": round(_deep_size(parts, set()) / 1024, 1),
+            "table_kib": round(cells.itemsize * len(cells) / 1024, 1),
+        }
+        return cls(grid, workout_variations, meal_variations, parts, cells, stats)
+
+    def get(self, key, workout_template_id, workout_variation, meal_template_id, meal_variation):
+        """The precomputed plan, or None when the inputs are off the grid or used other templates."""
+        index = 0
+        for positions, radix, value in zip(self._positions, self._radix, key):
+            position = positions.get(value)
+            if position is None:
+                return None
+            index = index * radix + position
+        if not (0 < workout_variation <= self._radix[-2] and 0 < meal_variation <= self._radix[-1]):
+            return None
+        index = (index * self._radix[-2] + workout_variation - 1) * self._radix[-1] + meal_variation - 1
+        workout_part, meal_part = self._cells[2 * index], self._cells[2 * index + 1]
+        if not workout_part:
+            return None
+        workout_id, workout_plan = self._parts[workout_part - 1]
+        meal_id, meal_sections = self._parts[meal_part - 1]
+        if workout_id != workout_template_id or meal_id != meal_template_id:
+            return None
+        return {"workoutPlan": workout_plan, **meal_sections}
+
+
+# --- BUILD HELPERS ---
+
+_worker_templates = None
+
+
+def _size(grid):
+    size = 1
+    for values in grid:
+        size *= len(values)
+    return size
+
+
+def _deep_size(value, seen):
+    """Bytes held by value and everything it contains, counting shared objects once."""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(item, seen) for item in value)
+    return size
+
+
+def _part_number(part_numbers, tasks, kind, template, variation, params):
+    slot_values = tuple(params[slot] for slot in template.slots)
+    part_key = (kind, template.template_id, variation, slot_values)
+    number = part_numbers.get(part_key)
+    if number is None:
+        tasks.append((kind, template.template_id, variation, dict(zip(template.slots, slot_values))))
+        number = part_numbers[part_key] = len(tasks)
+    return number
+
+
+def _fork_context():
+    """Workers are forked: a spawned worker would re-run the app module that started the build."""
+    import multiprocessing # Only needed when the matrix is built, not on every startup
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError: # No fork() on this platform: build in-process
+        return None
+
+
+def _init_worker():
+    """Each worker loads its own templates (the same files the app uses)."""
+    global _worker_templates
+    _worker_templates = TemplateRegistry.from_file()
+    register_optimized_meals(_worker_templates, MealPlanner(MealCatalog.from_file()))
+
+
+def _render_part(task, templates=None):
+    kind, template_id, variation, params = task
+    templates = templates or _worker_templates
+    if kind == 'workouts':
+        return templates.workouts[template_id].render(variation, params)
+    return render_meals(templates.meals[template_id], variation, params)
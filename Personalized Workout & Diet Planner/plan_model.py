@@ -0,0 +1,282 @@
+"""
+Typed, memory-compact model of the plan JSON schema.
+
+The nodes are frozen dataclasses with __slots__. They compare by identity
+(eq=False): PlanDecoder shares equal nodes, so within one history identity is
+value equality, and hashing a node never walks the plan below it.
+"""
+import json
+import sys
+from dataclasses import dataclass, field, fields
+
+# --- JSON ---
+
+# Same compact form as the stored log lines (storage._encode_line); plan models
+# inside plain values fall back to their dict form
+def _default(value):
+    if isinstance(value, PlanNode):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+
+def _dumps(value):
+    return _encoder.encode(value).encode('utf-8')
+
+
+# --- PLAN MODEL ---
+
+class PlanNode:
+    """
+    Base of the plan model: one JSON object of the plan schema, with its keys in wire order.
+
+    Nodes are read-only and built by PlanDecoder, which shares equal nodes, so a
+    node is stored once however many saved plans contain it. Whole plans keep
+    their encoding; the nodes inside them are encoded again when a new plan
+    needs them, so a plan's text is not held once per nesting level.
+    Subclasses are declared with @plan_node; their fields are the JSON keys in
+    order (see schema_field for other key names, nested nodes and optional keys).
+    """
+
+    __slots__ = ()
+    KEYS = ()
+    REQUIRED_KEYS = ()
+    ITEMS = ()
+    NODES = ()
+    KEEP_ENCODING = False
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self._names)
+
+    def encoded(self):
+        """Compact JSON bytes, as written to the log."""
+        encoded = getattr(self, '_encoded', None)
+        if encoded is None:
+            parts = []
+            for prefix, item_class, node_class, value in zip(self._prefixes, self.ITEMS, self.NODES, self.values()):
+                if item_class is not None:
+                    parts.append(prefix + b'[' + b','.join(item.encoded() for item in value) + b']')
+                elif node_class is None:
+                    parts.append(prefix + _dumps(value))
+                elif value is not None: # An optional node that is absent has no key
+                    parts.append(prefix + value.encoded())
+            encoded = b'{' + b','.join(parts) + b'}'
+            if self.KEEP_ENCODING:
+                object.__setattr__(self, '_encoded', encoded) # Frozen: a cache, not a field change
+        return encoded
+
+    def to_dict(self):
+        """The plain JSON-schema dict (new objects on every call)."""
+        result = {}
+        for key, item_class, node_class, value in zip(self.KEYS, self.ITEMS, self.NODES, self.values()):
+            if item_class is not None:
+                value = [item.to_dict() for item in value]
+            elif node_class is not None:
+                if value is None:
+                    continue
+                value = value.to_dict()
+            result[key] = value
+        return result
+
+
+def schema_field(key=None, items=None, node=None, optional=False):
+    """
+    A node field stored under JSON key (default: the field name). items is the node
+    class of a list's elements, node the class of a single nested node; an optional
+    node defaults to None and its key is left out of the JSON while it is None.
+    """
+    if optional:
+        return field(default=None, metadata={'key': key, 'items': items, 'node': node, 'optional': True})
+    return field(metadata={'key': key, 'items': items, 'node': node})
+
+
+def plan_node(cls):
+    """Makes cls a slotted, frozen dataclass and derives its KEYS / ITEMS / NODES from the fields."""
+    cls = dataclass(slots=True, frozen=True, eq=False)(cls)
+    schema = [f for f in fields(cls) if f.init]
+    cls._names = tuple(f.name for f in schema)
+    cls.KEYS = tuple(f.metadata.get('key') or f.name for f in schema)
+    cls.REQUIRED_KEYS = tuple(key for key, f in zip(cls.KEYS, schema) if not f.metadata.get('optional'))
+    cls.ITEMS = tuple(f.metadata.get('items') for f in schema)
+    cls.NODES = tuple(f.metadata.get('node') for f in schema)
+    cls._prefixes = tuple(_dumps(key) + b':' for key in cls.KEYS)
+    return cls
+
+
+@plan_node
+class Exercise(PlanNode):
+    name: str
+    sets: int | str
+    reps: int | str
+    notes: str
+
+
+@plan_node
+class DayWorkout(PlanNode):
+    day: str
+    focus: str
+    exercises: tuple = schema_field(items=Exercise)
+
+
+@plan_node
+class Meal(PlanNode):
+    name: str
+    recipe: str
+    cost_estimate_in_inr: str
+
+
+@plan_node
+class DayMeals(PlanNode):
+    day: str
+    meals: tuple = schema_field(items=Meal)
+
+
+@plan_node
+class MealBudget(PlanNode):
+    weekly_cost_inr: int = schema_field('weeklyCostInr')
+    weekly_budget_inr: int = schema_field('weeklyBudgetInr')
+    within_budget: bool = schema_field('withinBudget')
+
+
+@plan_node
+class Plan(PlanNode):
+    workout_plan: tuple = schema_field('workoutPlan', DayWorkout)
+    meal_plan: tuple = schema_field('mealPlan', DayMeals)
+    meal_budget: MealBudget = schema_field('mealBudget', node=MealBudget, optional=True)
+    _encoded: bytes = field(default=None, init=False, repr=False)
+    KEEP_ENCODING = True
+
+
+# --- DECODING ---
+
+# Where a stored entry's plan body starts (after its id, timestamp and inputs)
+_PLAN_BODY = b'"plan":{"workoutPlan":'
+
+
+class PlanDecoder:
+    """
+    Builds plan models from parsed JSON.
+
+    Strings are interned and equal nodes are shared: a history of template plans
+    holds each distinct plan, day, exercise and meal once. A value
+    that does not match the schema exactly (other keys or key order, non-text
+    values other than integers and booleans) is kept as it is, so every plan
+    round-trips to the same JSON. The tables of shared nodes only grow; use one decoder per
+    history and drop it with the history.
+    """
+
+    def __init__(self):
+        self._shared = {}
+        self._by_encoding = {} # Plan encoding -> Plan
+
+    def decode(self, body):
+        """The Plan for a plan body, or body itself when it does not match the schema."""
+        plan = self._node(Plan, body)
+        return body if plan is None else plan
+
+    def decode_entry(self, entry):
+        """A copy of a saved entry with its 'plan' decoded and its 'inputs' strings interned."""
+        body = entry.get('plan')
+        return self._copy(entry, None if body is None else self.decode(body))
+
+    def decode_stored(self, entry, encoded):
+        """
+        decode_entry for an entry read along with its compact encoding. Returns
+        (decoded entry, head): head is encoded up to the plan body, or None unless
+        the entry ends with a Plan whose encoding closes encoded. A body already
+        seen is looked up by its bytes instead of being walked again.
+        """
+        if next(reversed(entry), None) == 'plan':
+            start = encoded.find(_PLAN_BODY)
+            if start >= 0:
+                split = start + len(b'"plan":')
+                plan = self._by_encoding.get(encoded[split:-1])
+                if plan is not None:
+                    return self._copy(entry, plan), encoded[:split]
+        decoded = self.decode_entry(entry)
+        plan = decoded.get('plan')
+        if isinstance(plan, Plan) and next(reversed(decoded)) == 'plan':
+            tail = plan.encoded() + b'}'
+            if encoded.endswith(tail):
+                self._by_encoding[plan.encoded()] = plan
+                return decoded, encoded[:-len(tail)]
+        return decoded, None
+
+    def _copy(self, entry, plan):
+        decoded = dict(entry)
+        if plan is not None:
+            decoded['plan'] = plan
+        inputs = entry.get('inputs')
+        if type(inputs) is dict:
+            decoded['inputs'] = {
+                sys.intern(key): sys.intern(value) if type(value) is str else value
+                for key, value in inputs.items()
+            }
+        return decoded
+
+    def _node(self, cls, value):
+        if type(value) is not dict:
+            return None
+        keys = tuple(value)
+        if keys != cls.KEYS and keys != cls.REQUIRED_KEYS: # The optional keys are all there or all left out
+            return None
+        fields = [cls]
+        key = [cls]
+        for item_class, node_class, item in zip(cls.ITEMS, cls.NODES, value.values()):
+            if node_class is not None:
+                item = self._node(node_class, item)
+                if item is None:
+                    return None
+            elif item_class is None:
+                if type(item) is str:
+                    item = sys.intern(item)
+                elif type(item) is bool:
+                    key.append((bool, item)) # Would share nodes with the ints 1 and 0 otherwise
+                    fields.append(item)
+                    continue
+                elif type(item) is not int and item is not None: # Floats would share nodes with ints
+                    return None
+            else:
+                if type(item) is not list:
+                    return None
+                items = []
+                for element in item:
+                    node = self._node(item_class, element)
+                    if node is None:
+                        return None
+                    items.append(node)
+                item = tuple(items)
+            key.append(item)
+            fields.append(item)
+        key = tuple(key)
+        node = self._shared.get(key)
+        if node is None:
+            node = self._shared[key] = cls(*fields[1:])
+        return node
+
+    def __len__(self):
+        return len(self._shared)
+
+
+# --- ENCODING ---
+
+def dumps(value):
+    """
+    Compact UTF-8 JSON bytes of value. Plan models are written from their cached
+    encoding wherever they sit in an entry ({"plan": Plan}), a list of entries or a
+    dict of those lists; everything else is written by the json module's C encoder.
+    """
+    if isinstance(value, PlanNode):
+        return value.encoded()
+    if type(value) is dict:
+        return b'{' + b','.join(
+            _dumps(key) + b':' + (dumps(item) if type(item) is list or isinstance(item, PlanNode) else _dumps(item))
+            for key, item in value.items()) + b'}'
+    if type(value) is list:
+        return b'[' + b','.join(
+            dumps(item) if type(item) is dict or isinstance(item, PlanNode) else _dumps(item)
+            for item in value) + b']'
+    return _dumps(value)
+
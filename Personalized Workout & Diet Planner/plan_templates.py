@@ -0,0 +1,169 @@
+import json
+import os
+from string import Formatter
+
+# --- TEMPLATE CONFIGURATION ---
+
+TEMPLATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plan_templates.json')
+
+# Every parameter slot a template string may reference, e.g. "{sets}" or "Goal: {goal}".
+# A string that is exactly one slot ("{sets}") is replaced by the raw value, so
+# numeric slots stay numbers in the generated JSON.
+TEMPLATE_SLOTS = frozenset({
+    # Workout slots
+    'goal', 'variation', 'sets', 'reps_high', 'reps_low', 'intensity_note', 'workout_goal_note',
+    # Meal slots
+    'cost_low', 'cost_med', 'cost_high', 'budget_detail', 'budget_adj_note', 'goal_note',
+})
+
+
+class TemplateError(ValueError):
+    """Raised when plan_templates.json is malformed or references an unknown slot."""
+
+
+# --- COMPILER ---
+
+def _string_expression(text, where, used_slots):
+    """Turns a template string into a Python expression (a literal or an f-string)."""
+    pieces = []
+    for literal, field, format_spec, conversion in Formatter().parse(text):
+        if format_spec or conversion:
+            raise TemplateError(f"{where}: format specs are not supported in '{text}'")
+        if field is not None and field not in TEMPLATE_SLOTS:
+            raise TemplateError(f"{where}: unknown slot '{{{field}}}' in '{text}'")
+        pieces.append((literal, field))
+
+    if all(field is None for _, field in pieces):
+        # No slots: the (un-escaped) literal text.
+        return repr(''.join(literal for literal, _ in pieces))
+
+    if len(pieces) == 1 and not pieces[0][0]:
+        # The whole value is one slot: keep the parameter's own type (e.g. int sets).
+        used_slots.add(pieces[0][1])
+        return f"p_{pieces[0][1]}"
+
+    parts = []
+    for literal, field in pieces:
+        if literal:
+            parts.append('f' + repr(literal.replace('{', '{{').replace('}', '}}')))
+        if field is not None:
+            used_slots.add(field)
+            parts.append(f"f'{{p_{field}}}'")
+    return ' '.join(parts)
+
+def _expression(node, where, used_slots):
+    if isinstance(node, dict):
+        items = ', '.join(f"{key!r}: {_expression(value, f'{where}.{key}', used_slots)}"
+                          for key, value in node.items())
+        return '{' + items + '}'
+    if isinstance(node, list):
+        return '[' + ', '.join(_expression(value, f"{where}[{i}]", used_slots)
+                               for i, value in enumerate(node)) + ']'
+    if isinstance(node, str):
+        return _string_expression(node, where, used_slots)
+    if node is None or isinstance(node, (bool, int, float)):
+        return repr(node)
+    raise TemplateError(f"{where}: unsupported value {node!r}")
+
+def compile_node(node, where='template', used_slots=None):
+    """
+    Compiles a parsed JSON template node into a function params -> filled value.
+
+    The node is translated once into the source of a single Python function
+    whose body is one dict/list display with f-strings for the slots, so a
+    fill costs the same as building the literal by hand. Containers are
+    rebuilt on every call, so callers never share mutable output.
+    The slots the node reads are added to used_slots when it is given.
+    """
+    if used_slots is None:
+        used_slots = set()
+    body = _expression(node, where, used_slots)
+    lines = ["def render(params):"]
+    lines.extend(f"    p_{slot} = params[{slot!r}]" for slot in sorted(used_slots))
+    lines.append(f"    return {body}")
+    namespace = {}
+    exec(compile('\n'.join(lines), f"<{where}>", 'exec'), namespace)
+    return namespace['render']
+
+
+# --- REGISTRY ---
+
+class PlanTemplate:
+    """
+    One workout or meal template with its compiled variations (numbered from 1).
+    slots lists (sorted) the params any variation reads, so two fills with equal
+    values for them give equal output.
+    """
+
+    __slots__ = ('template_id', 'kind', 'description', 'variation_count', 'slots', '_variations')
+
+    def __init__(self, template_id, kind, spec):
+        self.template_id = template_id
+        self.kind = kind
+        self.description = spec.get('description', '')
+        variations = spec.get('variations') or []
+        if not variations:
+            raise TemplateError(f"{kind} template '{template_id}' has no variations")
+        used_slots = set()
+        self._variations = [compile_node(variation, f"{kind}.{template_id}[{i + 1}]", used_slots)
+                            for i, variation in enumerate(variations)]
+        self.variation_count = len(self._variations)
+        self.slots = tuple(sorted(used_slots))
+
+    def render(self, variation, params):
+        """Fills the slots of the chosen variation (1-based) with params."""
+        return self._variations[variation - 1](params)
+
+
+class TemplateRegistry:
+    """
+    Workout templates are looked up by (level, equipment), meal templates by cuisine.
+    Each section must mark exactly one template as the "default" fallback.
+    """
+
+    def __init__(self, data):
+        self.workouts = {}
+        self.meals = {}
+        self._workout_index = {}
+        self._meal_index = {}
+        self._default_workout = None
+        self._default_meal = None
+
+        for template_id, spec in data.get('workouts', {}).items():
+            template = PlanTemplate(template_id, 'workouts', spec)
+            self.workouts[template_id] = template
+            for level, equipment in spec.get('match', []):
+                self._workout_index[(level, equipment)] = template
+            if spec.get('default'):
+                self._default_workout = template
+
+        for template_id, spec in data.get('meals', {}).items():
+            template = PlanTemplate(template_id, 'meals', spec)
+            self.meals[template_id] = template
+            for cuisine in spec.get('match', []):
+                self._meal_index[cuisine] = template
+            if spec.get('default'):
+                self._default_meal = template
+
+        if self._default_workout is None or self._default_meal is None:
+            raise TemplateError("Both 'workouts' and 'meals' need a template marked \"default\": true")
+
+    @classmethod
+    def from_file(cls, path=TEMPLATES_FILE):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def workout_template(self, level, equipment):
+        return self._workout_index.get((level, equipment), self._default_workout)
+
+    def meal_template(self, cuisine):
+        return self._meal_index.get(cuisine, self._default_meal)
+
+    def register_meal_template(self, template):
+        """
+        Adds a generated meal template (anything with template_id, variation_count, slots
+        and render) so stored references to it resolve; it is not matched to any cuisine.
+        """
+        if template.template_id in self.meals:
+            raise TemplateError(f"Meal template '{template.template_id}' is already registered")
+        self.meals[template.template_id] = template
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+from plan_inputs import profile_key
+from storage import FileLock
+
+
+class RetentionPolicy:
+    """
+    Which saved plans stay in the live history.
+
+    A plan is kept if it is one of the per_profile newest plans of its profile
+    (goal, level, equipment, intensity, budget and cuisine in canonical spelling,
+    so plans saved with older field names or spellings count with today's), or if
+    it was saved less than days ago. A rule set to 0 is off; with both off every
+    plan is kept.
+    """
+
+    __slots__ = ('per_profile', 'days')
+
+    def __init__(self, per_profile=0, days=0):
+        self.per_profile = max(0, per_profile)
+        self.days = max(0, days)
+
+    @property
+    def enabled(self):
+        return self.per_profile > 0 or self.days > 0
+
+    def expired(self, plans_newest_first, now=None):
+        """Yields the plans the policy does not keep, from plans given newest first."""
+        if not self.enabled:
+            return
+        cutoff = None
+        if self.days > 0:
+            # Stored timestamps are local 'YYYY-MM-DD HH:MM:SS' strings, which sort by time
+            cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime((now or time.time()) - self.days * 86400))
+        newer = {} # profile -> plans of that profile seen so far (all newer)
+        for plan in plans_newest_first:
+            keep = False
+            if self.per_profile:
+                profile = profile_key(plan.get('inputs') or {})
+                rank = newer.get(profile, 0)
+                newer[profile] = rank + 1
+                keep = rank < self.per_profile
+            if not keep and cutoff is not None:
+                keep = (plan.get('timestamp') or '') >= cutoff
+            if not keep:
+                yield plan
+
+    def to_dict(self):
+        return {"per_profile": self.per_profile, "days": self.days}
+
+
+class RetentionCompactor:
+    """
+    Background job applying a RetentionPolicy: the plans the policy drops are
+    written to a PlanArchive, then removed from the live storage, so the history
+    every request reads (and the history cache holds) stays bounded.
+
+    The scan and the archive writes run without the storage lock, so plans keep
+    being saved meanwhile; only the final storage.remove takes it, for one rewrite
+    of the kept plans. Plans saved during a run are not in the scan and are never
+    touched. Runs are serialized across processes by a lock file in the archive
+    directory, so workers sharing the storage do not archive the same plans twice.
+
+    The thread runs once at start, then every interval seconds or when trigger()
+    is called. Each run's report (see run_once) is kept in last_report and passed
+    to on_report(report).
+    """
+
+    def __init__(self, storage, archive, policy, interval=3600, on_report=None):
+        self.storage = storage
+        self.archive = archive
+        self.policy = policy
+        self.interval = interval
+        self.on_report = on_report
+        self.last_report = None
+        self.runs = 0
+        self._run_lock = FileLock(os.path.join(archive.directory, 'compaction'))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._wake.set() # First run right away
+        self._thread = threading.Thread(target=self._loop, name='plan-compaction', daemon=True)
+        self._thread.start()
+
+    def trigger(self):
+        """Starts a run now (or right after the one in progress)."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Plan compaction failed: {e}")
+
+    def run_once(self):
+        """
+        Archives and removes the plans the policy drops. Returns the report:
+        plans scanned, archived and removed, bytes reclaimed in the live storage,
+        the hot set left (plans and bytes), the archive totals and the run time.
+        """
+        start = time.perf_counter()
+        os.makedirs(self.archive.directory, exist_ok=True)
+        with self._run_lock:
+            scanned = 0
+            ids = set()
+            batch = []
+
+            def counted(plans):
+                nonlocal scanned
+                for plan in plans:
+                    scanned += 1
+                    yield plan
+
+            # Expired plans are archived one segment at a time, so memory stays bounded on the first run
+            for plan in self.policy.expired(counted(self.storage.iter_plans(newest_first=True))):
+                if plan.get('id') is None:
+                    continue # Cannot be removed by id
+                ids.add(plan['id'])
+                batch.append(plan)
+                if len(batch) >= self.archive.segment_plans:
+                    self.archive.append(batch)
+                    batch = []
+            self.archive.append(batch)
+
+            if ids:
+                removed, hot_plans, reclaimed = self.storage.remove(ids)
+            else:
+                removed, hot_plans, reclaimed = 0, scanned, 0
+            report = {
+                "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "seconds": round(time.perf_counter() - start, 3),
+                "scanned": scanned,
+                "archived": len(ids),
+                "removed": removed,
+                "bytes_reclaimed": reclaimed,
+                "hot_plans": hot_plans,
+                "hot_bytes": self.storage.size_bytes(),
+                "archive": self.archive.stats(),
+            }
+        self.last_report = report
+        self.runs += 1
+        print("Plan compaction: archived {archived} of {scanned} plans, reclaimed {bytes_reclaimed} bytes; "
+              "hot set {hot_plans} plans, {hot_bytes} bytes ({seconds}s)".format(**report))
+        if self.on_report is not None:
+            self.on_report(report)
+        return report
@@ -0,0 +1,1325 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import fcntl  # POSIX only; used for cross-process locking
+except ImportError:  # pragma: no cover - Windows fallback
+    fcntl = None
+
+from plan_inputs import FIELD_ALIASES, canonical_value
+
+# --- STORAGE CONFIGURATION ---
+
+# Number of appended plans after which the log file is fsync'ed to disk.
+FSYNC_BATCH_SIZE = int(os.environ.get('PLANS_FSYNC_BATCH_SIZE', 8))
+# Maximum number of seconds an appended plan may stay un-fsync'ed.
+FSYNC_INTERVAL_SECONDS = float(os.environ.get('PLANS_FSYNC_INTERVAL', 1.0))
+# 'json' backend: journal size (bytes) after which the JSON array snapshot is rebuilt.
+SNAPSHOT_JOURNAL_BYTES = int(os.environ.get('PLANS_SNAPSHOT_BYTES', 1024 * 1024))
+# Archive: most plans written to one gzip segment.
+ARCHIVE_SEGMENT_PLANS = int(os.environ.get('PLANS_ARCHIVE_SEGMENT_PLANS', 5000))
+
+# 'inputs' fields that can be used to filter queries (and are indexed by SQLite).
+FILTER_FIELDS = ('goal', 'level', 'equipment', 'cuisine', 'budget')
+# Older history entries used different key names for the same inputs.
+LEGACY_INPUT_KEYS = {field: legacy_key for legacy_key, field in FIELD_ALIASES.items()}
+
+
+# --- LOCKING ---
+
+class FileLock:
+    """
+    Serializes writers across threads (threading.Lock) and across processes
+    (fcntl.flock on a sidecar '.lock' file). Re-entrant within a thread is NOT
+    supported, so callers should hold it only around a single storage operation.
+    """
+
+    def __init__(self, path):
+        self.path = path + '.lock'
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except Exception:
+                self._release_fd()
+                self._thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._release_fd()
+        self._thread_lock.release()
+        return False
+
+    def _release_fd(self):
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+
+# --- STORAGE BACKENDS ---
+
+class PlanStorage:
+    """
+    Interface shared by all plan storage backends.
+
+    Plans are the dicts built in app.py ({"id", "timestamp", "inputs", "plan"}).
+    Backends only need to implement append_many, iter_plans, rewrite, remove and size_bytes.
+
+    Plans appended with "id": None get their id from the storage, inside the same
+    locked write: ids are millisecond timestamps bumped past the newest stored id,
+    so they stay unique and increasing across every process sharing the storage.
+    """
+
+    name = 'base'
+    # Incremented on every write made through this object (this process only).
+    write_generation = 0
+
+    def append(self, plan):
+        """Persists a single plan."""
+        self.append_many([plan])
+
+    def append_many(self, plans):
+        """Persists a list of plans in one storage write, assigning missing ids in place."""
+        raise NotImplementedError
+
+    def iter_plans(self, newest_first=False):
+        """Yields every stored plan in insertion order (or reversed with newest_first)."""
+        raise NotImplementedError
+
+    def iter_encoded(self, newest_first=False):
+        """
+        Yields every stored plan as UTF-8 encoded compact JSON, one document at a time.
+        Backends that already hold encoded plans override this to skip the decode/encode.
+        """
+        for plan in self.iter_plans(newest_first=newest_first):
+            yield _encode_compact(plan)
+
+    def load_all(self):
+        """Returns every stored plan as a list."""
+        return list(self.iter_plans())
+
+    def read_since(self, cursor=None):
+        """
+        Reads the plans stored since cursor was returned (every plan when cursor is None).
+        Returns (list of (plan, compact JSON bytes) pairs in insertion order, new cursor),
+        or None when the history changed other than by appends since then (plans
+        removed or rewritten): the caller has to read it again with cursor=None.
+        This default implementation can only read everything.
+        """
+        if cursor is not None:
+            return None
+        return [(plan, _encode_compact(plan)) for plan in self.iter_plans()], ()
+
+    def rewrite(self, plans):
+        """Replaces the whole history with the given list of plans."""
+        raise NotImplementedError
+
+    def remove(self, ids):
+        """
+        Deletes the plans whose id is in ids, in one locked write (plans appended
+        meanwhile are kept). Returns (plans removed, plans left, bytes reclaimed).
+        """
+        raise NotImplementedError
+
+    def size_bytes(self):
+        """Bytes the stored history takes up on disk."""
+        raise NotImplementedError
+
+    def get(self, plan_id):
+        """
+        Returns the plan with the given id, or None.
+        This default implementation scans the history newest first; indexed backends override it.
+        """
+        return next((plan for plan in self.iter_plans(newest_first=True) if plan.get('id') == plan_id), None)
+
+    def query(self, limit=None, before_id=None, filters=None):
+        """
+        Returns plans newest first (by id), optionally only those with
+        id < before_id and whose inputs match every field in filters.
+        This default implementation scans the whole history; indexed backends override it.
+        """
+        return query_plans(self.iter_plans(), limit, before_id, filters)
+
+    def signature(self):
+        """
+        Cheap fingerprint of the stored data (file inode/size/mtime plus this
+        process's write generation). It changes whenever any process writes.
+        """
+        return (self.write_generation,)
+
+    def flush(self):
+        """Forces buffered writes to durable storage."""
+
+    def close(self):
+        self.flush()
+
+
+class StorageCorruptError(RuntimeError):
+    """Raised when the stored history is unreadable and cannot be rebuilt from its backups."""
+
+
+class JsonArrayStorage(PlanStorage):
+    """
+    Legacy backend: the history is one indented JSON array (the snapshot) plus a
+    write-ahead journal (path + '.journal', one plan per line) of the plans
+    appended since the snapshot was written.
+
+    Appends only add lines to the journal and fsync it, so durability no longer
+    depends on rewriting the whole array. Once the journal grows past
+    snapshot_bytes the snapshot is rebuilt: it is written to a temp file,
+    fsync'ed and renamed into place, and the previous snapshot and journal are
+    kept as '.bak' files. remove() replaces the backups as well, so removed
+    (archived) plans cannot come back through a recovery.
+
+    On startup an unreadable snapshot is moved aside and rebuilt from the backup
+    snapshot plus both journals. If there is no readable backup,
+    StorageCorruptError is raised instead of starting over with an empty history.
+    """
+
+    name = 'json'
+
+    def __init__(self, path, snapshot_bytes=SNAPSHOT_JOURNAL_BYTES):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.backup_path = path + '.bak'
+        self.journal_backup_path = self.journal_path + '.bak'
+        self.snapshot_bytes = snapshot_bytes
+        self._lock = FileLock(path)
+        self._snapshot_cache = (None, []) # (stat signature, plans) of the last parsed snapshot
+        self.recover()
+
+    # --- RECOVERY ---
+
+    def recover(self):
+        """Checks the snapshot and rebuilds it from the backups if it is missing or unreadable."""
+        with self._lock:
+            try:
+                if _read_array(self.path) is not None or not os.path.exists(self.backup_path):
+                    return
+                error = None # Crashed between moving the old snapshot aside and renaming the new one in
+            except ValueError as e:
+                error = e
+            self._restore(error)
+
+    def _restore(self, error):
+        """Rebuilds the snapshot from the backup snapshot plus both journals. Caller holds the lock."""
+        try:
+            backup = _read_array(self.backup_path)
+        except ValueError:
+            backup = None
+        if backup is None and error is not None and _has_data(self.path):
+            raise StorageCorruptError(
+                f"{self.path} is unreadable ({error}) and there is no readable backup in "
+                f"{self.backup_path}. Repair the file or move it aside to start with an empty history.")
+        plans = _merge_plans(backup or [], _read_journal(self.journal_backup_path), _read_journal(self.journal_path))
+        if error is not None and os.path.exists(self.path):
+            corrupt_path = f"{self.path}.corrupt-{int(time.time())}"
+            os.replace(self.path, corrupt_path)
+            print(f"{self.path} was unreadable ({error}); moved it to {corrupt_path}")
+        _atomic_write(self.path, _encode_array(plans))
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path) # Its plans are in the new snapshot
+        print(f"Recovered {len(plans)} plans into {self.path} from its backup and journals")
+
+    # --- WRITES ---
+
+    def append_many(self, plans):
+        if not plans:
+            return
+        with self._lock:
+            snapshot = self._snapshot()
+            newest_id = max((snapshot[-1].get('id') or 0) if snapshot else 0, _journal_newest_id(self.journal_path))
+            assign_ids(plans, newest_id)
+            _truncate_torn_tail(self.journal_path)
+            with open(self.journal_path, 'ab') as f:
+                f.write(''.join(_encode_line(plan) for plan in plans).encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+                journal_size = f.tell()
+            if journal_size >= self.snapshot_bytes:
+                self._write_snapshot(self._read_all())
+            self.write_generation += 1
+
+    def rewrite(self, plans):
+        with self._lock:
+            self._write_snapshot(list(plans))
+            self.write_generation += 1
+
+    def remove(self, ids):
+        with self._lock:
+            size = self.size_bytes()
+            plans = self._read_all()
+            kept = [plan for plan in plans if plan.get('id') not in ids]
+            if len(kept) < len(plans):
+                self._write_snapshot(kept)
+                # The backups still hold the removed plans, which _restore would bring back
+                _atomic_write(self.backup_path, _encode_array(kept))
+                if os.path.exists(self.journal_backup_path):
+                    os.remove(self.journal_backup_path)
+                self.write_generation += 1
+            return len(plans) - len(kept), len(kept), size - self.size_bytes()
+
+    def _write_snapshot(self, plans):
+        """Durably replaces the snapshot and starts a new journal. Caller holds the lock."""
+        tmp_path = self.path + '.tmp'
+        _write_durably(tmp_path, _encode_array(plans))
+        if os.path.exists(self.path):
+            os.replace(self.path, self.backup_path)
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.journal_backup_path)
+        _fsync_dir(self.path)
+        self._snapshot_cache = (_stat_signature(self.path), plans)
+
+    # --- READS ---
+
+    def _snapshot(self):
+        """The parsed snapshot, re-read only when the file changed. Caller holds the lock."""
+        signature = _stat_signature(self.path)
+        if signature != self._snapshot_cache[0]:
+            try:
+                plans = _read_array(self.path)
+            except ValueError as e:
+                raise StorageCorruptError(f"{self.path} became unreadable ({e}); restart to recover it")
+            self._snapshot_cache = (signature, plans or [])
+        return self._snapshot_cache[1]
+
+    def _read_all(self):
+        # Plans in both files come from a crash between writing a snapshot and moving its journal
+        return _merge_plans(self._snapshot(), _read_journal(self.journal_path))
+
+    def iter_plans(self, newest_first=False):
+        plans = self.load_all()
+        return reversed(plans) if newest_first else iter(plans)
+
+    def load_all(self):
+        with self._lock:
+            return self._read_all()
+
+    def read_since(self, cursor=None):
+        """
+        The cursor is (snapshot signature, journal inode, journal offset): while the
+        snapshot stays the same, only the journal lines appended past the offset are read.
+        """
+        with self._lock:
+            snapshot = self._snapshot()
+            snapshot_signature = self._snapshot_cache[0]
+            try:
+                st = os.stat(self.journal_path)
+            except FileNotFoundError:
+                st = None
+            inode = st.st_ino if st is not None else None
+            offset = 0
+            if cursor is not None:
+                cursor_signature, cursor_inode, offset = cursor
+                if cursor_signature != snapshot_signature:
+                    return None
+                if offset and (cursor_inode != inode or st.st_size < offset):
+                    return None # The journal was replaced: its plans may be in another snapshot
+            entries = []
+            end = offset
+            if st is not None:
+                with open(self.journal_path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+                end = offset + data.rfind(b'\n') + 1 # Ignore a torn final line
+                for line in data[:end - offset].split(b'\n'):
+                    line = line.rstrip(b'\r')
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append((json.loads(line), line))
+                    except ValueError:
+                        print(f"Skipping unreadable line in {self.journal_path}")
+            if cursor is None:
+                # Plans in both files come from a crash between writing a snapshot and moving its journal
+                seen = {plan.get('id') for plan in snapshot}
+                entries = [(plan, _encode_compact(plan)) for plan in snapshot] + [
+                    (plan, line) for plan, line in entries if plan.get('id') is None or plan.get('id') not in seen]
+            return entries, (snapshot_signature, inode, end)
+
+    def signature(self):
+        return (self.write_generation, _stat_signature(self.path), _stat_signature(self.journal_path))
+
+    def size_bytes(self):
+        return _file_size(self.path) + _file_size(self.journal_path)
+
+
+class JsonLinesStorage(PlanStorage):
+    """
+    Append-only backend: one compact JSON document per line.
+
+    Each append writes only the new plan(s) under an exclusive lock, so the
+    write cost is O(1) per plan no matter how long the history is. Data is
+    handed to the OS on every append; fsync is batched by FSYNC_BATCH_SIZE and
+    FSYNC_INTERVAL_SECONDS (and forced on flush/close). A timer armed by the first
+    un-fsync'ed append flushes it once the interval is up, even if no other write
+    follows.
+
+    If the log does not exist yet but a legacy JSON array file does, the array
+    is migrated into the log once. The legacy file is left untouched as a backup.
+    """
+
+    name = 'jsonl'
+
+    def __init__(self, path, legacy_path=None,
+                 fsync_batch_size=FSYNC_BATCH_SIZE,
+                 fsync_interval=FSYNC_INTERVAL_SECONDS):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.fsync_batch_size = max(1, fsync_batch_size)
+        self.fsync_interval = fsync_interval
+        self._lock = FileLock(path)
+        self._pending_fsync = 0
+        self._last_fsync = time.monotonic()
+        self._fsync_timer = None # Deadline flush of the appends not fsync'ed yet
+        self._id_mark = None # (inode, size, newest id) of the log as last seen under the lock
+        self._migrate_legacy()
+        with self._lock:
+            self._prepare_append() # Startup recovery: drop a write torn by a crash
+
+    # --- MIGRATION ---
+
+    def _legacy_source(self):
+        """The storage whose plans seed a new log, or None."""
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            return JsonArrayStorage(self.legacy_path)
+        return None
+
+    def _migrate_legacy(self):
+        """One-time conversion of the legacy history into the append-only log."""
+        if os.path.exists(self.path):
+            return
+        source = self._legacy_source()
+        if source is None:
+            return
+        with self._lock:
+            # Another worker may have finished the migration while we waited.
+            if os.path.exists(self.path):
+                return
+            plans = source.load_all()
+            tmp_path = self.path + '.migrating'
+            self._write_file(tmp_path, plans)
+            os.replace(tmp_path, self.path)
+            _fsync_dir(self.path)
+            print(f"Migrated {len(plans)} plans from {source.path} to {self.path}")
+
+    # --- ENCODING (overridden by CompactLogStorage) ---
+
+    def _encode_payload(self, plans):
+        """The bytes appended to the log for plans."""
+        return ''.join(_encode_line(plan) for plan in plans).encode('utf-8')
+
+    def _decode_line(self, line):
+        """Returns the plan stored on one line."""
+        return json.loads(line)
+
+    def _decode_entry(self, line):
+        """Returns (plan, compact JSON bytes of the plan) for one stored line."""
+        return json.loads(line), line
+
+    def _pack(self, data):
+        """The bytes written to the log for data (complete stored lines)."""
+        return data
+
+    def _read_text(self, offset):
+        """Returns (complete lines stored at or after offset, offset just past them)."""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1 # Ignore an unfinished final line
+        return data[:end], offset + end
+
+    # --- WRITES ---
+
+    def append_many(self, plans):
+        if not plans:
+            return
+        with self._lock:
+            assign_ids(plans, self._prepare_append())
+            with open(self.path, 'ab') as f:
+                f.write(self._encode_payload(plans))
+                f.flush()
+                self._pending_fsync += len(plans)
+                if self._fsync_due():
+                    self._fsync(f.fileno())
+                else:
+                    self._arm_fsync_timer()
+                self._id_mark = (os.fstat(f.fileno()).st_ino, f.tell(), plans[-1].get('id', 0))
+            self.write_generation += 1
+
+    def _prepare_append(self):
+        """
+        Returns the id of the last plan in the log; caller holds the lock. A partial
+        record left at the end by a writer that crashed mid-append is cut off first,
+        since the next append would otherwise be glued onto it. Only the data other
+        processes appended since this process last looked is read.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        mark = self._id_mark
+        if mark is not None and mark[0] == st.st_ino and mark[1] <= st.st_size:
+            if mark[1] == st.st_size:
+                return mark[2]
+            text, end = self._read_text(mark[1])
+            newest_id = _last_id(reversed(text.split(b'\n')), default=mark[2])
+        else:
+            newest_id, end = self._scan_tail()
+        if end < st.st_size:
+            with open(self.path, 'rb') as f:
+                f.seek(end)
+                torn = f.read()
+            with open(self.path + '.torn', 'ab') as f:
+                f.write(torn)
+            os.truncate(self.path, end)
+            print(f"Cut {len(torn)} bytes of an unfinished write off {self.path} (saved in {self.path}.torn)")
+        self._id_mark = (st.st_ino, end, newest_id)
+        return newest_id
+
+    def _scan_tail(self):
+        """(id of the last complete record, length of the log up to its end) without reading the whole log."""
+        with open(self.path, 'rb') as f:
+            end = _complete_length(f)
+        return _last_id(self._iter_lines(newest_first=True)), end
+
+    def _fsync_due(self):
+        return (self._pending_fsync >= self.fsync_batch_size or
+                time.monotonic() - self._last_fsync >= self.fsync_interval)
+
+    def _fsync(self, fd):
+        os.fsync(fd)
+        self._pending_fsync = 0
+        self._last_fsync = time.monotonic()
+        if self._fsync_timer is not None:
+            self._fsync_timer.cancel()
+            self._fsync_timer = None
+
+    def _arm_fsync_timer(self):
+        """Schedules a flush fsync_interval seconds from now unless one is pending. Caller holds the lock."""
+        if self._fsync_timer is not None and self._fsync_timer.is_alive():
+            return
+        self._fsync_timer = threading.Timer(self.fsync_interval, self.flush)
+        self._fsync_timer.daemon = True
+        self._fsync_timer.start()
+
+    def flush(self):
+        if not self._pending_fsync or not os.path.exists(self.path):
+            return
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                self._fsync(f.fileno())
+
+    def close(self):
+        if self._fsync_timer is not None:
+            self._fsync_timer.cancel()
+        super().close()
+
+    def rewrite(self, plans):
+        with self._lock:
+            tmp_path = self.path + '.rewrite'
+            self._write_file(tmp_path, plans)
+            os.replace(tmp_path, self.path)
+            _fsync_dir(self.path)
+            self._pending_fsync = 0
+            self._id_mark = None
+            self.write_generation += 1
+
+    def remove(self, ids):
+        with self._lock:
+            self._prepare_append() # Sets a write torn by a crash aside instead of dropping it
+            size = self.size_bytes()
+            kept = []
+            removed = 0
+            for line in self._iter_lines():
+                # Stored lines are copied as they are: nothing is re-encoded
+                if _line_id(line) in ids:
+                    removed += 1
+                else:
+                    kept.append(line)
+            if removed:
+                tmp_path = self.path + '.rewrite'
+                _write_durably(tmp_path, self._pack(b''.join(line + b'\n' for line in kept)))
+                os.replace(tmp_path, self.path)
+                _fsync_dir(self.path)
+                self._pending_fsync = 0
+                self._id_mark = None
+                self.write_generation += 1
+            return removed, len(kept), size - self.size_bytes()
+
+    def _write_file(self, path, plans):
+        _write_durably(path, self._encode_payload(plans))
+
+    # --- READS ---
+
+    def signature(self):
+        return (self.write_generation, _stat_signature(self.path))
+
+    def size_bytes(self):
+        return _file_size(self.path)
+
+    def read_from(self, offset):
+        """
+        Reads the complete lines appended at or after byte offset.
+        Returns (list of (plan, encoded line) pairs, offset just past the last complete line),
+        which lets callers follow the log incrementally instead of re-reading it.
+        """
+        if not os.path.exists(self.path):
+            return [], 0
+        data, end = self._read_text(offset)
+        entries = []
+        for line in data.split(b'\n'):
+            line = line.rstrip(b'\r')
+            if not line.strip():
+                continue
+            try:
+                entries.append(self._decode_entry(line))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping unreadable line in {self.path}: {e}")
+        return entries, end
+
+    def read_since(self, cursor=None):
+        """
+        The cursor is (inode, offset) of the log: as long as the log has only grown,
+        only the lines appended past the offset (by any process) are read.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        inode = st.st_ino if st is not None else None
+        offset = 0
+        if cursor is not None:
+            cursor_inode, offset = cursor
+            if offset and (cursor_inode != inode or st.st_size < offset):
+                return None # Rewritten, truncated or removed
+        entries, end = self.read_from(offset)
+        return entries, (inode, end)
+
+    def iter_plans(self, newest_first=False):
+        for line in self._iter_lines(newest_first):
+            try:
+                yield self._decode_line(line)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping unreadable line in {self.path}: {e}")
+
+    def iter_encoded(self, newest_first=False):
+        # Stored lines are already compact JSON: stream them without parsing.
+        return self._iter_lines(newest_first)
+
+    def _iter_lines(self, newest_first=False):
+        """
+        Yields the complete, non-empty lines of the log (without the newline) as bytes.
+        A final line without a newline is a write still in progress (or torn by a
+        crash) and is skipped.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            if newest_first:
+                yield from _read_lines_reversed(f)
+                return
+            for line in f:
+                if line.endswith(b'\n') and line.strip():
+                    yield line.rstrip(b'\r\n')
+
+
+class CompactLogStorage(JsonLinesStorage):
+    """
+    Append-only log of compact plan records.
+
+    The codec turns each plan into a small record (inputs plus template ids and
+    variation numbers) when the plan can be rebuilt exactly from the templates,
+    and keeps other plans (e.g. LLM output) in full; plans are re-expanded when
+    read. With compress=True each append is written as one gzip member, so the
+    file stays a valid .gz stream and can still be followed incrementally
+    (an unfinished final member is ignored like an unfinished line).
+
+    codec needs compact(plan) -> record and expand(record) -> plan. import_from is
+    called (with no arguments) only when the log does not exist yet; it returns the
+    storage whose history seeds the new log, or None.
+    """
+
+    name = 'compact'
+
+    def __init__(self, path, codec, import_from=None, compress=False, **kwargs):
+        self.codec = codec
+        self.compress = compress
+        self.import_from = import_from
+        super().__init__(path, **kwargs)
+
+    def _legacy_source(self):
+        return self.import_from() if self.import_from is not None else None
+
+    def _encode_payload(self, plans):
+        return self._pack(''.join(_encode_line(self.codec.compact(plan)) for plan in plans).encode('utf-8'))
+
+    def _pack(self, data):
+        return gzip.compress(data) if self.compress else data
+
+    def _decode_line(self, line):
+        return self.codec.expand(json.loads(line))
+
+    def _decode_entry(self, line):
+        plan = self._decode_line(line)
+        return plan, _encode_compact(plan)
+
+    def _read_text(self, offset):
+        if not self.compress:
+            return super()._read_text(offset)
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        text, consumed = _decompress_members(data, self.path)
+        return text, offset + consumed
+
+    def _scan_tail(self):
+        if not self.compress:
+            return super()._scan_tail()
+        # gzip members cannot be found from the end: decompress the log once
+        text, end = self._read_text(0)
+        return _last_id(reversed(text.split(b'\n'))), end
+
+    def iter_encoded(self, newest_first=False):
+        # Stored lines are compact records: expand them before encoding.
+        return PlanStorage.iter_encoded(self, newest_first)
+
+    def _iter_lines(self, newest_first=False):
+        if not self.compress:
+            yield from super()._iter_lines(newest_first)
+            return
+        if not os.path.exists(self.path):
+            return
+        # gzip cannot be read backwards; the decompressed log is split in memory instead.
+        lines = [line.rstrip(b'\r') for line in self._read_text(0)[0].split(b'\n') if line.strip()]
+        yield from (reversed(lines) if newest_first else lines)
+
+
+class SqliteStorage(PlanStorage):
+    """
+    Indexed backend using the standard-library sqlite3 module.
+
+    The full plan entry is stored as a JSON text column; id, timestamp and the
+    main 'inputs' fields are copied into indexed columns so paginated and
+    filtered history queries are a single index range scan.
+
+    The database's user_version counts the changes other than appends (removed
+    or replaced rows), so readers can follow new rows by id until it moves.
+
+    import_from is called (with no arguments) only when the database file does not
+    exist yet; it returns the storage whose history is imported, or None.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS plans (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            goal TEXT,
+            level TEXT,
+            equipment TEXT,
+            cuisine TEXT,
+            budget INTEGER,
+            body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_plans_timestamp ON plans (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_plans_goal ON plans (goal, id);
+        CREATE INDEX IF NOT EXISTS idx_plans_level ON plans (level, id);
+        CREATE INDEX IF NOT EXISTS idx_plans_equipment ON plans (equipment, id);
+        CREATE INDEX IF NOT EXISTS idx_plans_cuisine ON plans (cuisine, id);
+        CREATE INDEX IF NOT EXISTS idx_plans_budget ON plans (budget, id);
+    """
+    INSERT = ('INSERT OR REPLACE INTO plans (id, timestamp, goal, level, equipment, cuisine, budget, body) '
+              'VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+    def __init__(self, path, import_from=None):
+        self.path = path
+        self._local = threading.local()
+        is_new = not os.path.exists(path)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+        if is_new and import_from is not None:
+            source = import_from()
+            if source is not None:
+                self._import(source)
+
+    def _connect(self):
+        # sqlite3 connections must not be shared between threads.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _import(self, source):
+        """One-time import of an existing file-based history into a new database."""
+        plans = source.load_all()
+        self.append_many(plans)
+        print(f"Imported {len(plans)} plans into {self.path}")
+
+    @staticmethod
+    def _row(plan):
+        inputs = plan.get('inputs') or {}
+        budget = get_input(inputs, 'budget')
+        return (
+            plan['id'],
+            plan.get('timestamp', ''),
+            get_input(inputs, 'goal'),
+            get_input(inputs, 'level'),
+            get_input(inputs, 'equipment'),
+            get_input(inputs, 'cuisine'),
+            budget if isinstance(budget, (int, float)) else None,
+            json.dumps(plan, ensure_ascii=False, separators=(',', ':')),
+        )
+
+    def append_many(self, plans):
+        if not plans:
+            return
+        conn = self._connect()
+        with conn:
+            # Take the write lock before reading the newest id, so concurrent writers cannot reuse it
+            conn.execute('BEGIN IMMEDIATE')
+            newest_id = conn.execute('SELECT MAX(id) FROM plans').fetchone()[0] or 0
+            if any(plan.get('id') is not None and plan['id'] <= newest_id for plan in plans):
+                self._changed(conn) # Not after the newest row: readers following new ids would miss it
+            assign_ids(plans, newest_id)
+            conn.executemany(self.INSERT, [self._row(plan) for plan in plans])
+        self.write_generation += 1
+
+    @staticmethod
+    def _changed(conn):
+        """Records a change other than an append. Caller is inside the write transaction."""
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.execute(f'PRAGMA user_version = {version + 1}')
+
+    def iter_plans(self, newest_first=False):
+        for body in self._iter_bodies(newest_first):
+            yield json.loads(body)
+
+    def iter_encoded(self, newest_first=False):
+        for body in self._iter_bodies(newest_first):
+            yield body.encode('utf-8')
+
+    def read_since(self, cursor=None):
+        """The cursor is (user_version, newest id read): only rows with a greater id are read."""
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN') # One read snapshot for the version and the rows
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            newest_id = None
+            if cursor is not None:
+                if cursor[0] != version:
+                    return None
+                newest_id = cursor[1]
+            if newest_id is None:
+                rows = conn.execute('SELECT id, body FROM plans ORDER BY id').fetchall()
+            else:
+                rows = conn.execute('SELECT id, body FROM plans WHERE id > ? ORDER BY id', (newest_id,)).fetchall()
+        entries = [(json.loads(body), body.encode('utf-8')) for _, body in rows]
+        return entries, (version, rows[-1][0] if rows else newest_id)
+
+    def _iter_bodies(self, newest_first):
+        order = 'DESC' if newest_first else 'ASC'
+        cursor = self._connect().execute(f'SELECT body FROM plans ORDER BY id {order}')
+        for (body,) in cursor:
+            yield body
+
+    def rewrite(self, plans):
+        conn = self._connect()
+        with conn: # One transaction: a crash leaves either the old or the new history
+            conn.execute('DELETE FROM plans')
+            conn.executemany(self.INSERT, [self._row(plan) for plan in plans])
+            self._changed(conn)
+        self.write_generation += 1
+
+    def remove(self, ids):
+        conn = self._connect()
+        size = self.size_bytes()
+        with conn:
+            removed = conn.executemany('DELETE FROM plans WHERE id = ?', [(plan_id,) for plan_id in ids]).rowcount
+            if removed:
+                self._changed(conn)
+            remaining = conn.execute('SELECT COUNT(*) FROM plans').fetchone()[0]
+        if removed:
+            self.write_generation += 1
+        return removed, remaining, size - self.size_bytes()
+
+    def size_bytes(self):
+        # Freed pages are kept in the file for reuse: count only the pages in use
+        conn = self._connect()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def signature(self):
+        # Commits from other processes land in the write-ahead log first.
+        return (self.write_generation, _stat_signature(self.path), _stat_signature(self.path + '-wal'))
+
+    def get(self, plan_id):
+        row = self._connect().execute('SELECT body FROM plans WHERE id = ?', (plan_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def query(self, limit=None, before_id=None, filters=None):
+        clauses, params = [], []
+        if before_id is not None:
+            clauses.append('id < ?')
+            params.append(before_id)
+        for field, value in (filters or {}).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on '{field}'")
+            clauses.append(f'{field} = ?')
+            params.append(value)
+        sql = 'SELECT body FROM plans'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [json.loads(body) for (body,) in self._connect().execute(sql, params)]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# --- ARCHIVE ---
+
+class PlanArchive:
+    """
+    Cold tier for the plans retention moves out of the live storage (see retention.py).
+
+    Plans are written in segments: gzip files of compact JSON lines, at most
+    segment_plans each, never changed once written. manifest.json lists every
+    segment with the id and timestamp range and the number of its plans, so a
+    lookup by id or a date-range query only decompresses the segments that can
+    hold matches; nothing is read until a query asks for archived plans.
+
+    Segments are fsync'ed before the manifest is replaced (atomically) to list
+    them, so a crash leaves at most an unlisted segment, which is ignored. A crash
+    after archiving but before the plans are removed from the live storage
+    archives them again on the next run; reads skip the duplicates.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory, segment_plans=ARCHIVE_SEGMENT_PLANS):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, self.MANIFEST)
+        self.segment_plans = max(1, segment_plans)
+        self._lock = FileLock(self.manifest_path)
+        self._manifest_cache = (None, []) # (stat signature, segments) of the last parsed manifest
+
+    # --- WRITES ---
+
+    def append(self, plans):
+        """Archives plans (in id order) as new segments. Returns the manifest entries added."""
+        if not plans:
+            return []
+        plans = sorted(plans, key=lambda plan: plan.get('id') or 0)
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            segments = list(self.segments())
+            added = []
+            for start in range(0, len(plans), self.segment_plans):
+                chunk = plans[start:start + self.segment_plans]
+                name = f"segment-{len(segments) + len(added) + 1:06d}.jsonl.gz"
+                data = gzip.compress(''.join(_encode_line(plan) for plan in chunk).encode('utf-8'))
+                _write_durably(os.path.join(self.directory, name), data)
+                timestamps = [plan.get('timestamp') or '' for plan in chunk]
+                added.append({
+                    "file": name,
+                    "plans": len(chunk),
+                    "bytes": len(data),
+                    "min_id": chunk[0].get('id') or 0,
+                    "max_id": chunk[-1].get('id') or 0,
+                    "from": min(timestamps),
+                    "to": max(timestamps),
+                })
+            _fsync_dir(self.manifest_path)
+            manifest = json.dumps({"segments": segments + added}, ensure_ascii=False, separators=(',', ':'))
+            _atomic_write(self.manifest_path, manifest.encode('utf-8'))
+        return added
+
+    # --- READS ---
+
+    def segments(self):
+        """The manifest's segment entries, oldest first, re-read only when the manifest changed."""
+        signature = _stat_signature(self.manifest_path)
+        cached_signature, segments = self._manifest_cache
+        if signature != cached_signature:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    segments = json.load(f)['segments']
+            except FileNotFoundError:
+                segments = []
+            except (ValueError, KeyError, TypeError) as e:
+                raise StorageCorruptError(f"{self.manifest_path} is unreadable ({e})")
+            self._manifest_cache = (signature, segments)
+        return segments
+
+    def get(self, plan_id):
+        """The archived plan with the given id, or None."""
+        for segment in reversed(self.segments()):
+            if segment['min_id'] <= plan_id <= segment['max_id']:
+                plan = next((plan for plan in self._read_segment(segment) if plan.get('id') == plan_id), None)
+                if plan is not None:
+                    return plan
+        return None
+
+    def query(self, time_from=None, time_to=None, limit=None, before_id=None):
+        """
+        Archived plans with time_from <= timestamp <= time_to (both optional, compared
+        as 'YYYY-MM-DD HH:MM:SS' strings) and id < before_id, newest first (by id), up to limit.
+        """
+        candidates = [
+            segment for segment in self.segments()
+            if (time_from is None or segment['to'] >= time_from)
+            and (time_to is None or segment['from'] <= time_to)
+            and (before_id is None or segment['min_id'] < before_id)
+        ]
+        candidates.sort(key=lambda segment: segment['max_id'], reverse=True)
+        matches = {}
+        for segment in candidates:
+            if limit is not None and len(matches) >= limit:
+                # Segments can overlap: stop once no later segment can hold a newer match
+                newest = sorted(matches, reverse=True)[:limit]
+                if segment['max_id'] < newest[-1]:
+                    break
+            for plan in self._read_segment(segment):
+                timestamp = plan.get('timestamp') or ''
+                if ((time_from is None or timestamp >= time_from) and (time_to is None or timestamp <= time_to)
+                        and (before_id is None or (plan.get('id') or 0) < before_id)):
+                    matches.setdefault(plan.get('id'), plan)
+        return query_plans(matches.values(), limit)
+
+    def _read_segment(self, segment):
+        path = os.path.join(self.directory, segment['file'])
+        try:
+            with open(path, 'rb') as f:
+                data = gzip.decompress(f.read())
+        except FileNotFoundError:
+            raise StorageCorruptError(f"Archive segment {path} listed in {self.manifest_path} is missing")
+        return [json.loads(line) for line in data.split(b'\n') if line.strip()]
+
+    def stats(self):
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "plans": sum(segment['plans'] for segment in segments),
+            "bytes": sum(segment['bytes'] for segment in segments),
+        }
+
+
+# --- HELPERS ---
+
+def _stat_signature(path):
+    """(inode, size, mtime) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def query_plans(plans, limit=None, before_id=None, filters=None):
+    """Filters an iterable of plans and returns them newest first (by id), up to limit."""
+    filters = filters or {}
+    matches = [
+        plan for plan in plans
+        if (before_id is None or plan.get('id', 0) < before_id)
+        and matches_filters(plan, filters)
+    ]
+    matches.sort(key=lambda plan: plan.get('id', 0), reverse=True)
+    return matches[:limit] if limit is not None else matches
+
+
+def get_input(inputs, field):
+    """
+    Reads an 'inputs' field in its canonical spelling ('weight_loss' reads as 'Weight Loss'),
+    falling back to the key name used by older entries.
+    """
+    if field in inputs:
+        return canonical_value(field, inputs[field])
+    legacy_key = LEGACY_INPUT_KEYS.get(field)
+    return canonical_value(field, inputs.get(legacy_key)) if legacy_key else None
+
+
+def matches_filters(plan, filters):
+    """True if the plan's inputs equal every value in filters."""
+    inputs = plan.get('inputs') or {}
+    return all(get_input(inputs, field) == value for field, value in filters.items())
+
+
+def _write_durably(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path):
+    """Makes a rename into path's directory durable (POSIX only)."""
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path, data):
+    """Write to a temp file, fsync, rename over path: readers see the old or the new file, never a mix."""
+    tmp_path = path + '.tmp'
+    _write_durably(tmp_path, data)
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def _read_array(path):
+    """Parses a JSON array file. Returns None if it does not exist; raises ValueError if unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            plans = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not isinstance(plans, list):
+        raise ValueError("expected a JSON array")
+    return plans
+
+
+def _encode_array(plans):
+    return json.dumps(plans, indent=4).encode('utf-8')
+
+
+def _has_data(path):
+    """True if path exists and holds more than whitespace."""
+    try:
+        with open(path, 'rb') as f:
+            return bool(f.read().strip())
+    except FileNotFoundError:
+        return False
+
+
+def _read_journal(path):
+    """The plans in a journal file, skipping a torn final line and unreadable lines."""
+    if not os.path.exists(path):
+        return []
+    plans = []
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n') or not line.strip():
+                continue
+            try:
+                plans.append(json.loads(line))
+            except ValueError:
+                print(f"Skipping unreadable line in {path}")
+    return plans
+
+
+def _journal_newest_id(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        return _last_id(_read_lines_reversed(f))
+
+
+def _merge_plans(*sources):
+    """Concatenates lists of plans, keeping only the first plan with each id."""
+    seen = set()
+    merged = []
+    for plans in sources:
+        for plan in plans:
+            plan_id = plan.get('id')
+            if plan_id is not None:
+                if plan_id in seen:
+                    continue
+                seen.add(plan_id)
+            merged.append(plan)
+    return merged
+
+
+def _complete_length(f, block_size=64 * 1024):
+    """Length of a binary file up to and including its last newline."""
+    position = f.seek(0, os.SEEK_END)
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        last_newline = f.read(size).rfind(b'\n')
+        if last_newline != -1:
+            return position + last_newline + 1
+    return 0
+
+
+def _truncate_torn_tail(path):
+    """Cuts a final line without a newline (a write torn by a crash) off a line file."""
+    try:
+        with open(path, 'rb') as f:
+            end = _complete_length(f)
+            size = f.seek(0, os.SEEK_END)
+    except FileNotFoundError:
+        return
+    if end < size:
+        os.truncate(path, end)
+        print(f"Cut {size - end} bytes of an unfinished write off {path}")
+
+
+def assign_ids(plans, newest_id):
+    """
+    Gives every plan whose id is None a millisecond timestamp id greater than
+    newest_id (and than the ids assigned before it). Callers hold the storage lock.
+    """
+    for plan in plans:
+        if plan.get('id') is None:
+            plan['id'] = max(int(time.time() * 1000), newest_id + 1)
+        newest_id = max(newest_id, plan['id'])
+
+
+def _line_id(line):
+    """Id of the plan (or compact record) stored on one line, or None if it is unreadable."""
+    try:
+        return json.loads(line).get('id')
+    except ValueError:
+        return None
+
+
+def _last_id(lines_newest_first, default=0):
+    """Id of the first readable record in lines (stored JSON lines, newest first)."""
+    for line in lines_newest_first:
+        if not line.strip():
+            continue
+        try:
+            return json.loads(line).get('id', default)
+        except ValueError:
+            continue
+    return default
+
+
+def _read_lines_reversed(f, block_size=64 * 1024):
+    """Yields the complete, non-empty lines of a binary file from last to first."""
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    buffer = b''
+    at_end = True
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        buffer = f.read(size) + buffer
+        if at_end:
+            # Whatever follows the last newline is an unfinished write; drop it.
+            last_newline = buffer.rfind(b'\n')
+            if last_newline == -1:
+                continue
+            buffer = buffer[:last_newline + 1]
+            at_end = False
+        lines = buffer.split(b'\n')
+        # The first piece may continue in the previous block; keep it for the next round.
+        buffer = lines.pop(0)
+        for line in reversed(lines):
+            if line.strip():
+                yield line.rstrip(b'\r')
+    if not at_end and buffer.strip():
+        yield buffer.rstrip(b'\r')
+
+
+def _decompress_members(data, path):
+    """
+    Decompresses the complete gzip members at the start of data.
+    Returns (text, number of bytes consumed); a trailing unfinished member is left alone.
+    """
+    chunks = []
+    view = memoryview(data)
+    consumed = 0
+    while consumed < len(data):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) # gzip framing
+        try:
+            chunk = decompressor.decompress(view[consumed:])
+        except zlib.error as e:
+            print(f"Stopping at a damaged gzip member in {path}: {e}")
+            break
+        if not decompressor.eof:
+            break # Write still in progress (or torn by a crash)
+        chunks.append(chunk)
+        consumed = len(data) - len(decompressor.unused_data)
+    return b''.join(chunks), consumed
+
+
+def _encode_line(plan):
+    return json.dumps(plan, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def _encode_compact(plan):
+    return json.dumps(plan, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# --- FACTORY ---
+
+STORAGE_BACKENDS = {
+    JsonArrayStorage.name: JsonArrayStorage,
+    JsonLinesStorage.name: JsonLinesStorage,
+    CompactLogStorage.name: CompactLogStorage,
+    SqliteStorage.name: SqliteStorage,
+}
+
+
+def create_storage(backend, plans_file, log_file, db_file, compact_file=None, codec=None, compress=False):
+    """
+    Builds the configured storage backend.
+    'json' keeps the legacy single-array file, 'jsonl' uses the append-only log
+    (migrating plans_file into log_file on first start), 'compact' stores template
+    references in compact_file (optionally gzip-compressed; needs codec) and 'sqlite'
+    uses an indexed database. The last two import the existing file history when created;
+    it is only opened then, not on every start.
+    """
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}'. "
+                         f"Choose one of: {', '.join(sorted(STORAGE_BACKENDS))}")
+    if backend == JsonArrayStorage.name:
+        return JsonArrayStorage(plans_file)
+    if backend == JsonLinesStorage.name:
+        return JsonLinesStorage(log_file, legacy_path=plans_file)
+
+    def import_source():
+        # The append-only log if there is one, else the legacy array
+        if os.path.exists(log_file):
+            return JsonLinesStorage(log_file)
+        if os.path.exists(plans_file):
+            return JsonArrayStorage(plans_file)
+        return None
+
+    if backend == CompactLogStorage.name:
+        if codec is None:
+            raise ValueError("The 'compact' storage backend needs a plan codec")
+        return CompactLogStorage(compact_file, codec, import_from=import_source, compress=compress)
+    return SqliteStorage(db_file, import_from=import_source)
@@ -1,12 +1,20 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import threading
 import time
 
 # --- CONFIGURATION ---
 FLASK_URL = "http://127.0.0.1:5000"
-GENERATE_ENDPOINT = "/generate_plan"
+GENERATE_STREAM_ENDPOINT = "/generate_plan/stream"
 FETCH_PLANS_ENDPOINT = "/get_plans"
+PLAN_ENDPOINT = "/plans/"
+GENERATION_TIMEOUT = 125 # Give up if the generation stream stays silent this many seconds
+STREAM_REDRAW_INTERVAL = 0.5 # Seconds between two redraws of a plan that is streaming in
+HTTP_POOL_SIZE = 10 # Keep-alive connections to the backend shared by all sessions
+HISTORY_PAGE_SIZE = 20 # Plan summaries fetched per history page
+HISTORY_PAGE_TTL = 120 # Seconds a fetched history page is reused
 
 # --- PAGE SETUP ---
 st.set_page_config(
@@ -48,17 +56,110 @@ st.markdown('<div class="centered-title">Personalized Workout & Diet Planner</di
 
 # --- HELPER FUNCTIONS ---
 
-@st.cache_data(ttl=120)
-def fetch_plans_history():
-    """Fetches all previously saved plans from the backend (R - Read)."""
-    try:
-        # NOTE: Using a long timeout for the mock server to complete its generation work
-        response = requests.get(FLASK_URL + FETCH_PLANS_ENDPOINT, timeout=125) 
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching historical plans: {e}")
-        return []
+@st.cache_resource
+def http_session():
+    """One pooled keep-alive requests.Session shared by every script run and user session."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+@st.cache_data(ttl=HISTORY_PAGE_TTL, show_spinner=False)
+def fetch_history_page(before_id=None):
+    """
+    Fetches one page of plan summaries (id, timestamp, inputs), newest first (R - Read).
+    Returns (summaries, before_id of the next page or None). Each page is cached on its
+    own cursor, so loading older pages never re-downloads the ones already shown.
+    """
+    params = {"limit": HISTORY_PAGE_SIZE, "view": "summary"}
+    if before_id is not None:
+        params["before_id"] = before_id
+    response = http_session().get(FLASK_URL + FETCH_PLANS_ENDPOINT, params=params, timeout=30)
+    response.raise_for_status()
+    page = response.json()
+    return page['plans'], page['next_before_id']
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def fetch_plan(plan_id):
+    """Fetches the full saved plan with the given id. Saved plans never change, so they are cached without a TTL."""
+    response = http_session().get(FLASK_URL + PLAN_ENDPOINT + str(plan_id), timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+class PlanStream:
+    """
+    A plan generation streamed from the backend's NDJSON endpoint on a background thread,
+    so no script run waits on it. The thread only collects the events: the workout days,
+    the meal days, the week's meal budget, then the saved plan's id and timestamp (or an
+    error). Script runs read what has arrived so far with snapshot().
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self._session = http_session() # Resolved here: the reader thread has no script run context
+        self._lock = threading.Lock()
+        self._workout_days = []
+        self._meal_days = []
+        self._meal_budget = None
+        self._saved = None
+        self._error = None
+        self._thread = threading.Thread(target=self._read, name='plan-stream', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def snapshot(self):
+        """The events received so far: {'workout_days', 'meal_days', 'meal_budget', 'saved', 'error'}."""
+        with self._lock:
+            return {
+                "workout_days": list(self._workout_days),
+                "meal_days": list(self._meal_days),
+                "meal_budget": self._meal_budget,
+                "saved": self._saved,
+                "error": self._error,
+            }
+
+    def _read(self):
+        try:
+            with self._session.post(
+                FLASK_URL + GENERATE_STREAM_ENDPOINT,
+                json=self.payload,
+                stream=True,
+                timeout=(10, GENERATION_TIMEOUT)
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        self._add(json.loads(line))
+            with self._lock:
+                if self._saved is None and self._error is None:
+                    self._error = "The backend closed the stream before the plan was saved."
+        except requests.exceptions.RequestException as e:
+            self._fail(f"Failed to connect to Flask Backend or received a server error: {e}")
+        except ValueError:
+            self._fail("Received an invalid response from the backend (not JSON).")
+        except Exception as e:
+            self._fail(f"An unexpected error occurred during generation: {e}")
+
+    def _add(self, event):
+        with self._lock:
+            name = event.get('event')
+            if name == 'workout_day':
+                self._workout_days.append(event['day'])
+            elif name == 'meal_day':
+                self._meal_days.append(event['day'])
+            elif name == 'meal_budget':
+                self._meal_budget = event['budget']
+            elif name == 'saved':
+                self._saved = {"id": event['id'], "timestamp": event['timestamp']}
+            elif name == 'error':
+                self._error = event.get('error', 'Plan generation failed.')
+
+    def _fail(self, error):
+        with self._lock:
+            self._error = error
 
 def render_workout_plan(plan):
     """
@@ -66,63 +167,91 @@ def render_workout_plan(plan):
     FIXED: Corrected the loop structure and ensured safe access to 'exercises' and exercise properties.
     """
     for day_plan in plan:
-        # Use .get() to safely retrieve the 'focus' or default to 'Rest/Recovery'
-        focus_text = day_plan.get('focus', 'Rest/Recovery') 
+        render_workout_day(day_plan)
+
+def render_workout_day(day_plan):
+    """Renders one workout day as an expander."""
+    # Use .get() to safely retrieve the 'focus' or default to 'Rest/Recovery'
+    focus_text = day_plan.get('focus', 'Rest/Recovery') 
+    
+    # Safely get the list of exercises, defaulting to an empty list
+    exercises = day_plan.get('exercises', []) 
+
+    with st.expander(f"**{day_plan.get('day', 'Unknown Day')}** | Focus: {focus_text}", expanded=False):
         
-        # Safely get the list of exercises, defaulting to an empty list
-        exercises = day_plan.get('exercises', []) 
-
-        with st.expander(f"**{day_plan.get('day', 'Unknown Day')}** | Focus: {focus_text}", expanded=False):
-            
-            if exercises:
-                for exercise in exercises:
-                    # Safely retrieve all exercise properties
-                    name = exercise.get('name', 'N/A')
-                    sets = exercise.get('sets', 'N/A')
-                    reps = exercise.get('reps', 'N/A')
-                    # New field 'notes' is safely accessed
-                    notes = exercise.get('notes', 'No specific notes.') 
-                    
-                    st.markdown(
-                        f"""
-                        <div style="padding: 10px 0 5px 10px; border-bottom: 1px dashed #444;">
-                            **{name}**
-                            <br>Sets: `{sets}` | Reps: `{reps}`
-                            <br><small>Notes: {notes}</small>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-            else:
-                st.info("Rest day or active recovery!")
-
-def render_meal_plan(plan):
+        if exercises:
+            for exercise in exercises:
+                # Safely retrieve all exercise properties
+                name = exercise.get('name', 'N/A')
+                sets = exercise.get('sets', 'N/A')
+                reps = exercise.get('reps', 'N/A')
+                # New field 'notes' is safely accessed
+                notes = exercise.get('notes', 'No specific notes.') 
+                
+                st.markdown(
+                    f"""
+                    <div style="padding: 10px 0 5px 10px; border-bottom: 1px dashed #444;">
+                        **{name}**
+                        <br>Sets: `{sets}` | Reps: `{reps}`
+                        <br><small>Notes: {notes}</small>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+        else:
+            st.info("Rest day or active recovery!")
+
+def render_meal_plan(plan, meal_budget=None):
     """Renders the meal plan with cost estimates in a table-like format."""
     st.subheader("Budget Meal Schedule")
+    if meal_budget:
+        render_meal_budget(meal_budget)
     for day_meal in plan:
-        st.markdown(f"#### 🗓️ Day {day_meal.get('day', 'N/A')}")
+        render_meal_day(day_meal)
+
+def render_meal_budget(meal_budget):
+    """
+    Shows the week's total cost against the budget, with a warning when no week fitted it.
+    The backend budgets the week as 7 times the daily budget picked in the sidebar.
+    """
+    cost = meal_budget.get('weeklyCostInr', 'N/A')
+    weekly_budget = meal_budget.get('weeklyBudgetInr', 'N/A')
+    if isinstance(weekly_budget, int):
+        weekly_budget = f"{weekly_budget} weekly budget (₹{weekly_budget // 7} a day × 7)"
+    else:
+        weekly_budget = f"{weekly_budget} weekly budget"
+    if meal_budget.get('withinBudget', True):
+        st.caption(f"Week total: ₹{cost} of your ₹{weekly_budget}.")
+    else:
+        st.warning(f"Even the cheapest week of this cuisine costs ₹{cost}, over your ₹{weekly_budget}. "
+                   "Try a larger budget or another cuisine.")
+
+def render_meal_day(day_meal):
+    """Renders one day of meals."""
+    st.markdown(f"#### 🗓️ Day {day_meal.get('day', 'N/A')}")
+    
+    # Safely iterate over meals list
+    for meal in day_meal.get('meals', []):
+        # Safely access meal properties
+        meal_name = meal.get('name', 'Meal Item')
+        cost = meal.get('cost_estimate_in_inr', 'N/A')
+        recipe = meal.get('recipe', 'Recipe details unavailable.')
         
-        # Safely iterate over meals list
-        for meal in day_meal.get('meals', []):
-            # Safely access meal properties
-            meal_name = meal.get('name', 'Meal Item')
-            cost = meal.get('cost_estimate_in_inr', 'N/A')
-            recipe = meal.get('recipe', 'Recipe details unavailable.')
-            
-            st.markdown(
-                f"""
-                <div style="border: 1px solid #333; padding: 10px; border-radius: 5px; margin-bottom: 10px;">
-                    <span style="font-weight: bold; color: #4CAF50;">{meal_name}</span>
-                    <span style="float: right; font-weight: bold;">Cost: {cost}</span>
-                    <br><small>{recipe}</small>
-                </div>
-                """, 
-                unsafe_allow_html=True
-            )
+        st.markdown(
+            f"""
+            <div style="border: 1px solid #333; padding: 10px; border-radius: 5px; margin-bottom: 10px;">
+                <span style="font-weight: bold; color: #4CAF50;">{meal_name}</span>
+                <span style="float: right; font-weight: bold;">Cost: {cost}</span>
+                <br><small>{recipe}</small>
+            </div>
+            """, 
+            unsafe_allow_html=True
+        )
 
 # --- SIDEBAR INPUTS ---
 
-with st.sidebar:
+# The inputs form a single form: changing them does not rerun the script, submitting does
+with st.sidebar, st.form("plan_inputs", border=False):
     st.header("✨ Personalize Your Plan")
     
     # Inputs (Same as previous versions)
@@ -133,7 +262,7 @@ with st.sidebar:
     
     st.markdown("---")
     
-    budget = st.slider("Weekly Food Budget (INR)", min_value=100, max_value=2000, value=500, step=50, key='budget')
+    budget = st.slider("Daily Food Budget (INR)", min_value=100, max_value=2000, value=500, step=50, key='budget')
     cuisine = st.selectbox("Cultural/Cuisine Focus", ['Any/Global', 'South Asian', 'Latino', 'American/Comfort'], index=0, key='cuisine')
     workouts_per_week = st.number_input("Workouts Per Week", min_value=1, max_value=6, value=3, step=1, key='workouts_per_week')
 
@@ -149,103 +278,155 @@ with st.sidebar:
     }
     
     st.markdown("---")
-    generate_button = st.button("✨ Generate Plans With AI", type="primary")
+    generate_button = st.form_submit_button("✨ Generate Plans With AI", type="primary")
 
 # --- MAIN CONTENT TABS ---
 
 tab1, tab2 = st.tabs(["Current Plan", "History of Plans"])
 
+def render_plan(plan, complete=True):
+    """
+    Renders a plan's workout and meal columns. A plan still streaming in (complete=False)
+    shows the days received so far instead of errors for the parts that have not arrived.
+    """
+    st.markdown(f'<h3 class="plan-header">Your 7-Day Personalized Plan</h3>', unsafe_allow_html=True)
+    col_workout, col_meal = st.columns(2)
+
+    # Check that both parts of the plan arrived
+    with col_workout:
+        st.subheader("🏋️ Workout Plan")
+        if plan.get('workoutPlan'):
+            render_workout_plan(plan['workoutPlan'])
+        elif complete:
+            st.error("Workout plan data is missing.")
+    with col_meal:
+        st.subheader("🍽️ Meal Plan")
+        if plan.get('mealPlan'):
+            render_meal_plan(plan['mealPlan'], plan.get('mealBudget'))
+        elif complete:
+            st.error("Meal plan data is missing.")
+
+def finish_plan_stream(plan_entry=None, error=None):
+    """Forgets the finished stream, keeps its plan (or error) for the current plan tab and reruns the page."""
+    st.session_state.pop('plan_stream', None)
+    if plan_entry is not None:
+        st.session_state['current_plan'] = plan_entry
+        # The new plan belongs on the first history page
+        fetch_history_page.clear()
+    st.session_state['generation_error'] = error
+    st.rerun()
+
+@st.fragment(run_every=STREAM_REDRAW_INTERVAL)
+def show_plan_stream():
+    """
+    Shows the plan in st.session_state['plan_stream'] as it streams in: the workout days
+    first, then the meal days, redrawn every STREAM_REDRAW_INTERVAL seconds. It runs as a
+    fragment, so a redraw reruns only this function; once the plan is saved (or failed),
+    the whole page reruns to show it as the current plan and the redraws stop.
+    """
+    stream = st.session_state['plan_stream']
+    progress = stream.snapshot()
+    plan = {"workoutPlan": progress['workout_days'], "mealPlan": progress['meal_days']}
+    if progress['meal_budget'] is not None:
+        plan['mealBudget'] = progress['meal_budget']
+
+    if progress['error'] is not None:
+        finish_plan_stream(error=progress['error'])
+    elif progress['saved'] is not None:
+        finish_plan_stream(plan_entry={**progress['saved'], "inputs": stream.payload, "plan": plan})
+
+    if progress['meal_days']:
+        label = f"Generating meal plan... ({len(progress['meal_days'])} days ready)"
+    elif progress['workout_days']:
+        label = f"Generating workout plan... ({len(progress['workout_days'])} days ready)"
+    else:
+        label = "Connecting to Flask backend..."
+    with st.status(label, state="running"):
+        st.write("Analyzing your constraints...")
+        st.write("Sending request to Mock Generator...")
+    render_plan(plan, complete=False)
+
 with tab1:
     if generate_button:
         try:
-            with st.status("Connecting to Flask backend...", expanded=True) as status:
-                st.write("Analyzing your constraints...")
-                
-                # Use Streamlit's cache clearing mechanism to immediately update the history tab after generation
-                fetch_plans_history.clear() 
-
-                st.write("Sending request to Mock Generator...")
-                # POST request to Flask backend
-                response = requests.post(FLASK_URL + GENERATE_ENDPOINT, json=payload, timeout=125)
-                
-                status.update(label="Awaiting structured plan (Simulating delay)...", state="running")
-                time.sleep(1) # Simulate the time it takes the mock function to return
-                
-                response.raise_for_status()
-                
-                # If successful, response.json() will be the structured plan object
-                plan_object = response.json()
-                
-                # Plan data is nested under 'plan' key in the saved object
-                current_plan = plan_object.get('plan')
-                
-                status.update(label="✅ Plan successfully generated and saved!", state="complete")
-            
-            # Display the result
-            if current_plan:
-                st.markdown(f'<h3 class="plan-header">Your 7-Day Personalized Plan</h3>', unsafe_allow_html=True)
-                col_workout, col_meal = st.columns(2)
-                
-                with col_workout:
-                    st.subheader("🏋️ Workout Plan")
-                    # Check if 'workoutPlan' exists before rendering
-                    if 'workoutPlan' in current_plan:
-                        render_workout_plan(current_plan['workoutPlan'])
-                    else:
-                        st.error("Workout plan data is missing.")
-                
-                with col_meal:
-                    st.subheader("🍽️ Meal Plan")
-                    # Check if 'mealPlan' exists before rendering
-                    if 'mealPlan' in current_plan:
-                        render_meal_plan(current_plan['mealPlan'])
-                    else:
-                        st.error("Meal plan data is missing.")
-
-        except requests.exceptions.RequestException as e:
-            st.error(f"Failed to connect to Flask Backend or received a server error: {e}")
-            st.warning("Please ensure the Flask backend is running in a separate terminal: `python app.py`")
-        except json.JSONDecodeError:
-            st.error("Received an invalid response from the backend (not JSON).")
+            # The stream survives reruns, so its plan is picked up whichever run sees it finish
+            st.session_state['plan_stream'] = PlanStream(payload).start()
+            st.session_state.pop('current_plan', None)
+            st.session_state['generation_error'] = None
         except Exception as e:
             st.error(f"An unexpected error occurred during generation: {e}")
-    
-    else:
+
+    if 'plan_stream' in st.session_state:
+        show_plan_stream()
+    elif st.session_state.get('generation_error'):
+        st.error(st.session_state['generation_error'])
+        if st.session_state['generation_error'].startswith("Failed to connect"):
+            st.warning("Please ensure the Flask backend is running in a separate terminal: `python app.py`")
+    elif 'current_plan' in st.session_state:
+        st.success(f"✅ Plan {st.session_state['current_plan'].get('id', '')} successfully generated and saved!")
+        render_plan(st.session_state['current_plan'].get('plan', {}))
+    elif not generate_button:
         st.info("👈 Set your preferences in the sidebar and click 'Generate Plans with AI' to begin!")
 
-with tab2:
+@st.fragment
+def render_history():
+    """
+    The history tab. It runs as a fragment: showing a plan or loading older plans
+    reruns only this function, not the sidebar, the styles or the current plan tab.
+    """
     st.subheader("Plan History")
-    
-    # Fetch and display historical data
-    history = fetch_plans_history()
-    
-    if history:
-        st.info(f"Showing {len(history)} saved plans.")
-        
-        # Display plans in reverse chronological order
-        for plan_entry in sorted(history, key=lambda x: x['id'], reverse=True):
-            inputs = plan_entry.get('inputs', {})
-            plan = plan_entry.get('plan', {'workoutPlan': [], 'mealPlan': []})
-
-            # Format timestamp for better display
-            try:
-                timestamp_display = time.strftime('%Y-%m-%d %H:%M', time.strptime(plan_entry.get('timestamp', ''), '%Y-%m-%d %H:%M:%S.%f'))
-            except ValueError:
-                 timestamp_display = plan_entry.get('timestamp', 'N/A')
-
-            expander_label = f"Plan ID {plan_entry.get('id', 'N/A')} | Goal: {inputs.get('goal', 'N/A')} | Budget: ₹{inputs.get('budget', 'N/A')} | Date: {timestamp_display}"
-            
-            with st.expander(expander_label, expanded=False):
-                st.markdown(f"**Inputs Used:** Level={inputs.get('level')}, Equipment={inputs.get('equipment')}, Intensity={inputs.get('intensity')}, Cuisine={inputs.get('cuisine')}")
-                
-                col_h_workout, col_h_meal = st.columns(2)
-                
-                with col_h_workout:
-                    st.markdown("##### Workout Summary")
-                    render_workout_plan(plan.get('workoutPlan', []))
-                
-                with col_h_meal:
-                    st.markdown("##### Meal Summary")
-                    render_meal_plan(plan.get('mealPlan', []))
+
+    # Summaries are fetched one page at a time (newest first); "Load older plans" adds a page
+    if 'history_pages' not in st.session_state:
+        st.session_state['history_pages'] = 1
+
+    history_count = 0
+    next_before_id = None
+    try:
+        for page_number in range(st.session_state['history_pages']):
+            if page_number and next_before_id is None:
+                break
+            summaries, next_before_id = fetch_history_page(next_before_id)
+            for plan_entry in summaries:
+                history_count += 1
+                inputs = plan_entry.get('inputs', {})
+                plan_id = plan_entry.get('id', 'N/A')
+
+                # Format timestamp for better display
+                try:
+                    timestamp_display = time.strftime('%Y-%m-%d %H:%M', time.strptime(plan_entry.get('timestamp', ''), '%Y-%m-%d %H:%M:%S.%f'))
+                except ValueError:
+                     timestamp_display = plan_entry.get('timestamp', 'N/A')
+
+                expander_label = f"Plan ID {plan_id} | Goal: {inputs.get('goal', 'N/A')} | Budget: ₹{inputs.get('budget', 'N/A')} | Date: {timestamp_display}"
+
+                with st.expander(expander_label, expanded=False):
+                    st.markdown(f"**Inputs Used:** Level={inputs.get('level')}, Equipment={inputs.get('equipment')}, Intensity={inputs.get('intensity')}, Cuisine={inputs.get('cuisine')}")
+
+                    # The plan body is only fetched and rendered once it is asked for
+                    if not st.toggle("Show workout and meal plan", key=f"show_plan_{plan_id}"):
+                        continue
+                    plan = fetch_plan(plan_id).get('plan', {'workoutPlan': [], 'mealPlan': []})
+
+                    col_h_workout, col_h_meal = st.columns(2)
+
+                    with col_h_workout:
+                        st.markdown("##### Workout Summary")
+                        render_workout_plan(plan.get('workoutPlan', []))
+
+                    with col_h_meal:
+                        st.markdown("##### Meal Summary")
+                        render_meal_plan(plan.get('mealPlan', []), plan.get('mealBudget'))
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error fetching historical plans: {e}")
+
+    if history_count:
+        st.info(f"Showing {history_count} saved plans.")
+        if next_before_id is not None and st.button("Load older plans"):
+            st.session_state['history_pages'] += 1
+            st.rerun(scope="fragment")
     else:
         st.warning("No plans found in history. Generate a plan first!")
+
+with tab2:
+    render_history()
@@ -0,0 +1,132 @@
+"""
+Local stand-in for the Gemini generateContent endpoint.
+
+Answers POST requests with a small, valid plan in the Gemini response format so
+the 'http' generator backend (pooling, concurrency cap, retries, coalescing) can be
+exercised without an API key:
+
+    python stub_llm_server.py --port 8765 --delay 0.5 --fail-rate 0.2
+    GENERATOR_BACKEND=http LLM_API_URL=http://127.0.0.1:8765/generate \
+        LLM_STREAM_URL=http://127.0.0.1:8765/stream python app.py
+
+POST /stream answers like streamGenerateContent with alt=sse: the plan text is sent
+as a chunked series of server-sent events, with the delay spread across them.
+GET /stats returns how many generation requests the stub has received.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+STREAM_CHUNKS = 16 # Server-sent events per streamed answer
+
+
+def stub_plan(prompt):
+    """A minimal plan; the prompt is echoed into the notes so callers can tell requests apart."""
+    return {
+        "workoutPlan": [
+            {"day": day, "focus": "Stub Total Body", "exercises": [
+                {"name": "Bodyweight Squats", "sets": 3, "reps": "12-15", "notes": prompt[-80:]}
+            ]} for day in DAYS
+        ],
+        "mealPlan": [
+            {"day": day, "meals": [
+                {"name": "B: Oats", "recipe": "Stub oats.", "cost_estimate_in_inr": "₹40-₹50"},
+                {"name": "L: Dal Rice", "recipe": "Stub dal and rice.", "cost_estimate_in_inr": "₹60-₹80"},
+                {"name": "D: Khichdi", "recipe": "Stub khichdi.", "cost_estimate_in_inr": "₹60-₹80"}
+            ]} for day in DAYS
+        ]
+    }
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay=0.0, fail_rate=0.0):
+        super().__init__(address, StubLLMHandler)
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.requests_received = 0
+        self._lock = threading.Lock()
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, so connection pooling is observable
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server._lock:
+            self.server.requests_received += 1
+        streaming = self.path.split('?')[0].endswith('/stream')
+        if self.server.delay and not streaming:
+            time.sleep(self.server.delay)
+        if random.random() < self.server.fail_rate:
+            self._send(503, {"error": "stub: simulated overload"})
+            return
+        try:
+            prompt = json.loads(body)['contents'][0]['parts'][0]['text']
+        except (ValueError, KeyError, IndexError):
+            self._send(400, {"error": "stub: expected a generateContent request"})
+            return
+        text = json.dumps(stub_plan(prompt), ensure_ascii=False)
+        if streaming:
+            self._send_stream(text)
+            return
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    def _send_stream(self, text):
+        """Sends text in STREAM_CHUNKS server-sent events, sleeping delay / STREAM_CHUNKS before each."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        size = -(-len(text) // STREAM_CHUNKS)
+        for start in range(0, len(text), size):
+            if self.server.delay:
+                time.sleep(self.server.delay / STREAM_CHUNKS)
+            event = {"candidates": [{"content": {"parts": [{"text": text[start:start + size]}]}}]}
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode('utf-8')
+            self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(200, {"requests_received": self.server.requests_received})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark/test output quiet
+
+
+def start_stub_server(port=0, delay=0.0, fail_rate=0.0):
+    """
+    Starts the stub on a background thread; port=0 picks a free port.
+    Returns (server, url); the streaming endpoint is the same url ending in /stream.
+    """
+    server = StubLLMServer(('127.0.0.1', port), delay=delay, fail_rate=fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/generate"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+    server = StubLLMServer(('127.0.0.1', args.port), delay=args.delay, fail_rate=args.fail_rate)
+    print(f"Stub LLM server listening on http://127.0.0.1:{args.port}/generate")
+    server.serve_forever()
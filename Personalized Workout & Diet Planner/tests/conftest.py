@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The app module with its resources opened once, its storage files in a temporary directory."""
+    os.chdir(tmp_path_factory.mktemp('app'))
+    import app
+    app.open_resources()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    """A test client of a Flask app built by the factory."""
+    return app_module.create_app().test_client()
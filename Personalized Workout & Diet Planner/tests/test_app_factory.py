@@ -0,0 +1,13 @@
+def test_create_app_builds_a_new_app_on_the_shared_resources(app_module):
+    first, second = app_module.create_app(), app_module.create_app()
+    assert first is not second
+    assert app_module.storage is not None
+
+    for flask_app in (first, second):
+        assert [hook.__name__ for hook in flask_app.before_request_funcs[None]] == ['start_request_timer']
+        assert flask_app.test_client().get('/').status_code == 200
+
+
+def test_metrics_label_requests_by_route_name(client):
+    client.get('/plan_cache/stats')
+    assert 'endpoint="plan_cache_stats"' in client.get('/metrics').get_data(as_text=True)
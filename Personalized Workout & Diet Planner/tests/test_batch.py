@@ -0,0 +1,72 @@
+import pytest
+
+
+def _item(budget, **fields):
+    return {"goal": "Muscle Gain", "level": "Advanced", "budget": budget, "seed": budget, **fields}
+
+
+def _history_ids(client):
+    return [plan['id'] for plan in client.get('/get_plans').get_json()]
+
+
+def test_each_item_gets_its_plan_or_its_error(client):
+    before = _history_ids(client)
+    response = client.post('/generate_plans/batch', json=[_item(600), _item(10), _item(900, mood="happy"), _item(1200)])
+    assert response.status_code == 200
+    batch = response.get_json()
+
+    assert (batch['succeeded'], batch['failed']) == (2, 2)
+    assert [result['index'] for result in batch['results']] == [0, 1, 2, 3]
+    assert "'budget'" in batch['results'][1]['error']
+    assert batch['results'][2]['error'] == "Unknown field 'mood'"
+    saved = [batch['results'][0]['plan'], batch['results'][3]['plan']]
+    assert [plan['inputs']['budget'] for plan in saved] == [600, 1200]
+
+    # Only the successful items are saved, in order and with fresh ids
+    assert _history_ids(client) == before + [plan['id'] for plan in saved]
+    assert saved[1]['id'] == saved[0]['id'] + 1
+
+
+def test_batch_plans_match_single_generation(client):
+    batch = client.post('/generate_plans/batch', json={"items": [_item(750), _item(750, cuisine="latino")]}).get_json()
+    for result, item in zip(batch['results'], [_item(750), _item(750, cuisine="latino")]):
+        single = client.post('/generate_plan', json=item).get_json()
+        assert result['plan']['plan'] == single['plan'] and result['plan']['inputs'] == single['inputs']
+
+
+def test_a_failing_generation_only_fails_its_item(client, app_module, monkeypatch):
+    build_plan_entry = app_module.build_plan_entry
+
+    def flaky_build_plan_entry(inputs):
+        if inputs['budget'] == 666:
+            raise RuntimeError("template missing")
+        return build_plan_entry(inputs)
+
+    monkeypatch.setattr(app_module, 'build_plan_entry', flaky_build_plan_entry)
+    batch = client.post('/generate_plans/batch', json=[_item(666), _item(667)]).get_json()
+    assert batch['results'][0] == {"index": 0, "error": "Generation failed: template missing"}
+    assert (batch['succeeded'], batch['failed']) == (1, 1)
+
+
+def test_a_batch_where_every_item_fails_saves_nothing(client):
+    before = _history_ids(client)
+    batch = client.post('/generate_plans/batch', json=[_item(1), _item(2)]).get_json()
+    assert (batch['succeeded'], batch['failed']) == (0, 2)
+    assert _history_ids(client) == before
+
+
+@pytest.mark.parametrize('body', [[], {"items": []}, {"items": "x"}, {"goal": "Muscle Gain"}, 42])
+def test_a_batch_must_be_a_non_empty_list(client, body):
+    response = client.post('/generate_plans/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Expected a non-empty list of input payloads"}
+
+
+def test_an_oversized_batch_answers_413(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'BATCH_MAX_ITEMS', 2)
+    before = _history_ids(client)
+    response = client.post('/generate_plans/batch', json=[_item(600)] * 3)
+    assert response.status_code == 413
+    assert response.get_json()['error'] == "Batch too large: 3 items (limit 2)"
+    assert _history_ids(client) == before
+    assert client.post('/generate_plans/batch', data='not json', content_type='application/json').status_code == 400
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from storage import JsonLinesStorage, create_storage
+
+
+def _plan(budget):
+    return {"id": None, "timestamp": "2025-01-01 00:00:00", "inputs": {"budget": budget},
+            "plan": {"workoutPlan": [], "mealPlan": []}}
+
+
+def _paths(directory):
+    return (str(directory / 'plans.json'), str(directory / 'plans.jsonl'), str(directory / 'plans.sqlite3'),
+            str(directory / 'plans.compact.jsonl'))
+
+
+def _open(backend, directory, app_module):
+    plans_file, log_file, db_file, compact_file = _paths(directory)
+    return create_storage(backend, plans_file, log_file, db_file, compact_file=compact_file,
+                          codec=app_module.plan_codec)
+
+
+def test_an_unknown_backend_is_rejected_before_any_file_is_touched(tmp_path):
+    JsonLinesStorage(_paths(tmp_path)[1]).append(_plan(100))
+    with open(_paths(tmp_path)[1], 'ab') as f:
+        f.write(b'{"id": 3, "times') # Opening the log would set this torn write aside
+    before = {name: os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)}
+
+    with pytest.raises(ValueError, match='Unknown storage backend'):
+        create_storage('mongo', *_paths(tmp_path)[:3])
+    assert {name: os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)} == before
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'compact'])
+def test_a_new_store_imports_the_log_once(backend, tmp_path, app_module):
+    JsonLinesStorage(_paths(tmp_path)[1]).append_many([_plan(100), _plan(200)])
+    assert [plan['inputs']['budget'] for plan in _open(backend, tmp_path, app_module).load_all()] == [100, 200]
+
+    # Once the store exists its import source is never opened again: an unreadable legacy
+    # array and a torn log tail are left alone
+    with open(_paths(tmp_path)[0], 'w') as f:
+        f.write('[{"id": 1, "timest')
+    with open(_paths(tmp_path)[1], 'ab') as f:
+        f.write(b'{"id": 3, "times')
+    log_size = os.path.getsize(_paths(tmp_path)[1])
+
+    assert len(_open(backend, tmp_path, app_module).load_all()) == 2
+    assert os.path.getsize(_paths(tmp_path)[1]) == log_size
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'compact'])
+def test_a_new_store_without_a_file_history_starts_empty(backend, tmp_path, app_module):
+    assert _open(backend, tmp_path, app_module).load_all() == []
+    assert not os.path.exists(_paths(tmp_path)[0]) and not os.path.exists(_paths(tmp_path)[1])
@@ -0,0 +1,53 @@
+import json
+
+
+def _plan(budget):
+    return {"id": None, "timestamp": "2025-01-01 00:00:00", "inputs": {"goal": "Weight Loss", "budget": budget},
+            "plan": {"workoutPlan": [], "mealPlan": []}}
+
+
+def test_the_history_carries_an_etag(client, app_module):
+    client.post('/generate_plan', json={"budget": 800, "seed": 'etag'})
+    response = client.get('/get_plans')
+    assert response.status_code == 200
+    assert response.headers['ETag'] and response.headers['Cache-Control'] == 'no-cache'
+    assert json.loads(response.get_data()) == app_module.storage.load_all()
+
+    again = client.get('/get_plans')
+    assert again.headers['ETag'] == response.headers['ETag'] and again.get_data() == response.get_data()
+
+
+def test_an_unchanged_history_answers_304(client, app_module):
+    client.post('/generate_plan', json={"budget": 900, "seed": 'etag'})
+    etag = client.get('/get_plans').headers['ETag']
+    full_loads = app_module.history_cache.full_loads
+
+    for if_none_match in (etag, f'"stale", {etag}', '*'):
+        response = client.get('/get_plans', headers={'If-None-Match': if_none_match})
+        assert response.status_code == 304
+        assert response.get_data() == b''
+        assert response.headers['ETag'] == etag and response.headers['Cache-Control'] == 'no-cache'
+    # Polls of an unchanged history neither reload nor re-encode it
+    assert app_module.history_cache.full_loads == full_loads
+
+
+def test_the_etag_changes_with_every_new_plan(client, app_module):
+    etag = client.get('/get_plans').headers['ETag']
+    saved = client.post('/generate_plan', json={"budget": 1000, "seed": 'etag'}).get_json()
+
+    response = client.get('/get_plans', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert response.get_json()[-1] == saved
+
+    # Plans written straight to storage, as another worker process would, change it too
+    etag = response.headers['ETag']
+    app_module.storage.append(_plan(1100))
+    response = client.get('/get_plans', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert response.get_json()[-1]['inputs']['budget'] == 1100
+
+
+def test_a_stale_etag_gets_the_full_history(client):
+    response = client.get('/get_plans', headers={'If-None-Match': '"0000"'})
+    assert response.status_code == 200
+    assert response.get_json() == client.get('/get_plans?stream=array').get_json()
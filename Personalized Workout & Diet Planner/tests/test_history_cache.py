@@ -0,0 +1,60 @@
+import pytest
+
+from history_cache import HistoryCache
+from storage import create_storage, query_plans
+
+BACKENDS = ['jsonl', 'json', 'sqlite', 'compact']
+
+
+def _plan(budget):
+    return {"id": None, "timestamp": "2025-01-01 00:00:00", "inputs": {"goal": "Weight Loss", "budget": budget},
+            "plan": {"workoutPlan": [], "mealPlan": []}}
+
+
+def _open(backend, directory, app_module):
+    return create_storage(backend, str(directory / 'plans.json'), str(directory / 'plans.jsonl'),
+                          str(directory / 'plans.sqlite3'), compact_file=str(directory / 'plans.compact.jsonl'),
+                          codec=app_module.plan_codec)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_cache_reads_only_the_plans_appended_by_another_writer(backend, tmp_path, app_module):
+    storage = _open(backend, tmp_path, app_module)
+    storage.append_many([_plan(budget) for budget in range(100, 110)])
+    cache = HistoryCache(storage)
+    assert len(cache.plans()) == 10
+
+    writer = _open(backend, tmp_path, app_module) # Another process sharing the storage
+    writer.append_many([_plan(500), _plan(600)])
+    assert [plan['inputs']['budget'] for plan in cache.plans()[-2:]] == [500, 600]
+    assert cache.search(budget_min=500)[1] == 2
+    assert cache.stats()['full_loads'] == 1
+    assert cache.stats()['incremental_loads'] == 1
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_cache_reloads_after_plans_are_removed(backend, tmp_path, app_module):
+    storage = _open(backend, tmp_path, app_module)
+    storage.append_many([_plan(budget) for budget in range(100, 110)])
+    cache = HistoryCache(storage)
+    ids = [plan['id'] for plan in cache.plans()]
+
+    _open(backend, tmp_path, app_module).remove(set(ids[:4]))
+    assert [plan['id'] for plan in cache.plans()] == ids[4:]
+    assert cache.get(ids[0]) is None
+    assert cache.stats()['full_loads'] == 2
+
+
+def test_query_pages_match_a_sorted_scan(tmp_path, app_module):
+    storage = _open('jsonl', tmp_path, app_module)
+    plans = [{**_plan(100 + 50 * (i % 4)), "id": plan_id} for i, plan_id in enumerate([5, 3, 9, 1, 7, 8, 2, 6, 4])]
+    plans[2]['inputs']['goal'] = 'weight_loss' # Legacy spelling, canonicalized by the filters
+    storage.rewrite(plans)
+    cache = HistoryCache(storage)
+
+    for before_id in (None, 1, 5, 10):
+        for limit in (None, 0, 2, 20):
+            for filters in (None, {"budget": 150}, {"goal": "Weight Loss"}):
+                expected = query_plans(plans, limit, before_id, filters)
+                assert [plan['id'] for plan in cache.query(limit, before_id, filters)] == [plan['id'] for plan in expected]
+    assert [plan['id'] for plan in cache.search(limit=3)[0]] == [9, 8, 7]
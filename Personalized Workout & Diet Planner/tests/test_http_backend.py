@@ -0,0 +1,152 @@
+import json
+import threading
+
+import pytest
+
+import generator_backends
+from generator_backends import GeneratorError, HttpLLMBackend, PlanStreamParser
+from stub_llm_server import start_stub_server
+
+INPUTS = {"goal": "Weight Loss", "level": "Beginner", "budget": 500}
+
+
+@pytest.fixture
+def stub():
+    server, url = start_stub_server()
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """The (low, high) range of every backoff drawn; the backend retries without sleeping."""
+    drawn = []
+    monkeypatch.setattr(generator_backends.random, 'uniform', lambda low, high: drawn.append((low, high)) or 0)
+    return drawn
+
+
+def _backend(url, **options):
+    return HttpLLMBackend(url, stream_url=url.replace('/generate', '/stream'), **options)
+
+
+def test_server_errors_are_retried_with_jittered_backoff_then_raise(stub, backoffs):
+    server, url = stub
+    server.fail_rate = 1.0
+    backend = _backend(url, max_retries=3, backoff_base=0.5, backoff_max=1.5)
+
+    with pytest.raises(GeneratorError, match='after 4 attempts'):
+        backend.generate(INPUTS)
+    assert server.requests_received == 4
+    # Full jitter: each sleep is drawn from [0, min(backoff_max, backoff_base * 2 ** (attempt - 1))]
+    assert backoffs == [(0, 0.5), (0, 1.0), (0, 1.5)]
+
+
+def test_a_retry_that_succeeds_returns_the_plan(stub, monkeypatch):
+    server, url = stub
+    server.fail_rate = 1.0
+    # The upstream recovers while the backend backs off
+    monkeypatch.setattr(generator_backends.random, 'uniform', lambda low, high: setattr(server, 'fail_rate', 0.0) or 0)
+    plan = _backend(url, max_retries=1).generate(INPUTS)
+
+    assert len(plan['workoutPlan']) == len(plan['mealPlan']) == 7
+    assert server.requests_received == 2
+
+
+def test_in_flight_upstream_calls_are_capped(stub):
+    server, url = stub
+    server.delay = 0.2
+    backend = _backend(url, max_in_flight=2)
+    active = peak = 0
+    lock = threading.Lock()
+    post = backend._post
+
+    def counting_post(*args, **kwargs):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            return post(*args, **kwargs)
+        finally:
+            with lock:
+                active -= 1
+
+    backend._post = counting_post
+    threads = [threading.Thread(target=backend.generate, args=({**INPUTS, "budget": 100 + i},)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert server.requests_received == 6
+    assert peak == 2
+
+
+def test_identical_concurrent_prompts_share_one_upstream_call(stub):
+    server, url = stub
+    server.delay = 0.3
+    backend = _backend(url)
+    start = threading.Barrier(5)
+    results = []
+
+    def generate():
+        start.wait()
+        results.append(backend.generate(INPUTS))
+
+    threads = [threading.Thread(target=generate) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert server.requests_received == backend.upstream_calls == 1
+    assert backend.coalesced_calls == 4
+    assert all(result is results[0] for result in results)
+
+
+def test_stream_yields_every_day_in_order(stub):
+    server, url = stub
+    days = list(_backend(url).generate_stream(INPUTS))
+
+    assert [section for section, _ in days] == ['workoutPlan'] * 7 + ['mealPlan'] * 7
+    assert days[0][1]['day'] == 'Monday' and days[-1][1]['meals'][0]['name'] == 'B: Oats'
+    assert server.requests_received == 1
+
+
+def test_stream_server_errors_are_retried_before_the_first_day(stub, backoffs):
+    server, url = stub
+    server.fail_rate = 1.0
+
+    with pytest.raises(GeneratorError, match='after 3 attempts'):
+        list(_backend(url, max_retries=2).generate_stream(INPUTS))
+    assert server.requests_received == 3
+    assert len(backoffs) == 2
+
+
+def test_parser_returns_each_day_as_soon_as_it_is_complete():
+    plan = {"note": "{not a day}", "workoutPlan": [{"day": "Monday", "focus": "Legs \"and\" {core}"},
+                                                   {"day": "Tuesday", "exercises": [{"name": "Squats"}]}],
+            "mealPlan": [{"day": 1, "meals": []}]}
+    text = json.dumps(plan)
+    parser = PlanStreamParser()
+
+    completed = []
+    for end, c in enumerate(text, 1):
+        for section, day in parser.feed(c):
+            completed.append((section, day, end))
+    assert [(section, day) for section, day, _ in completed] == [
+        ('workoutPlan', plan['workoutPlan'][0]), ('workoutPlan', plan['workoutPlan'][1]),
+        ('mealPlan', plan['mealPlan'][0])]
+    # Each day comes out on the character that closes it
+    assert text[:completed[0][2]].endswith('{core}"}')
+    parser.finish()
+
+
+def test_parser_rejects_a_plan_missing_a_section():
+    parser = PlanStreamParser()
+    assert parser.feed('{"workoutPlan": [{"day": "Monday"}], "mealPlan": [') == [('workoutPlan', {"day": "Monday"})]
+    with pytest.raises(GeneratorError):
+        parser.finish()
+    with pytest.raises(GeneratorError):
+        PlanStreamParser().feed('{"mealPlan": [{"day": oops}]}')
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from jobs import DONE, FAILED, JobManager, JobQueueFull
+
+PAYLOAD = {"goal": "Weight Loss", "level": "Beginner", "budget": 700, "cuisine": "South Asian", "seed": 'job'}
+
+
+def _wait_until_finished(client, status_url):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(status_url).get_json()
+        if job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(0.02)
+    pytest.fail(f"{status_url} did not finish")
+
+
+def _wait_for(manager, job_id):
+    deadline = time.monotonic() + 10
+    while manager.get(job_id).status not in (DONE, FAILED) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return manager.get(job_id)
+
+
+@pytest.fixture
+def small_jobs(app_module, monkeypatch):
+    """A job pool of one worker that accepts one pending job."""
+    manager = JobManager(max_workers=1, max_pending=1)
+    monkeypatch.setattr(app_module, 'jobs', manager)
+    yield manager
+    manager.shutdown()
+
+
+def test_an_async_plan_is_saved_by_its_job(client):
+    response = client.post('/generate_plan?async=1', json=PAYLOAD)
+    assert response.status_code == 202
+    accepted = response.get_json()
+    assert accepted['status_url'] == f"/jobs/{accepted['job_id']}"
+
+    job = _wait_until_finished(client, accepted['status_url'])
+    assert job['status'] == DONE
+    saved = job['result']
+    assert saved['inputs']['budget'] == 700 and saved['plan']['workoutPlan']
+    assert saved == client.post('/generate_plan', json=PAYLOAD).get_json() | {"id": saved['id'],
+                                                                               "timestamp": saved['timestamp']}
+    assert saved['id'] in [plan['id'] for plan in client.get('/get_plans').get_json()]
+
+
+def test_an_unknown_job_is_404(client):
+    for job_id in ('0' * 32, 'not-a-job'):
+        response = client.get(f'/jobs/{job_id}')
+        assert response.status_code == 404
+        assert 'Unknown job' in response.get_json()['error']
+
+
+def test_a_full_job_queue_answers_503(client, small_jobs):
+    release = threading.Event()
+    small_jobs.submit(release.wait)
+    try:
+        response = client.post('/generate_plan?async=1', json=PAYLOAD)
+        assert response.status_code == 503
+        assert 'Too many pending jobs' in response.get_json()['error']
+    finally:
+        release.set()
+
+
+def test_a_failed_job_reports_its_error(client, app_module, small_jobs, monkeypatch):
+    def failing_create_plan(data):
+        raise RuntimeError("generator exploded")
+
+    monkeypatch.setattr(app_module, 'create_plan', failing_create_plan)
+    accepted = client.post('/generate_plan?async=1', json=PAYLOAD).get_json()
+    job = _wait_until_finished(client, accepted['status_url'])
+    assert job == {"job_id": accepted['job_id'], "status": FAILED, "error": "generator exploded"}
+    assert small_jobs.pending == 0
+
+
+def test_pending_jobs_are_capped():
+    manager = JobManager(max_workers=1, max_pending=2)
+    release = threading.Event()
+    jobs = [manager.submit(release.wait) for _ in range(2)]
+    with pytest.raises(JobQueueFull):
+        manager.submit(release.wait)
+    release.set()
+    assert all(_wait_for(manager, job.job_id).status == DONE for job in jobs)
+    # Finished jobs free their slots
+    assert _wait_for(manager, manager.submit(sum, [1, 2]).job_id).result == 3
+    manager.shutdown()
+
+
+def test_finished_jobs_are_dropped_after_their_ttl(tmp_path):
+    manager = JobManager(max_workers=1, result_ttl=0, state_dir=str(tmp_path))
+    job = manager.submit(sum, [1, 2])
+    _wait_for(manager, job.job_id)
+    time.sleep(0.01)
+    manager.submit(sum, [3])
+    assert manager.get(job.job_id) is None
+    assert not (tmp_path / f'{job.job_id}.json').exists()
+    manager.shutdown()
+
+
+def test_jobs_are_visible_to_every_manager_sharing_a_state_dir(tmp_path):
+    # Two managers stand in for two worker processes
+    runner = JobManager(max_workers=1, state_dir=str(tmp_path))
+    poller = JobManager(max_workers=1, state_dir=str(tmp_path))
+    release = threading.Event()
+
+    job = runner.submit(lambda: release.wait() and {"id": 7})
+    assert poller.get(job.job_id).status in ('queued', 'running')
+    release.set()
+    _wait_for(runner, job.job_id)
+    assert poller.get(job.job_id).to_dict() == {"job_id": job.job_id, "status": DONE, "result": {"id": 7}}
+
+    failed = runner.submit(lambda: 1 / 0)
+    _wait_for(runner, failed.job_id)
+    assert poller.get(failed.job_id).to_dict()['error'] == 'division by zero'
+
+    # Only uuid hex ids are ever turned into a path
+    (tmp_path.parent / 'outside.json').write_text('{"job_id": "outside", "status": "done"}')
+    assert poller.get(f'../{tmp_path.parent.name}/outside') is None
+    assert poller.get('0' * 32) is None
+    runner.shutdown()
+    poller.shutdown()
@@ -0,0 +1,81 @@
+import glob
+import json
+import os
+
+import pytest
+
+from storage import JsonArrayStorage, StorageCorruptError
+
+
+def _plan(budget):
+    return {"id": None, "timestamp": "2025-01-01 00:00:00", "inputs": {"budget": budget}, "plan": {}}
+
+
+def _budgets(storage):
+    return [plan['inputs']['budget'] for plan in storage.load_all()]
+
+
+def _rolled_over_history(path):
+    """
+    Three plans: the first in the backup snapshot, the second in the backup journal (both
+    moved aside when the snapshot was last rebuilt) and the third in the live journal.
+    """
+    storage = JsonArrayStorage(path, snapshot_bytes=1) # Every append rebuilds the snapshot
+    storage.append(_plan(100))
+    storage.append(_plan(200))
+    JsonArrayStorage(path).append(_plan(300))
+    return [plan['id'] for plan in JsonArrayStorage(path).load_all()]
+
+
+def test_a_torn_journal_tail_is_dropped(tmp_path):
+    path = str(tmp_path / 'plans.json')
+    storage = JsonArrayStorage(path)
+    storage.append_many([_plan(100), _plan(200)])
+    with open(storage.journal_path, 'ab') as f:
+        f.write(b'{"id": 9999999999999, "timestamp": "2025-01-0') # A write cut short by a crash
+
+    reopened = JsonArrayStorage(path)
+    assert _budgets(reopened) == [100, 200]
+    reopened.append(_plan(300))
+    assert _budgets(JsonArrayStorage(path)) == [100, 200, 300]
+    with open(storage.journal_path, 'rb') as f:
+        assert [json.loads(line)['inputs']['budget'] for line in f] == [100, 200, 300]
+
+
+def test_a_corrupt_snapshot_is_restored_from_the_backup_and_journals(tmp_path):
+    path = str(tmp_path / 'plans.json')
+    ids = _rolled_over_history(path)
+    with open(path, 'w') as f:
+        f.write('[{"id": 1, "timest')
+
+    storage = JsonArrayStorage(path)
+    assert [plan['id'] for plan in storage.load_all()] == ids
+    assert _budgets(storage) == [100, 200, 300]
+    # The unreadable file is kept for inspection and the replayed journal is folded into the snapshot
+    assert len(glob.glob(path + '.corrupt-*')) == 1
+    assert not os.path.exists(storage.journal_path)
+    assert len(json.load(open(path))) == 3
+
+
+def test_a_snapshot_lost_mid_rebuild_is_restored(tmp_path):
+    path = str(tmp_path / 'plans.json')
+    ids = _rolled_over_history(path)
+    os.remove(path) # Crashed between moving the old snapshot aside and renaming the new one in
+
+    assert [plan['id'] for plan in JsonArrayStorage(path).load_all()] == ids
+
+
+@pytest.mark.parametrize('backup', [None, 'not json'])
+def test_a_corrupt_snapshot_without_a_readable_backup_is_an_error(tmp_path, backup):
+    path = str(tmp_path / 'plans.json')
+    JsonArrayStorage(path).append_many([_plan(100), _plan(200)])
+    with open(path, 'w') as f:
+        f.write('[{"id": 1, "timest')
+    if backup is not None:
+        with open(path + '.bak', 'w') as f:
+            f.write(backup)
+
+    with pytest.raises(StorageCorruptError):
+        JsonArrayStorage(path)
+    # Nothing is overwritten, so the file can still be repaired by hand
+    assert open(path).read() == '[{"id": 1, "timest'
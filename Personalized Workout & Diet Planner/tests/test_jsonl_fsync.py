@@ -0,0 +1,56 @@
+import time
+
+from storage import JsonLinesStorage
+
+
+def _plan(budget):
+    return {"id": None, "timestamp": "2025-01-01 00:00:00", "inputs": {"budget": budget}, "plan": {}}
+
+
+def _wait_for(fsyncs, count):
+    deadline = time.monotonic() + 5
+    while len(fsyncs) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+def _counting_fsyncs(storage):
+    calls = []
+    fsync = storage._fsync
+
+    def counting_fsync(fd):
+        fsync(fd)
+        calls.append(time.monotonic())
+
+    storage._fsync = counting_fsync
+    return calls
+
+
+def test_a_lone_append_is_fsynced_once_the_interval_is_up(tmp_path):
+    storage = JsonLinesStorage(str(tmp_path / 'plans.jsonl'), fsync_batch_size=100, fsync_interval=0.5)
+    fsyncs = _counting_fsyncs(storage)
+    appended = time.monotonic()
+    storage.append(_plan(100))
+    assert fsyncs == [] and storage._pending_fsync == 1
+
+    _wait_for(fsyncs, 1)
+    assert len(fsyncs) == 1 and fsyncs[0] - appended >= 0.5
+    assert storage._pending_fsync == 0
+    storage.close()
+
+
+def test_appends_within_the_interval_share_one_deadline_fsync(tmp_path):
+    storage = JsonLinesStorage(str(tmp_path / 'plans.jsonl'), fsync_batch_size=100, fsync_interval=0.5)
+    fsyncs = _counting_fsyncs(storage)
+    for budget in range(100, 105):
+        storage.append(_plan(budget))
+    _wait_for(fsyncs, 1)
+    time.sleep(0.6)
+    assert len(fsyncs) == 1
+
+    # A batch fsync cancels the deadline flush
+    storage.fsync_batch_size = 2
+    storage.append_many([_plan(200), _plan(300)])
+    assert len(fsyncs) == 2
+    time.sleep(0.6)
+    assert len(fsyncs) == 2
+    storage.close()
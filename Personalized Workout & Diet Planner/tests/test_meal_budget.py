@@ -0,0 +1,48 @@
+import json
+
+from meal_planner import MealCatalog, MealPlanner
+from plan_model import MealBudget, Plan, PlanDecoder, dumps
+
+# The cheapest 'global_comfort' week costs more than ₹700 (₹100 a day)
+INFEASIBLE = {"cuisine": "American/Comfort", "budget": 100}
+
+
+def test_planner_reports_a_week_that_cannot_fit_the_budget():
+    week = MealPlanner(MealCatalog.from_file()).plan_week('global_comfort', 'Weight Loss', 700)
+    assert not week.within_budget
+    assert week.total_cost > 700
+    assert week.budget_summary() == {"weeklyCostInr": week.total_cost, "weeklyBudgetInr": 700,
+                                     "withinBudget": False}
+
+
+def test_generate_plan_response_carries_the_meal_budget(client):
+    plan = client.post('/generate_plan', json=INFEASIBLE).get_json()['plan']
+    assert plan['mealBudget']['withinBudget'] is False
+    assert plan['mealBudget']['weeklyCostInr'] > plan['mealBudget']['weeklyBudgetInr'] == 700
+
+    plan = client.post('/generate_plan', json={**INFEASIBLE, "budget": 500}).get_json()['plan']
+    assert plan['mealBudget']['withinBudget'] is True
+    assert plan['mealBudget']['weeklyCostInr'] <= 3500
+
+
+def test_stream_reports_the_meal_budget_before_saving(client):
+    response = client.post('/generate_plan/stream', json=INFEASIBLE)
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [event['event'] for event in events[-2:]] == ['meal_budget', 'saved']
+    assert events[-2]['budget']['withinBudget'] is False
+
+
+def test_meal_budget_round_trips_through_the_plan_model():
+    body = {"workoutPlan": [], "mealPlan": [],
+            "mealBudget": {"weeklyCostInr": 1, "weeklyBudgetInr": 700, "withinBudget": True}}
+    numeric = {**body, "mealBudget": {**body["mealBudget"], "withinBudget": 1}}
+    decoder = PlanDecoder()
+
+    plan = decoder.decode(body)
+    assert isinstance(plan, Plan) and isinstance(plan.meal_budget, MealBudget)
+    assert plan.to_dict() == body
+    assert json.loads(dumps(plan)) == body
+    # Booleans are not shared with the integers they compare equal to
+    assert json.loads(dumps(decoder.decode(numeric)))["mealBudget"]["withinBudget"] == 1
+    # Plans without the optional key keep leaving it out
+    assert json.loads(dumps(decoder.decode({"workoutPlan": [], "mealPlan": []}))) == {"workoutPlan": [], "mealPlan": []}
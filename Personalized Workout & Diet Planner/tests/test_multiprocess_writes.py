@@ -0,0 +1,60 @@
+import multiprocessing
+
+import pytest
+
+from storage import JsonArrayStorage, create_storage
+
+WORKERS = 3
+PLANS_PER_WORKER = 30 # Single appends, plus one batch of BATCH_SIZE at the end
+BATCH_SIZE = 3
+# (backend, compress)
+BACKENDS = [('jsonl', False), ('compact', False), ('compact', True), ('sqlite', False), ('json', False)]
+
+
+def _plan(budget):
+    return {"id": None, "timestamp": "2025-01-01 00:00:00", "inputs": {"budget": budget},
+            "plan": {"workoutPlan": [], "mealPlan": []}}
+
+
+def _open(backend, compress, directory):
+    codec = None
+    if backend == 'compact':
+        import app
+        codec = app.plan_codec
+    return create_storage(backend, f'{directory}/plans.json', f'{directory}/plans.jsonl', f'{directory}/plans.sqlite3',
+                          compact_file=f'{directory}/plans.compact.jsonl' + ('.gz' if compress else ''),
+                          codec=codec, compress=compress)
+
+
+def _write(backend, compress, directory, worker, start):
+    # Every worker opens the storage itself, so they also race the one-time import of plans.json
+    start.wait()
+    storage = _open(backend, compress, directory)
+    budgets = [worker * 1000 + i for i in range(PLANS_PER_WORKER + BATCH_SIZE)]
+    for budget in budgets[:PLANS_PER_WORKER]:
+        storage.append(_plan(budget))
+    storage.append_many([_plan(budget) for budget in budgets[PLANS_PER_WORKER:]])
+    storage.close()
+
+
+@pytest.mark.parametrize('backend,compress', BACKENDS, ids=['jsonl', 'compact', 'compact-gzip', 'sqlite', 'json'])
+def test_concurrent_writers_neither_lose_nor_duplicate_plans(backend, compress, tmp_path, app_module):
+    legacy = [{**_plan(budget), "id": plan_id} for plan_id, budget in enumerate([1, 2, 3], 1)]
+    JsonArrayStorage(str(tmp_path / 'plans.json')).rewrite(legacy)
+
+    start = multiprocessing.Barrier(WORKERS)
+    processes = [multiprocessing.Process(target=_write, args=(backend, compress, str(tmp_path), worker, start))
+                 for worker in range(1, WORKERS + 1)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+    assert [process.exitcode for process in processes] == [0] * WORKERS
+
+    plans = _open(backend, compress, tmp_path).load_all()
+    ids = [plan['id'] for plan in plans]
+    assert len(plans) == len(legacy) + WORKERS * (PLANS_PER_WORKER + BATCH_SIZE)
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert sorted(plan['inputs']['budget'] for plan in plans) == [1, 2, 3] + [
+        worker * 1000 + i for worker in range(1, WORKERS + 1) for i in range(PLANS_PER_WORKER + BATCH_SIZE)]
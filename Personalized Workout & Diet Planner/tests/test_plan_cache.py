@@ -0,0 +1,69 @@
+import plan_cache
+from plan_cache import PlanCache, seed_from_key
+
+PAYLOAD = {"goal": "Muscle Gain", "level": "Beginner", "equipment": "Bodyweight Only",
+           "intensity": "Flexible (up to 90 min)", "budget": 650, "cuisine": "Latino"}
+
+
+def test_cache_evicts_the_least_recently_used_plan():
+    cache = PlanCache(max_size=2, ttl_seconds=0)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1 # 'b' is now the least recently used
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats() == {"size": 2, "max_size": 2, "ttl_seconds": 0, "hits": 3, "misses": 1,
+                             "evictions": 1, "expirations": 0}
+
+
+def test_cache_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(plan_cache.time, 'monotonic', lambda: now[0])
+    cache = PlanCache(max_size=10, ttl_seconds=60)
+    built = []
+    assert cache.get_or_create('key', lambda: built.append(1) or 'plan') == 'plan'
+    now[0] += 59
+    assert cache.get_or_create('key', lambda: built.append(1) or 'plan') == 'plan'
+    now[0] += 2
+    assert cache.get('key') is None
+    assert len(built) == 1 and cache.stats()['expirations'] == 1
+
+
+def test_a_zero_size_cache_stores_nothing():
+    cache = PlanCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None and cache.stats()['size'] == 0
+
+
+def test_seeds_are_stable_across_processes():
+    key = ('Weight Loss', 'Beginner', 'Bodyweight Only', 'Busy Student (45 min max)', 500, 'Any/Global')
+    # A sha256 of the key, not hash(), so it does not change with PYTHONHASHSEED
+    assert seed_from_key(key) == 0xde1616115827f079
+    assert seed_from_key(key) != seed_from_key(key[:-1] + ('Latino',))
+
+
+def test_a_request_seed_makes_the_plan_reproducible(client):
+    plans = [client.post('/generate_plan', json={**PAYLOAD, "seed": seed}).get_json()['plan'] for seed in (1, 1, 2, 3, 4)]
+    assert plans[0] == plans[1]
+    assert any(plan != plans[0] for plan in plans[2:])
+
+
+def test_repeated_plans_come_from_the_cache(client):
+    before = client.get('/plan_cache/stats').get_json()
+    first = client.post('/generate_plan', json={**PAYLOAD, "seed": 'cached'}).get_json()
+    second = client.post('/generate_plan', json={**PAYLOAD, "seed": 'cached'}).get_json()
+    after = client.get('/plan_cache/stats').get_json()
+
+    assert first['plan'] == second['plan'] and first['id'] != second['id']
+    assert after['hits'] - before['hits'] >= 1
+
+
+def test_inputs_seed_mode_gives_each_profile_one_plan(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'PLAN_SEED_MODE', 'inputs')
+    plans = [client.post('/generate_plan', json=PAYLOAD).get_json()['plan'] for _ in range(4)]
+    assert all(plan == plans[0] for plan in plans)
+    # The request's seed still wins
+    seeded = [client.post('/generate_plan', json={**PAYLOAD, "seed": seed}).get_json()['plan'] for seed in range(6)]
+    assert any(plan != plans[0] for plan in seeded)
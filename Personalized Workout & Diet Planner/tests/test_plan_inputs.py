@@ -0,0 +1,88 @@
+import pytest
+
+from plan_inputs import MAX_INPUT_BYTES, MAX_SEED_LENGTH, InputError, input_key, profile_key, validate_inputs
+
+DEFAULTS = {"goal": "Healthy Maintenance", "level": "Intermediate", "equipment": "Bodyweight Only",
+            "intensity": "Busy Student (45 min max)", "budget": 500, "cuisine": "Any/Global", "workouts_per_week": 3}
+
+
+@pytest.mark.parametrize('field,value,canonical', [
+    ('goal', 'weight_loss', 'Weight Loss'),
+    ('goal', ' WEIGHT-LOSS ', 'Weight Loss'),
+    ('goal', 'fat_loss', 'Weight Loss'),
+    ('level', 'advanced', 'Advanced'),
+    ('equipment', 'gym', 'Full Gym Access'),
+    ('equipment', 'Light weights / bands', 'Light Weights/Bands'),
+    ('intensity', 'busy', 'Busy Student (45 min max)'),
+    ('cuisine', 'american', 'American/Comfort'),
+    ('budget', 750.0, 750),
+])
+def test_other_spellings_are_canonicalized(field, value, canonical):
+    assert validate_inputs({field: value}) == {**DEFAULTS, field: canonical}
+
+
+def test_older_field_names_and_nulls_are_accepted():
+    inputs = validate_inputs({"fitnessLevel": "beginner", "schedule": "flexible", "culturalCuisine": "latino",
+                              "workoutFrequency": 5, "goal": None, "seed": "abc"})
+    assert inputs == {**DEFAULTS, "level": "Beginner", "intensity": "Flexible (up to 90 min)",
+                      "cuisine": "Latino", "workouts_per_week": 5, "seed": "abc"}
+    # Canonical field order, whatever order the payload used
+    assert list(inputs) == list(DEFAULTS) + ['seed']
+
+
+@pytest.mark.parametrize('payload,message', [
+    (None, 'No input data'),
+    ([], 'No input data'),
+    ({"goal": "Weight Loss", "mood": "happy"}, "Unknown field 'mood'"),
+    ({"level": "Beginner", "fitnessLevel": "Advanced"}, 'same field'),
+    ({"goal": "Get Huge"}, "'goal' must be one of"),
+    ({"cuisine": 3}, "'cuisine' must be one of"),
+    ({"budget": 49}, "'budget' must be a whole number between 50 and 20000"),
+    ({"budget": 20001}, "'budget'"),
+    ({"budget": 500.5}, "'budget'"),
+    ({"budget": "500"}, "'budget'"),
+    ({"budget": True}, "'budget'"),
+    ({"workouts_per_week": 0}, "'workouts_per_week'"),
+    ({"workouts_per_week": 8}, "'workouts_per_week'"),
+    ({"seed": 1.5}, "'seed'"),
+    ({"seed": "x" * (MAX_SEED_LENGTH + 1)}, "'seed'"),
+])
+def test_bad_payloads_are_rejected(payload, message):
+    with pytest.raises(InputError, match=message) as raised:
+        validate_inputs(payload)
+    assert raised.value.status == 400
+
+
+def test_keys_of_other_spellings_match_the_canonical_inputs():
+    canonical = validate_inputs({"goal": "Weight Loss", "equipment": "Full Gym Access", "budget": 800})
+    spelled = validate_inputs({"goal": "weight_loss", "equipment": "gym", "budget": 800.0})
+    assert input_key(spelled) == input_key(canonical)
+    # Stored history keeps the key it was saved with, so old records re-render the same plan
+    assert input_key({"goal": "weight_loss", "budget": 800}) == (
+        'weight_loss', 'Intermediate', 'Bodyweight Only', 'Busy Student (45 min max)', 800, 'Any/Global')
+    # while retention and filters group it with today's spelling
+    assert profile_key({"goal": "weight_loss", "equipment": "gym", "budget": 800}) == input_key(canonical)
+    assert profile_key({"fitnessLevel": "beginner", "culturalCuisine": "latino"}) == input_key(
+        validate_inputs({"level": "Beginner", "cuisine": "Latino"}))
+
+
+def test_generation_endpoints_answer_400_on_bad_payloads(client):
+    for url in ('/generate_plan', '/generate_plan/stream'):
+        response = client.post(url, json={"goal": "Weight Loss", "mood": "happy"})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Unknown field 'mood'"}
+        assert client.post(url, data='not json', content_type='application/json').status_code == 400
+        assert client.post(url, json={"budget": 10}).status_code == 400
+
+
+def test_oversized_payloads_answer_413(client):
+    body = {"goal": "Weight Loss", "seed": "x" * MAX_INPUT_BYTES}
+    for url in ('/generate_plan', '/generate_plan/stream'):
+        response = client.post(url, json=body)
+        assert response.status_code == 413
+        assert 'too large' in response.get_json()['error']
+
+
+def test_plans_are_saved_with_canonical_inputs(client):
+    plan = client.post('/generate_plan', json={"goal": "weight_loss", "fitnessLevel": "beginner", "seed": 7}).get_json()
+    assert plan['inputs'] == {**DEFAULTS, "goal": "Weight Loss", "level": "Beginner", "seed": 7}
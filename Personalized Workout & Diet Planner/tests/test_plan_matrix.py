@@ -0,0 +1,93 @@
+import itertools
+import random
+
+import pytest
+
+from plan_inputs import CUISINES, EQUIPMENT, GOALS, INTENSITIES, KEY_FIELDS, LEVELS
+from plan_matrix import UI_GRID, PlanMatrix
+
+MEAL_PLANNERS = ('optimizer', 'templates')
+# A fixed sample of the grid; every variation pair of each is checked
+SAMPLE = random.Random(19).sample(list(itertools.product(*UI_GRID)), 40)
+SMALL_GRID = (GOALS, LEVELS, EQUIPMENT, INTENSITIES, (100, 400, 450, 700, 750, 2000), CUISINES)
+
+
+def _build(app, planner, grid=UI_GRID, workers=1):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(app, 'MEAL_PLANNER', planner)
+        return PlanMatrix.build(app.TEMPLATES, app.select_templates, app.plan_params, grid=grid, workers=workers)
+
+
+def _cells(app, planner, values):
+    """(key, workout template, workout variation, meal template, meal variation) of every variation pair."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(app, 'MEAL_PLANNER', planner)
+        key, workout_template, meal_template = app.select_templates(dict(zip(KEY_FIELDS, values)))
+    return [(key, workout_template, workout_variation, meal_template, meal_variation)
+            for workout_variation in range(1, workout_template.variation_count + 1)
+            for meal_variation in range(1, meal_template.variation_count + 1)]
+
+
+def _lookup(matrix, key, workout_template, workout_variation, meal_template, meal_variation):
+    return matrix.get(key, workout_template.template_id, workout_variation, meal_template.template_id, meal_variation)
+
+
+@pytest.fixture(scope='module')
+def matrices(app_module):
+    return {planner: _build(app_module, planner) for planner in MEAL_PLANNERS}
+
+
+@pytest.mark.parametrize('planner', MEAL_PLANNERS)
+@pytest.mark.parametrize('values', SAMPLE, ids=['-'.join(map(str, values)) for values in SAMPLE])
+def test_matrix_plans_match_the_reference_builder(app_module, matrices, planner, values):
+    for cell in _cells(app_module, planner, values):
+        assert _lookup(matrices[planner], *cell) == app_module.build_mock_plan(*cell)
+
+
+def test_the_matrix_holds_every_plan_of_the_grid(matrices):
+    size = len(GOALS) * len(LEVELS) * len(EQUIPMENT) * len(INTENSITIES) * len(UI_GRID[4]) * len(CUISINES)
+    # Every template has two variations; an optimized meal template has more
+    assert matrices['templates'].stats['plans'] == size * 2 * 2
+    assert matrices['optimizer'].stats['plans'] > size * 2 * 2
+    assert all(stats['workers'] == 1 for stats in (matrix.stats for matrix in matrices.values()))
+
+
+def test_inputs_off_the_grid_are_not_in_the_matrix(app_module, matrices):
+    matrix = matrices['templates']
+    key, workout_template, _, meal_template, _ = _cells(app_module, 'templates', SAMPLE[0])[0]
+    workout_id, meal_id = workout_template.template_id, meal_template.template_id
+    assert matrix.get(key, workout_id, 1, meal_id, 1) is not None
+    for budget in (675, 50, 20000):
+        assert matrix.get(key[:4] + (budget,) + key[5:], workout_id, 1, meal_id, 1) is None
+    assert matrix.get(key[:5] + ('Martian',), workout_id, 1, meal_id, 1) is None
+    for workout_variation, meal_variation in ((0, 1), (3, 1), (1, 0), (1, 99)):
+        assert matrix.get(key, workout_id, workout_variation, meal_id, meal_variation) is None
+    # A plan rendered with another template (e.g. saved by a server in another MEAL_PLANNER mode) misses
+    assert matrix.get(key, 'other', 1, meal_id, 1) is None
+    assert matrix.get(key, workout_id, 1, 'other', 1) is None
+
+
+def test_a_parallel_build_matches_an_in_process_build(app_module):
+    serial = _build(app_module, 'optimizer', SMALL_GRID, workers=1)
+    parallel = _build(app_module, 'optimizer', SMALL_GRID, workers=2)
+    assert parallel.stats['workers'] == 2 and parallel.stats['parts'] == serial.stats['parts']
+    for values in itertools.product(*SMALL_GRID):
+        for cell in _cells(app_module, 'optimizer', values):
+            assert _lookup(parallel, *cell) == _lookup(serial, *cell)
+
+
+def test_generation_serves_matrix_plans(client, app_module, matrices, monkeypatch):
+    payload = {"goal": "Muscle Gain", "level": "Beginner", "budget": 650, "cuisine": "Latino", "seed": 'matrix'}
+    app_module.PLAN_CACHE.clear()
+    built = client.post('/generate_plan', json=payload).get_json()['plan']
+
+    monkeypatch.setattr(app_module, 'PLAN_MATRIX', matrices[app_module.MEAL_PLANNER])
+    app_module.PLAN_CACHE.clear()
+    misses = app_module.PLAN_CACHE.stats()['misses']
+    assert client.post('/generate_plan', json=payload).get_json()['plan'] == built
+    stats = client.get('/plan_cache/stats').get_json()
+    assert stats['matrix'] == matrices[app_module.MEAL_PLANNER].stats
+    assert stats['misses'] == misses and stats['size'] == 0
+    # Off the grid, generation falls back to building (and caching) the plan
+    client.post('/generate_plan', json={**payload, "budget": 675})
+    assert client.get('/plan_cache/stats').get_json()['size'] == 1
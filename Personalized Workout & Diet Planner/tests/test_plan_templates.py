@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import re
+
+import pytest
+
+from plan_inputs import CUISINES, EQUIPMENT, GOALS, INTENSITIES, LEVELS
+from plan_templates import TemplateError, TemplateRegistry
+
+# sha256 of plans built by the hand-written get_mock_plan_data that plan_templates.json replaced,
+# for a fixed sample of inputs across every goal, level, equipment, intensity, cuisine and budget
+# tier, with both variations of each template
+REFERENCE_FILE = os.path.join(os.path.dirname(__file__), 'reference_plan_digests.json')
+with open(REFERENCE_FILE, 'r', encoding='utf-8') as f:
+    REFERENCE_PLANS = json.load(f)
+
+
+def _digest(plan):
+    return hashlib.sha256(json.dumps(plan, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+@pytest.mark.parametrize('reference', REFERENCE_PLANS,
+                         ids=[f"{'-'.join(map(str, r['inputs']))}-v{r['workout_variation']}{r['meal_variation']}"
+                              for r in REFERENCE_PLANS])
+def test_compiled_templates_build_the_reference_plans(app_module, reference):
+    key = tuple(reference['inputs'])
+    goal, level, equipment, intensity, budget, cuisine = key
+    plan = app_module.build_mock_plan(key, app_module.TEMPLATES.workout_template(level, equipment),
+                                      reference['workout_variation'], app_module.TEMPLATES.meal_template(cuisine),
+                                      reference['meal_variation'])
+    assert _digest(plan) == reference['sha256']
+
+
+def test_the_reference_sample_covers_every_choice():
+    for position, choices in zip((0, 1, 2, 3, 5), (GOALS, LEVELS, EQUIPMENT, INTENSITIES, CUISINES)):
+        assert {r['inputs'][position] for r in REFERENCE_PLANS} == set(choices)
+    # Both sides of each budget tier boundary
+    assert {400, 401, 700, 701} <= {r['inputs'][4] for r in REFERENCE_PLANS}
+    assert {(r['workout_variation'], r['meal_variation']) for r in REFERENCE_PLANS} == {(1, 1), (1, 2), (2, 1), (2, 2)}
+
+
+def test_every_variation_is_rendered_on_its_own(app_module):
+    template = app_module.TEMPLATES.workout_template('Beginner', 'Bodyweight Only')
+    params = app_module.plan_params(('Weight Loss', 'Beginner', 'Bodyweight Only', 'Busy Student (45 min max)',
+                                     500, 'Any/Global'), 1)
+    first, second = template.render(1, params), template.render(2, params)
+    assert first != second
+    # Renders are fresh objects, so callers may not share them by accident
+    assert template.render(1, params) == first and template.render(1, params) is not first
+
+
+def _registry(workout_variations, default=True):
+    return TemplateRegistry({"workouts": {"w": {"default": default, "variations": workout_variations}},
+                             "meals": {"m": {"default": True, "variations": [[]]}}})
+
+
+@pytest.mark.parametrize('variations,default,message', [
+    ([[{"focus": "Day {mood}"}]], True, "unknown slot '{mood}'"),
+    ([[{"sets": "{sets:>3}"}]], True, 'format specs are not supported'),
+    ([], True, "template 'w' has no variations"),
+    ([[{"focus": "{goal}"}]], False, 'need a template marked "default"'),
+])
+def test_bad_templates_are_rejected_at_load(variations, default, message):
+    with pytest.raises(TemplateError, match=re.escape(message)):
+        _registry(variations, default)
+
+
+def test_a_lone_slot_keeps_its_type_and_braces_can_be_escaped():
+    template = _registry([[{"sets": "{sets}", "note": "{{literal}} x{sets} {goal}"}]]).workouts['w']
+    assert template.slots == ('goal', 'sets')
+    assert template.render(1, {"sets": 4, "goal": "Muscle Gain"}) == [{"sets": 4, "note": "{literal} x4 Muscle Gain"}]
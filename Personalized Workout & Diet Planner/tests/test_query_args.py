@@ -0,0 +1,17 @@
+import pytest
+
+PAGED = ['/get_plans', '/plans/search', '/plans/archive']
+
+
+@pytest.mark.parametrize('url', [f'{endpoint}?{query}' for endpoint in PAGED
+                                 for query in ('limit=abc', 'limit=2.5', 'before_id=x', 'limit=0', 'limit=100000')]
+                         + ['/plans/stats?top=abc', '/plans/stats?top=0', '/plans/search?budget_min=cheap'])
+def test_malformed_query_integers_are_rejected(client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert "'" in response.get_json()['error']
+
+
+@pytest.mark.parametrize('url', [f'{endpoint}?limit=5' for endpoint in PAGED] + ['/plans/stats?top=5'])
+def test_well_formed_query_integers_are_accepted(client, url):
+    assert client.get(url).status_code == 200
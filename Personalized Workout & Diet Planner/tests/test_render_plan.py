@@ -0,0 +1,36 @@
+from plan_inputs import validate_inputs
+
+INPUTS = validate_inputs({"cuisine": "South Asian", "budget": 500})
+
+
+def _render(app, planner, monkeypatch):
+    monkeypatch.setattr(app, 'MEAL_PLANNER', planner)
+    key, workout_template, meal_template = app.select_templates(INPUTS)
+    return app.render_plan(key, workout_template, 1, meal_template, 1)
+
+
+def _entry(plan):
+    return {"id": 1, "timestamp": "2025-01-01 00:00:00", "inputs": INPUTS, "plan": plan}
+
+
+def test_template_record_expands_to_its_own_week_with_a_warm_optimizer_cache(app_module, monkeypatch):
+    app_module.PLAN_CACHE.clear()
+    template_plan = _render(app_module, 'templates', monkeypatch)
+    record = app_module.plan_codec.compact(_entry(template_plan))
+    assert 'ref' in record
+
+    optimized_plan = _render(app_module, 'optimizer', monkeypatch) # Warms the cache for the same inputs
+    assert optimized_plan['mealPlan'] != template_plan['mealPlan']
+    assert app_module.plan_codec.expand(record)['plan'] == template_plan
+
+
+def test_expanding_a_template_record_does_not_leak_into_optimizer_generation(app_module, monkeypatch):
+    app_module.PLAN_CACHE.clear()
+    template_plan = _render(app_module, 'templates', monkeypatch)
+    record = app_module.plan_codec.compact(_entry(template_plan))
+
+    app_module.PLAN_CACHE.clear()
+    monkeypatch.setattr(app_module, 'MEAL_PLANNER', 'optimizer')
+    assert app_module.plan_codec.expand(record)['plan'] == template_plan # Fills the cold cache
+    optimized_plan = _render(app_module, 'optimizer', monkeypatch)
+    assert optimized_plan['mealPlan'] != template_plan['mealPlan']
@@ -0,0 +1,30 @@
+from plan_inputs import validate_inputs
+from retention import RetentionPolicy
+from storage import JsonArrayStorage
+
+
+def _plan(plan_id, inputs):
+    return {"id": plan_id, "timestamp": "2025-01-01 00:00:00", "inputs": inputs, "plan": {}}
+
+
+def test_policy_groups_older_spellings_with_canonical_inputs():
+    canonical = validate_inputs({"goal": "Weight Loss", "level": "Beginner", "cuisine": "South Asian"})
+    legacy = {"goal": "weight_loss", "fitnessLevel": "beginner", "culturalCuisine": "south asian",
+              "budget": 500.0}
+    newest_first = [_plan(3, canonical), _plan(2, legacy), _plan(1, canonical)]
+
+    expired = RetentionPolicy(per_profile=2).expired(newest_first)
+    assert [plan['id'] for plan in expired] == [1]
+
+
+def test_json_backups_do_not_bring_removed_plans_back(tmp_path):
+    path = str(tmp_path / 'plans.json')
+    storage = JsonArrayStorage(path, snapshot_bytes=1)
+    storage.append_many([_plan(None, {}) for _ in range(3)]) # Every append rebuilds the snapshot
+    storage.append_many([_plan(None, {})])
+    ids = [plan['id'] for plan in storage.load_all()]
+
+    storage.remove(set(ids[:2]))
+    with open(path, 'w') as f:
+        f.write('{not json') # The snapshot is damaged: the next start recovers from the backups
+    assert [plan['id'] for plan in JsonArrayStorage(path).load_all()] == ids[2:]
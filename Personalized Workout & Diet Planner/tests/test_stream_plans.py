@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from storage import create_storage
+
+
+def _plan(budget):
+    return {"id": None, "timestamp": "2025-01-01 00:00:00", "inputs": {"goal": "Weight Loss", "budget": budget},
+            "plan": {"workoutPlan": [{"day": "Monday", "focus": "Rest"}], "mealPlan": []}}
+
+
+def _ndjson(response):
+    body = response.get_data()
+    assert body.endswith(b'\n')
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_streamed_history_matches_the_plain_response(client):
+    for budget in (500, 600, 700):
+        client.post('/generate_plan', json={"budget": budget, "seed": budget})
+    plans = client.get('/get_plans').get_json()
+
+    ndjson = client.get('/get_plans?stream=ndjson')
+    assert ndjson.status_code == 200 and ndjson.mimetype == 'application/x-ndjson'
+    assert _ndjson(ndjson) == plans
+
+    array = client.get('/get_plans?stream=array')
+    assert array.status_code == 200 and array.mimetype == 'application/json'
+    assert array.get_json() == plans
+
+    assert _ndjson(client.get('/get_plans?stream=ndjson&order=desc')) == plans[::-1]
+    assert client.get('/get_plans?stream=array&order=desc').get_json() == plans[::-1]
+
+
+@pytest.mark.parametrize('backend,compact_file', [('json', None), ('jsonl', None), ('sqlite', None),
+                                                  ('compact', 'plans.compact.jsonl'),
+                                                  ('compact', 'plans.compact.jsonl.gz')])
+def test_every_backend_streams_its_history(client, app_module, monkeypatch, tmp_path, backend, compact_file):
+    storage = create_storage(backend, str(tmp_path / 'plans.json'), str(tmp_path / 'plans.jsonl'),
+                             str(tmp_path / 'plans.sqlite3'), codec=app_module.plan_codec,
+                             compact_file=str(tmp_path / (compact_file or 'plans.compact.jsonl')),
+                             compress=bool(compact_file and compact_file.endswith('.gz')))
+    storage.append_many([_plan(budget) for budget in (100, 200, 300)])
+    monkeypatch.setattr(app_module, 'storage', storage)
+    plans = storage.load_all()
+
+    assert _ndjson(client.get('/get_plans?stream=ndjson')) == plans
+    assert client.get('/get_plans?stream=array&order=desc').get_json() == plans[::-1]
+    storage.close()
+
+
+def test_an_empty_history_streams_as_an_empty_array(client, app_module, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, 'storage', create_storage('jsonl', str(tmp_path / 'plans.json'),
+                                                              str(tmp_path / 'plans.jsonl'), None))
+    assert client.get('/get_plans?stream=ndjson').get_data() == b''
+    assert client.get('/get_plans?stream=array').get_data() == b'[]'
+
+
+@pytest.mark.parametrize('query,error', [('stream=xml', "'stream' must be 'ndjson' or 'array'"),
+                                         ('stream=', "'stream' must be 'ndjson' or 'array'"),
+                                         ('stream=ndjson&order=newest', "'order' must be 'asc' or 'desc'")])
+def test_unknown_stream_options_are_rejected(client, query, error):
+    response = client.get(f'/get_plans?{query}')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
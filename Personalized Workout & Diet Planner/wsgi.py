@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production serving with several worker processes:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Each worker process imports this module after the fork and builds its own app
+with create_app(), which opens its own handles on the shared storage. The
+'jsonl', 'compact' and 'json' backends serialize writers with an exclusive file
+lock and 'sqlite' uses database transactions, and plan ids are assigned by the
+storage inside that lock, so concurrent /generate_plan calls on different
+workers never lose or overwrite each other's plans.
+"""
+from app import create_app
+
+application = create_app()